@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import struct
+import zlib
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+
+# =========================================================
+# 🗂️ 缓存日志 (Append-only segmented journal)
+# =========================================================
+#
+# One segment file per (log type, day):  cache/<Type>/<YYYY-MM-DD>.wlj
+#
+#   [ MAGIC ][ len:u32 | crc32:u32 | payload ][ len | crc | payload ] ...
+#
+# Payloads are produced by a per-segment encoder (JSON unless configured
+# otherwise), so encoders may keep state such as a string table that is scoped
+# to one segment. Records are only ever appended. After a power loss the last record may be
+# torn (short header, short payload or bad checksum); the recovery pass cuts
+# the segment back to the last complete record. cache/journal.manifest.json
+# indexes the segments, so finding pending days never lists or opens the
+# segments themselves and recovery only re-checks bytes past the last
+# offset known to be durable.
+
+# 1. 段文件格式
+SEGMENT_SUFFIX = ".wlj"
+SEGMENT_MAGIC = b"WLJ\x01"
+RECORD_HEADER = struct.Struct("<II")
+MAX_RECORD_BYTES = 16 * 1024 * 1024
+
+# 2. 落盘策略 (fsync batching)
+#    FSYNC_BATCH_RECORDS = 1 keeps the "nothing lost on sudden shutdown" promise
+#    for every single record; raise it to trade durability for fewer fsyncs.
+FSYNC_BATCH_RECORDS = 1
+FSYNC_INTERVAL_SECONDS = 60
+
+# 3. 索引清单 (manifest)
+#    Per (log type, day): record count and the verified byte offset. Saved
+#    atomically after an fsync, at most every MANIFEST_INTERVAL_SECONDS while
+#    appending, and immediately when segments are created or dropped.
+MANIFEST_FILENAME = "journal.manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_INTERVAL_SECONDS = 300
+
+# 4. 异步写入 (CacheWriter)
+#    Producers only enqueue; one writer thread drains the queue in batches of up
+#    to WRITER_FLUSH_SIZE, or whatever is pending after WRITER_FLUSH_LATENCY_SECONDS.
+WRITER_QUEUE_SIZE = 10000
+WRITER_FLUSH_SIZE = 64
+WRITER_FLUSH_LATENCY_SECONDS = 1.0
+#    When the queue is full: "block" (wait up to WRITER_BLOCK_TIMEOUT_SECONDS,
+#    then drop the new record), "drop_oldest" or "drop_newest".
+WRITER_BACKPRESSURE = "block"
+WRITER_BLOCK_TIMEOUT_SECONDS = 2.0
+
+# =========================================================
+
+def scan_segment(path, start=0):
+    """Validate records from `start`. Returns (good_offset, record_count)."""
+    good_offset, count = 0, 0
+    with open(path, 'rb') as f:
+        if start <= 0:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC: return 0, 0
+            start = len(SEGMENT_MAGIC)
+        f.seek(start)
+        good_offset = start
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size: break
+            length, crc = RECORD_HEADER.unpack(header)
+            if length > MAX_RECORD_BYTES: break
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc: break
+            good_offset += RECORD_HEADER.size + length
+            count += 1
+    return good_offset, count
+
+def iter_segment(path, start=0, end=None):
+    """Yield record payloads of a segment, stopping silently at a torn tail."""
+    for payload, _ in iter_segment_offsets(path, start, end):
+        yield payload
+
+def iter_segment_offsets(path, start=0, end=None):
+    """Like iter_segment, but yields (payload, offset just past the record)."""
+    with open(path, 'rb') as f:
+        if start <= 0:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC: return
+        else:
+            f.seek(start)
+        while end is None or f.tell() < end:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size: return
+            length, crc = RECORD_HEADER.unpack(header)
+            if length > MAX_RECORD_BYTES: return
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc: return
+            yield payload, f.tell()
+
+class JsonEncoder:
+    def encode(self, record):
+        return json.dumps(record, ensure_ascii=False).encode('utf-8')
+
+class JsonDecoder:
+    def decode(self, payload):
+        return json.loads(payload)
+
+class SegmentFollower:
+    """Reads the records appended to a live segment since the previous read().
+
+    The offset only moves past complete records, so a record that is still
+    being written is picked up whole by the next call. The decoder is kept
+    between calls because segment encoders may carry state across records.
+    """
+    def __init__(self, path, decoder):
+        self.path = path
+        self.decoder = decoder
+        self.offset = 0
+
+    def read(self):
+        if not self.path.exists(): return
+        for payload, offset in iter_segment_offsets(self.path, self.offset):
+            self.offset = offset
+            try: yield self.decoder.decode(payload)
+            except Exception as e: logging.warning(f"Skipping undecodable record in {self.path.name}: {e}")
+
+class SegmentJournal:
+    def __init__(self, root, log_types, encoders=None, decoders=None, fsync_batch=FSYNC_BATCH_RECORDS, fsync_interval=FSYNC_INTERVAL_SECONDS):
+        self.root = Path(root)
+        self.log_types = list(log_types)
+        self.encoders = encoders or {}   # log_type -> encoder factory
+        self.decoders = decoders or {}   # log_type -> decoder factory
+        self.fsync_batch = max(1, int(fsync_batch))
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self._open = {}      # log_type -> (day, file object, encoder)
+        self._recovered = set()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.manifest_path = self.root / MANIFEST_FILENAME
+        self.manifest = self._load_manifest()   # log_type -> {day: {"records": n, "bytes": offset}}
+        self._manifest_saved = 0.0
+
+    def segment_path(self, log_type, day):
+        return self.root / log_type.capitalize() / f"{day}{SEGMENT_SUFFIX}"
+
+    # --- Manifest -------------------------------------------------------
+    def _load_manifest(self):
+        manifest = {log_type: {} for log_type in self.log_types}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                for log_type, days in data.get("segments", {}).items():
+                    if log_type in manifest:
+                        manifest[log_type] = {day: {"records": int(e["records"]), "bytes": int(e["bytes"])} for day, e in days.items()}
+        except FileNotFoundError: pass
+        except Exception as e: logging.warning(f"Ignoring unreadable journal manifest: {e}")
+        return manifest
+
+    def _save_manifest(self):
+        # Only called right after the segments were fsynced, so every offset
+        # recorded here is durable. Recovery re-verifies anything beyond it.
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": MANIFEST_VERSION, "segments": self.manifest}, f)
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp_path, self.manifest_path)
+            self._fsync_dir(self.root)
+            self._manifest_saved = time.monotonic()
+        except Exception as e: logging.error(f"Failed to save journal manifest: {e}")
+
+    def day_info(self, log_type, day):
+        with self.lock:
+            entry = self.manifest.get(log_type, {}).get(day)
+            return dict(entry) if entry else None
+
+    # --- Recovery -------------------------------------------------------
+    def recover_segment(self, log_type, day):
+        """Truncate a torn tail and refresh the manifest entry. Returns the number of intact records."""
+        path = self.segment_path(log_type, day)
+        entries = self.manifest.setdefault(log_type, {})
+        try:
+            size = path.stat().st_size
+            entry = entries.get(day)
+            if entry and len(SEGMENT_MAGIC) <= entry["bytes"] <= size:
+                good_offset, count = scan_segment(path, start=entry["bytes"])
+                count += entry["records"]
+            else:
+                good_offset, count = scan_segment(path)
+            if good_offset < size:
+                logging.warning(f"Journal {path.name}: truncating torn tail ({size - good_offset} bytes).")
+                if good_offset == 0:
+                    os.remove(path)
+                    entries.pop(day, None)
+                    return 0
+                with open(path, 'r+b') as f:
+                    f.truncate(good_offset)
+                    f.flush(); os.fsync(f.fileno())
+            entries[day] = {"records": count, "bytes": good_offset}
+            self._recovered.add(path)
+            return count
+        except FileNotFoundError:
+            entries.pop(day, None)
+            return 0
+
+    def recover(self):
+        with self.lock:
+            for log_type in self.log_types:
+                known = set(self.manifest.get(log_type, {}))
+                seg_dir = self.root / log_type.capitalize()
+                on_disk = {p.stem for p in seg_dir.glob(f"*{SEGMENT_SUFFIX}")} if seg_dir.exists() else set()
+                for day in sorted(known | on_disk):
+                    self.recover_segment(log_type, day)
+            self._save_manifest()
+
+    # --- Writing --------------------------------------------------------
+    def _handle(self, log_type, day):
+        current = self._open.get(log_type)
+        if current and current[0] == day: return current
+        if current:
+            self._close_file(current[1])
+            del self._open[log_type]
+
+        path = self.segment_path(log_type, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path not in self._recovered: self.recover_segment(log_type, day)
+        is_new = not path.exists()
+        f = open(path, 'ab')
+        if is_new:
+            f.write(SEGMENT_MAGIC)
+            f.flush(); os.fsync(f.fileno())
+            self._fsync_dir(path.parent)
+            self.manifest[log_type][day] = {"records": 0, "bytes": len(SEGMENT_MAGIC)}
+            self._recovered.add(path)
+            self._save_manifest()
+        self._open[log_type] = (day, f, self.encoders.get(log_type, JsonEncoder)())
+        return self._open[log_type]
+
+    def _abandon(self, log_type):
+        # After a failed write the tail may be torn and the encoder state is
+        # ahead of the file: re-verify the segment and reopen with a fresh encoder.
+        current = self._open.pop(log_type, None)
+        if not current: return
+        try: current[1].close()
+        except Exception: pass
+        self._recovered.discard(self.segment_path(log_type, current[0]))
+        try: self.recover_segment(log_type, current[0])
+        except Exception as e: logging.error(f"Failed to recover journal segment after write error: {e}")
+
+    def _write_record(self, log_type, record, day):
+        _, f, encoder = self._handle(log_type, day)
+        payload = encoder.encode(record)
+        try: f.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        except Exception:
+            self._abandon(log_type)
+            raise
+        entry = self.manifest[log_type][day]
+        entry["records"] += 1
+        entry["bytes"] += RECORD_HEADER.size + len(payload)
+        self._unsynced += 1
+
+    def _flush_open(self):
+        for log_type, (_, f, _) in list(self._open.items()):
+            try: f.flush()
+            except Exception:
+                self._abandon(log_type)
+                raise
+
+    def _fsync_dir(self, dir_path):
+        # Windows cannot open directories; NTFS journals the entry itself.
+        if os.name == 'nt': return
+        try:
+            fd = os.open(dir_path, os.O_RDONLY)
+            try: os.fsync(fd)
+            finally: os.close(fd)
+        except OSError: pass
+
+    def _close_file(self, f):
+        try:
+            f.flush(); os.fsync(f.fileno())
+        finally: f.close()
+
+    def append(self, log_type, record, day):
+        with self.lock:
+            self._write_record(log_type, record, day)
+            self._flush_open()
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    def append_batch(self, records):
+        """Append (log_type, record, day) tuples; fsync policy is applied once per batch."""
+        with self.lock:
+            for log_type, record, day in records:
+                self._write_record(log_type, record, day)
+            self._flush_open()
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    def _sync_locked(self, save_manifest=False):
+        for _, f, _ in self._open.values():
+            os.fsync(f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        if save_manifest or self._last_sync - self._manifest_saved >= MANIFEST_INTERVAL_SECONDS:
+            self._save_manifest()
+
+    def sync(self):
+        with self.lock: self._sync_locked(save_manifest=True)
+
+    # --- Reading --------------------------------------------------------
+    def days(self, log_type):
+        with self.lock:
+            return sorted(self.manifest.get(log_type, {}))
+
+    def iter_records(self, log_type, day):
+        path = self.segment_path(log_type, day)
+        if not path.exists(): return
+        decoder = self.decoders.get(log_type, JsonDecoder)()
+        for payload in iter_segment(path):
+            try: yield decoder.decode(payload)
+            except Exception as e: logging.warning(f"Skipping undecodable '{log_type}' record in {path.name}: {e}")
+
+    def follow(self, log_type, day):
+        return SegmentFollower(self.segment_path(log_type, day), self.decoders.get(log_type, JsonDecoder)())
+
+    def drop_day(self, log_type, day):
+        with self.lock:
+            current = self._open.get(log_type)
+            if current and current[0] == day:
+                self._close_file(current[1])
+                del self._open[log_type]
+            path = self.segment_path(log_type, day)
+            self._recovered.discard(path)
+            # Unlink before forgetting: a crash in between only leaves a stale
+            # manifest entry, which recovery drops.
+            path.unlink(missing_ok=True)
+            self.manifest.get(log_type, {}).pop(day, None)
+            self._save_manifest()
+
+    def close(self):
+        with self.lock:
+            for _, f, _ in self._open.values():
+                try: self._close_file(f)
+                except Exception as e: logging.error(f"Failed to close journal segment: {e}")
+            self._open.clear()
+            self._save_manifest()
+
+class CacheWriter(threading.Thread):
+    def __init__(self, journal, stop_event, queue_size=WRITER_QUEUE_SIZE, flush_size=WRITER_FLUSH_SIZE,
+                 flush_latency=WRITER_FLUSH_LATENCY_SECONDS, backpressure=WRITER_BACKPRESSURE):
+        super().__init__(daemon=True)
+        self.journal = journal
+        self.stop_event = stop_event
+        self.queue_size = max(1, int(queue_size))
+        self.flush_size = max(1, int(flush_size))
+        self.flush_latency = flush_latency
+        self.backpressure = backpressure
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.queue = deque()
+        self.closed = False
+        self._oldest = None
+        self._flush_requested = False
+        self.enqueued, self.written, self.dropped, self.failed, self.batches = 0, 0, 0, 0, 0
+        self.max_depth = 0
+        self.last_write_latency, self.max_write_latency, self.total_write_latency = 0.0, 0.0, 0.0
+
+    def enqueue(self, log_type, record, day):
+        dropped = False
+        with self.cond:
+            if not self.closed and len(self.queue) >= self.queue_size:
+                if self.backpressure == "drop_oldest":
+                    self.queue.popleft()
+                    self.dropped += 1
+                elif self.backpressure == "block":
+                    deadline = time.monotonic() + WRITER_BLOCK_TIMEOUT_SECONDS
+                    while len(self.queue) >= self.queue_size and not self.closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0: break
+                        self.cond.wait(remaining)
+                if len(self.queue) >= self.queue_size:
+                    self.enqueued += 1
+                    self.dropped += 1
+                    self.cond.notify_all()
+                    dropped = True
+            if not dropped:
+                if not self.queue: self._oldest = time.monotonic()
+                self.queue.append((log_type, record, day))
+                self.enqueued += 1
+                self.max_depth = max(self.max_depth, len(self.queue))
+                if len(self.queue) >= self.flush_size: self.cond.notify_all()
+            closed = self.closed
+        if dropped:
+            # Logged outside the lock: the warning counter takes the metrics lock, and metrics exports call stats().
+            logging.warning(f"Cache writer queue full, dropped a '{log_type}' record.")
+            return False
+        # Writer already drained for shutdown: write through directly.
+        if closed: self._drain()
+        return True
+
+    def _write(self, batch):
+        started = time.monotonic()
+        ok = True
+        try: self.journal.append_batch(batch)
+        except Exception as e:
+            ok = False
+            logging.error(f"Failed to write {len(batch)} cached records: {e}")
+        latency = time.monotonic() - started
+        with self.cond:
+            if ok: self.written += len(batch)
+            else: self.failed += len(batch)
+            self.batches += 1
+            self.last_write_latency = latency
+            self.max_write_latency = max(self.max_write_latency, latency)
+            self.total_write_latency += latency
+            self.cond.notify_all()
+
+    def _take_batch(self):
+        batch = [self.queue.popleft() for _ in range(min(self.flush_size, len(self.queue)))]
+        self._oldest = time.monotonic() if self.queue else None
+        self.cond.notify_all()
+        return batch
+
+    def _drain(self):
+        # write_lock keeps batches in queue order when the caller races the writer thread.
+        with self.write_lock:
+            while True:
+                with self.cond:
+                    if not self.queue: return
+                    batch = self._take_batch()
+                self._write(batch)
+
+    def _ready(self):
+        if not self.queue: return False
+        return self._flush_requested or len(self.queue) >= self.flush_size or time.monotonic() - self._oldest >= self.flush_latency
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self._ready() and not self.closed and not self.stop_event.is_set():
+                    wait = self.flush_latency if not self.queue else self.flush_latency - (time.monotonic() - self._oldest)
+                    self.cond.wait(min(max(wait, 0.01), 0.5))
+                if not self.queue and (self.closed or self.stop_event.is_set()): return
+                self._flush_requested = False
+            with self.write_lock:
+                with self.cond:
+                    if not self.queue: continue
+                    batch = self._take_batch()
+                self._write(batch)
+
+    def flush(self, timeout=None):
+        """Block until everything enqueued so far is on disk (or dropped)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self.is_alive():
+            self._drain()
+            return True
+        with self.cond:
+            target = self.enqueued
+            while self.written + self.dropped + self.failed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0: return False
+                self._flush_requested = True
+                self.cond.notify_all()
+                self.cond.wait(0.1 if remaining is None else min(remaining, 0.1))
+        return True
+
+    def close(self, timeout=10):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.is_alive(): self.join(timeout)
+        self._drain()
+        logging.info(f"Cache writer stopped: {self.stats()}")
+
+    def stats(self):
+        with self.cond:
+            return {"queue_depth": len(self.queue), "max_queue_depth": self.max_depth, "enqueued": self.enqueued,
+                    "written": self.written, "dropped": self.dropped, "failed": self.failed, "batches": self.batches,
+                    "last_write_latency": round(self.last_write_latency, 6), "max_write_latency": round(self.max_write_latency, 6),
+                    "avg_write_latency": round(self.total_write_latency / self.batches, 6) if self.batches else 0.0}
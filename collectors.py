@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# =========================================================
+# 🧩 采集器流水线 (Collector pipeline)
+# =========================================================
+#
+# Every metric source is a Collector returning a dict of snapshot fields.
+# All enabled collectors start together and each one is waited for until
+# its own deadline, counted from the start of the snapshot. A collector that
+# misses its deadline or fails contributes its last good values (or its
+# defaults) and is listed as stale. It is not restarted while its previous
+# call is still running, and is not waited for again until that call ends,
+# so one hung source never piles up threads or delays later snapshots.
+#
+# Each collector has its own worker thread: WMI/COM objects are bound to the
+# thread that created them, so a source must always run on the same thread.
+
+# 1. 每个采集器的截止时间 (seconds from the start of the snapshot)
+COLLECTOR_DEADLINE_SECONDS = 5
+COLLECTOR_DEADLINES = {"system": 2, "lhm": 5, "io": 5, "disk_space": 5, "wifi": 5, "top_processes": 5}
+
+# 2. 停用的采集器: their fields keep their defaults ("N/A") and are not listed as stale.
+#    top_processes (per-process ranking, see process_usage.py) is opt-in: remove it here to enable it.
+DISABLED_COLLECTORS = {"top_processes"}
+
+# =========================================================
+
+class Collector:
+    """A named source of snapshot fields.
+
+    defaults holds every field the collector provides, with the value used
+    before its first successful run.
+    """
+    def __init__(self, name, collect, defaults, deadline=None):
+        self.name = name
+        self.collect = collect
+        self.defaults = defaults
+        self.deadline = COLLECTOR_DEADLINES.get(name, COLLECTOR_DEADLINE_SECONDS) if deadline is None else deadline
+
+class _CollectorState:
+    def __init__(self, collector, thread_initializer):
+        self.collector = collector
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"collector-{collector.name}", initializer=thread_initializer)
+        self.pending = None
+        self.last_good = None
+        self.late = False
+        self.last_latency = None
+        self.failures, self.missed_deadlines = 0, 0
+
+class CollectorPipeline:
+    def __init__(self, collectors, thread_initializer=None, disabled=None, observe=None):
+        disabled = DISABLED_COLLECTORS if disabled is None else disabled
+        self.collectors = collectors
+        self.observe = observe      # observe(name, seconds) receives every collector run's duration
+        self.states = [_CollectorState(c, thread_initializer) for c in collectors if c.name not in disabled]
+        self.defaults = {}
+        for c in collectors: self.defaults.update(c.defaults)
+        self.last_deadline_wait = 0.0   # seconds the last snapshot spent waiting on collectors that then missed their deadline
+
+    def _run(self, state):
+        started = time.perf_counter()
+        result = state.collector.collect()
+        state.last_latency = time.perf_counter() - started
+        state.last_good = result
+        if self.observe: self.observe(f"collector.{state.collector.name}", state.last_latency)
+        return result
+
+    def collect(self):
+        """Run one snapshot's collectors; returns (fields, names of stale collectors)."""
+        started = time.monotonic()
+        carried_over = set()
+        for state in self.states:
+            if state.pending is not None and not state.pending.done():
+                carried_over.add(state.collector.name)
+            else:
+                state.pending = state.executor.submit(self._run, state)
+
+        values, stale = dict(self.defaults), []
+        self.last_deadline_wait = 0.0
+        for state in sorted(self.states, key=lambda s: s.collector.deadline):
+            c = state.collector
+            fresh = False
+            # A call still running from an earlier snapshot already missed its deadline: take its last values right away.
+            timeout = 0 if c.name in carried_over else max(0, started + c.deadline - time.monotonic())
+            waited = time.monotonic()
+            try:
+                result = state.pending.result(timeout=timeout)
+                fresh = c.name not in carried_over
+                if state.late:
+                    logging.info(f"Collector '{c.name}' is responsive again.")
+                    state.late = False
+            except FutureTimeout:
+                self.last_deadline_wait += time.monotonic() - waited
+                state.missed_deadlines += 1
+                if not state.late: logging.warning(f"Collector '{c.name}' missed its {c.deadline}s deadline, using its last values.")
+                state.late = True
+                result = state.last_good
+            except Exception as e:
+                state.failures += 1
+                logging.warning(f"Collector '{c.name}' failed: {e}")
+                result = state.last_good
+            if result: values.update(result)
+            if not fresh: stale.append(c.name)
+        return values, stale
+
+    def stats(self):
+        stats = {}
+        for state in self.states:
+            name = state.collector.name
+            stats[f"{name}.last_ms"] = round(state.last_latency * 1000, 3) if state.last_latency is not None else None
+            stats[f"{name}.missed_deadlines"], stats[f"{name}.failures"] = state.missed_deadlines, state.failures
+        return stats
+
+    def shutdown(self):
+        for state in self.states: state.executor.shutdown(wait=False)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import time
+import logging
+import psutil
+
+# =========================================================
+# 🧭 设备拓扑缓存 (GPU / disk / partition / NIC layout)
+# =========================================================
+#
+# What is attached changes rarely; what it reads changes every sample. The
+# topology (GPU count, fixed mountpoints, disk and NIC orderings) is cached
+# and rebuilt only when the psutil per-disk or per-NIC counter keys change
+# (hot-plug) or after DEVICE_TOPOLOGY_TTL_SECONDS, which also catches
+# changes that do not show up in the counters, such as a new partition
+# on an existing disk. Between rebuilds the column order stays the same.
+
+DEVICE_TOPOLOGY_TTL_SECONDS = 30 * 60
+
+# =========================================================
+
+def _is_fixed_partition(part):
+    return 'fixed' in part.opts.lower() or 'nvme' in part.fstype.lower()
+
+class DeviceTopology:
+    def __init__(self, gpu_counter, ttl=DEVICE_TOPOLOGY_TTL_SECONDS):
+        self.gpu_counter = gpu_counter
+        self.ttl = ttl
+        self.gpu_count = 1
+        self.mountpoints, self.disks, self.nics = [], [], []
+        self.disk_keys, self.nic_keys = frozenset(), frozenset()
+        self.expires = 0
+        self.rebuilds = 0
+
+    def _rebuild(self, disk_keys, nic_keys):
+        try: self.gpu_count = self.gpu_counter()
+        except Exception as e: logging.warning(f"Could not count GPUs, keeping {self.gpu_count}: {e}")
+        mountpoints = []
+        try: mountpoints = [part.mountpoint for part in psutil.disk_partitions(all=False) if _is_fixed_partition(part)]
+        except Exception as e: logging.warning(f"Could not enumerate disk partitions: {e}")
+        # Devices that were already known keep their position; new ones are appended.
+        self.mountpoints = mountpoints
+        self.disks = [d for d in self.disks if d in disk_keys] + [d for d in disk_keys if d not in self.disks]
+        self.nics = [n for n in self.nics if n in nic_keys] + [n for n in nic_keys if n not in self.nics]
+        self.disk_keys, self.nic_keys = frozenset(disk_keys), frozenset(nic_keys)
+        self.expires = time.monotonic() + self.ttl
+        self.rebuilds += 1
+
+    def get(self, disk_keys, nic_keys):
+        """Return self, rebuilt first if the counter key sets differ from the cached ones or the TTL ran out."""
+        if disk_keys != self.disk_keys or nic_keys != self.nic_keys or time.monotonic() >= self.expires:
+            self._rebuild(disk_keys, nic_keys)
+        return self
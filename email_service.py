@@ -7,9 +7,17 @@ import threading
 import smtplib
 import ssl
 import socket
+import zlib
+import hashlib
+import random
+import base64
 import zipfile
 from pathlib import Path
+from email import policy
 from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+import instrumentation
 
 # =========================================================
 # 📧 邮件服务配置
@@ -22,8 +30,15 @@ DEFAULT_ADMIN_EMAIL = "winlogger@189.cn"
 # 2. 配置文件名称 (纯文本格式)
 EMAIL_CONFIG_FILENAME = "wll.config.ini"
 
-# 3. 本地发送记录文件名
-HISTORY_FILENAME = "wll.archive.json"
+# 3. 本地发送记录文件名 / 待发送队列 (outbox, kept across restarts)
+#    The sent index is append-only (one JSON line per mailed file with its size,
+#    mtime and SHA-256); a report regenerated under the same name is sent again.
+#    It is compacted at startup, and whenever it holds more than
+#    SENT_INDEX_COMPACT_SLACK superseded lines, dropping files no longer on disk.
+SENT_INDEX_FILENAME = "wll.sent.jsonl"
+SENT_INDEX_COMPACT_SLACK = 1000
+HISTORY_FILENAME = "wll.archive.json"   # 旧版记录 (file names only), imported once into the sent index
+OUTBOX_FILENAME = "wll.outbox.json"
 
 # 4. 发件人池 (主备轮询机制)
 SENDER_POOL = [
@@ -36,25 +51,293 @@ SENDER_POOL = [
 ]
 
 # 5. 策略配置
+#    Failed attempts are retried with jittered exponential backoff
+#    (RETRY_INTERVAL_SECONDS doubling up to RETRY_MAX_SECONDS, +/- RETRY_JITTER).
+#    A new report wakes the worker and is sent right away.
 INITIAL_DELAY_SECONDS = 300  # 启动后 5 分钟检查
 RETRY_INTERVAL_SECONDS = 600 # 失败后 10 分钟重试
-MAX_RETRIES_PER_SESSION = 3  # 最大重试次数
+RETRY_MAX_SECONDS = 6 * 3600
+RETRY_JITTER = 0.2
+OUTBOX_IDLE_SECONDS = 3600   # 无失败时每小时检查一次 (new files, a re-enabled config)
+
+# 6. 单封邮件大小上限 (bytes, whole message after base64 encoding)
+#    A backlog larger than this is sent as several parts, each with its own zip.
+#    A single report bigger than the cap still goes out alone in its own part.
+MAX_MESSAGE_BYTES = 20 * 1024 * 1024
+
+# 7. 压缩判定: a sample of each file is deflated first; files that would shrink by
+#    less than MIN_DEFLATE_SAVING (encrypted xlsx never do) are stored as-is.
+COMPRESSIBILITY_SAMPLE_BYTES = 64 * 1024
+MIN_DEFLATE_SAVING = 0.1
 
 # =========================================================
 
+def _fold_header(name, value):
+    # Encodes non-ASCII values (device names, file names) the way EmailMessage would.
+    return policy.SMTP.fold_binary(*policy.SMTP.header_store_parse(name, value))
+
+def _message_chunks(headers, body, zip_path, boundary):
+    """Yield the raw message (CRLF line endings) with the zip base64-encoded straight from disk."""
+    head = b"".join(_fold_header(name, value) for name, value in headers)
+    yield head + (f'MIME-Version: 1.0\r\nContent-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'
+                  f'--{boundary}\r\nContent-Type: text/plain; charset="utf-8"\r\nContent-Transfer-Encoding: base64\r\n\r\n').encode('ascii')
+    yield base64.encodebytes(body.encode('utf-8')).replace(b"\n", b"\r\n")
+    filename = _fold_header("Content-Disposition", f'attachment; filename="{zip_path.name}"')
+    yield (f'\r\n--{boundary}\r\nContent-Type: application/zip\r\nContent-Transfer-Encoding: base64\r\n').encode('ascii') + filename + b"\r\n"
+    with open(zip_path, 'rb') as f:
+        while True:
+            data = f.read(57 * 1024)   # whole 76-character base64 lines per chunk
+            if not data: break
+            yield base64.encodebytes(data).replace(b"\n", b"\r\n")
+    yield f'\r\n--{boundary}--\r\n'.encode('ascii')
+
+def _send_streamed(smtp, sender, receiver, chunks):
+    # smtplib.send_message needs the whole message in memory; DATA is written chunk by chunk instead.
+    # Every line of the message is a header, a boundary or base64, so none starts with '.' and no dot-stuffing is needed.
+    smtp.ehlo_or_helo_if_needed()     # login() greets the server, but a relay without AUTH is never logged in to
+    code, resp = smtp.mail(sender)
+    if code != 250: raise smtplib.SMTPSenderRefused(code, resp, sender)
+    code, resp = smtp.rcpt(receiver)
+    if code not in (250, 251): raise smtplib.SMTPRecipientsRefused({receiver: (code, resp)})
+    smtp.putcmd("data")
+    code, resp = smtp.getreply()
+    if code != 354: raise smtplib.SMTPDataError(code, resp)
+    for chunk in chunks: smtp.send(chunk)
+    smtp.send(b".\r\n")
+    code, resp = smtp.getreply()
+    if code != 250: raise smtplib.SMTPDataError(code, resp)
+
+def _is_size_rejection(error):
+    # 552, or the enhanced codes 5.2.3 / 5.3.4: this message is too big for the server, smaller ones can still go through.
+    reply = error.smtp_error.decode('utf-8', 'replace') if isinstance(error.smtp_error, bytes) else str(error.smtp_error)
+    return error.smtp_code == 552 or "5.2.3" in reply or "5.3.4" in reply
+
+def _connect_ssl(host, port):
+    return smtplib.SMTP_SSL(host, port, context=ssl.create_default_context(), timeout=60)
+
+class SmtpSession:
+    """One logged-in connection reused for every message of a batch.
+
+    A send that fails on a reused connection is retried once on a fresh one
+    (servers drop idle connections); a sender that fails on a fresh
+    connection is skipped for the rest of the session. send() returns "sent",
+    "too large" when the server refused the message for its size (a smaller one
+    may pass), "rejected" for any other 5xx reply to DATA (content policy;
+    sending it again cannot help), or "failed".
+    """
+    def __init__(self, pool=None, connect=None):
+        pool = SENDER_POOL if pool is None else pool
+        self.pool = [s for s in pool if not ("REPLACE" in s[3] or "your_" in s[2])]
+        self.connect = connect or _connect_ssl
+        self.index, self.smtp = 0, None
+        self.connections = 0
+
+    def _open(self):
+        host, port, user, password = self.pool[self.index]
+        logging.info(f"Connecting to {host}...")
+        smtp = self.connect(host, port)
+        try:
+            if password: smtp.login(user, password)
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        self.connections += 1
+
+    def _drop(self):
+        if self.smtp is None: return
+        try: self.smtp.close()
+        except Exception: pass
+        self.smtp = None
+
+    def send(self, receiver, subject, body, zip_path):
+        last_error = ""
+        while self.index < len(self.pool):
+            host, _, user, _ = self.pool[self.index]
+            reused = self.smtp is not None
+            try:
+                if not reused: self._open()
+                headers = [("Subject", subject), ("From", user), ("To", receiver),
+                           ("Date", formatdate(localtime=True)), ("Message-ID", make_msgid())]
+                boundary = f"==={os.urandom(12).hex()}=="
+                _send_streamed(self.smtp, user, receiver, _message_chunks(headers, body, zip_path, boundary))
+                logging.info(f"Sent {zip_path.name} to {receiver} via {host}")
+                return "sent"
+            except Exception as e:
+                if isinstance(e, smtplib.SMTPDataError) and e.smtp_code >= 500:
+                    logging.error(f"{host} rejected {zip_path.name}: {e}")
+                    try: self.smtp.rset()
+                    except Exception: self._drop()
+                    return "too large" if _is_size_rejection(e) else "rejected"
+                last_error = str(e)
+                self._drop()
+                if reused: continue
+                logging.error(f"Failed via {host}: {e}")
+                self.index += 1
+        logging.error(f"All senders failed: {last_error}")
+        return "failed"
+
+    def close(self):
+        if self.smtp is None: return
+        try: self.smtp.quit()
+        except Exception: pass
+        self._drop()
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""): digest.update(block)
+    return digest.hexdigest()
+
+class SentIndex:
+    """Mailed reports keyed by path relative to the log folder, loaded from an append-only JSON-lines file."""
+    def __init__(self, path, base_path, clock=time.time):
+        self.path = Path(path)
+        self.base_path = Path(base_path)
+        self.clock = clock
+        self.entries = {}       # relative path -> {"size", "mtime_ns", "sha256", "sent"}
+        self.lines = 0
+        self._load()
+
+    def _load(self):
+        if not self.path.exists(): return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: entry = json.loads(line)
+                except ValueError: continue     # torn last line after a crash
+                self.entries[entry.pop("path")] = entry
+                self.lines += 1
+
+    def fingerprint(self, name):
+        path = self.base_path / name
+        st = path.stat()
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _sha256(path)}
+
+    def is_sent(self, name, st=None):
+        """True if the file on disk is the one that was mailed. Only hashed when its size matches but its mtime does not."""
+        entry = self.entries.get(name)
+        if entry is None: return False
+        try: st = st or (self.base_path / name).stat()
+        except OSError: return False
+        if st.st_size != entry["size"]: return False
+        if st.st_mtime_ns == entry["mtime_ns"]: return True
+        try: same = _sha256(self.base_path / name) == entry["sha256"]
+        except OSError: return False
+        if same: entry["mtime_ns"] = st.st_mtime_ns     # touched, not changed: skip the hash next time
+        return same
+
+    def record(self, stamps):
+        """stamps: {relative path: fingerprint taken before the file was packed}."""
+        sent = self.clock()
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for name, stamp in stamps.items():
+                    entry = dict(stamp, sent=sent)
+                    f.write(json.dumps(dict(entry, path=name), ensure_ascii=False) + "\n")
+                    self.entries[name] = entry
+                    self.lines += 1
+        except Exception as e:
+            logging.error(f"Failed to save email history: {e}")
+        if self.lines > len(self.entries) + SENT_INDEX_COMPACT_SLACK: self.compact()
+
+    def compact(self):
+        self.entries = {name: e for name, e in self.entries.items() if (self.base_path / name).exists()}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for name, entry in self.entries.items(): f.write(json.dumps(dict(entry, path=name), ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self.lines = len(self.entries)
+        except Exception as e:
+            logging.error(f"Failed to compact email history: {e}")
+
+class Outbox:
+    """Reports waiting to be mailed plus the retry state, saved in OUTBOX_FILENAME after every change."""
+    def __init__(self, path, clock=time.time):
+        self.path = Path(path)
+        self.clock = clock
+        self.pending = {}           # path relative to the log folder -> time queued
+        self.rejected = {}          # path -> {"size", "mtime_ns", "reason"}: not retried unless the file changes
+        self.failures = 0
+        self.next_attempt = None    # epoch seconds; None: right away
+        self._load()
+
+    def _load(self):
+        if not self.path.exists(): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: data = json.load(f)
+            self.pending = dict(data.get("pending", {}))
+            self.rejected = dict(data.get("rejected", {}))
+            self.failures, self.next_attempt = int(data.get("failures", 0)), data.get("next_attempt")
+        except Exception as e:
+            logging.warning(f"Email outbox unreadable, rebuilding it from the log folders: {e}")
+
+    def _save(self):
+        data = {"pending": self.pending, "rejected": self.rejected, "failures": self.failures, "next_attempt": self.next_attempt}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Failed to save email outbox: {e}")
+
+    def add(self, names):
+        new = [n for n in names if n not in self.pending]
+        if not new: return
+        now = self.clock()
+        for name in new: self.pending[name] = now
+        self._save()
+
+    def remove(self, names):
+        for name in names: self.pending.pop(name, None)
+        self._save()
+
+    def reject(self, stamps, reason):
+        for name, stamp in stamps.items():
+            self.pending.pop(name, None)
+            self.rejected[name] = {"size": stamp["size"], "mtime_ns": stamp["mtime_ns"], "reason": reason}
+        self._save()
+
+    def is_rejected(self, name, st):
+        """True while the rejected file is unchanged; a changed or deleted file is forgotten."""
+        entry = self.rejected.get(name)
+        if entry is None: return False
+        if st is not None and (st.st_size, st.st_mtime_ns) == (entry["size"], entry["mtime_ns"]): return True
+        del self.rejected[name]
+        self._save()
+        return False
+
+    def seconds_until_due(self):
+        return 0 if self.next_attempt is None else max(0, self.next_attempt - self.clock())
+
+    def record_attempt(self, success):
+        if success:
+            self.failures = 0
+            delay = OUTBOX_IDLE_SECONDS
+        else:
+            self.failures += 1
+            delay = min(RETRY_MAX_SECONDS, RETRY_INTERVAL_SECONDS * 2 ** (self.failures - 1))
+            delay *= random.uniform(1 - RETRY_JITTER, 1 + RETRY_JITTER)
+        self.next_attempt = self.clock() + delay
+        self._save()
+        return delay
+
 class EmailSender:
-    def __init__(self, base_path):
+    def __init__(self, base_path, sender_pool=None, connect=None):
         self.base_path = Path(base_path)
+        self.sender_pool, self.connect = sender_pool, connect
         self.config_file = self.base_path / EMAIL_CONFIG_FILENAME
         self.history_file = self.base_path / HISTORY_FILENAME
+        self.dirs_to_scan = ["Hardware", "Events"]
+        self.dir_state = {}     # log dir -> (mtime_ns, unsent files found at that mtime)
         
         # 1. 初始化时确保配置文件存在 (若不存在则创建 'do not send')
         self._ensure_config_exists()
         
-        self.sent_files = self._load_history()
-        self.lock = threading.Lock()
-        
-        self.dirs_to_scan = ["Hardware", "Events"]
+        self.sent_index = SentIndex(self.base_path / SENT_INDEX_FILENAME, self.base_path)
+        if not self.sent_index.path.exists(): self._import_history()
+        self.sent_index.compact()
+        self.outbox = Outbox(self.base_path / OUTBOX_FILENAME)
 
     def _ensure_config_exists(self):
         """确保配置文件存在，默认禁用邮件发送"""
@@ -69,20 +352,21 @@ class EmailSender:
             except Exception as e:
                 logging.error(f"Failed to create default config: {e}")
 
-    def _load_history(self):
+    def _import_history(self):
+        # The old history only has file names: the copies on disk now are taken to be the ones sent.
+        names = set()
         if self.history_file.exists():
             try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return set(json.load(f))
-            except: return set()
-        return set()
-
-    def _save_history(self):
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(list(self.sent_files), f)
-        except Exception as e:
-            logging.error(f"Failed to save email history: {e}")
+                with open(self.history_file, 'r', encoding='utf-8') as f: names = set(json.load(f))
+            except Exception as e: logging.warning(f"Could not read old email history: {e}")
+        stamps = {}
+        for log_dir in self.dirs_to_scan:
+            for name in names:
+                rel = f"{log_dir}/{name}"
+                try: stamps[rel] = self.sent_index.fingerprint(rel)
+                except OSError: pass
+        self.sent_index.record(stamps)
+        if stamps: logging.info(f"Imported {len(stamps)} sent reports from {HISTORY_FILENAME}.")
 
     def get_receiver(self):
         """
@@ -121,30 +405,97 @@ class EmailSender:
         try: return socket.gethostname()
         except: return "UnknownDevice"
 
+    @staticmethod
+    def _file_date(path):
+        parts = path.name.split('_')
+        return parts[1] if len(parts) > 1 else ""
+
+    @staticmethod
+    def _date_range(files):
+        sorted_dates = sorted({d for d in map(EmailSender._file_date, files) if d})
+        if not sorted_dates: return "unknown"
+        date_range = f"{sorted_dates[0]}"
+        if len(sorted_dates) > 1: date_range += f"~{sorted_dates[-1]}"
+        return date_range
+
+    @staticmethod
+    def _measure(path):
+        """Returns (size, compress_type, estimated size inside the zip) from a deflated sample spread over the file."""
+        size = path.stat().st_size
+        if size == 0: return size, zipfile.ZIP_STORED, 0
+        chunk = COMPRESSIBILITY_SAMPLE_BYTES // 4
+        sampled = packed = 0
+        with open(path, 'rb') as f:
+            for offset in sorted({0, size // 3, 2 * size // 3, max(0, size - chunk)}):
+                f.seek(offset)
+                data = f.read(chunk)
+                sampled += len(data)
+                packed += len(zlib.compress(data, 6))
+        ratio = packed / sampled
+        if ratio > 1 - MIN_DEFLATE_SAVING: return size, zipfile.ZIP_STORED, size
+        return size, zipfile.ZIP_DEFLATED, int(size * min(1.0, ratio + 0.05))
+
+    @staticmethod
+    def part_budget():
+        # Zip bytes that fit in one message: base64 turns 57 bytes into a 78-byte line, minus room for headers and body.
+        return (MAX_MESSAGE_BYTES - 16 * 1024) * 57 // 78
+
+    def plan_parts(self, files):
+        """Split files (oldest day first) into parts whose estimated zip size fits the message cap.
+
+        Returns a list of parts, each a list of (path, compress_type)."""
+        budget = self.part_budget()
+        parts, current, used = [], [], 0
+        for path in sorted(files, key=lambda f: (self._file_date(f), f.name)):
+            try: _, compress_type, estimate = self._measure(path)
+            except OSError as e:
+                logging.warning(f"Skipping unreadable log {path.name}: {e}")
+                continue
+            cost = estimate + 100 + 2 * len(path.name.encode('utf-8'))    # local header + central directory entry
+            if current and used + cost > budget:
+                parts.append(current)
+                current, used = [], 0
+            if not current and cost > budget: logging.warning(f"{path.name} alone exceeds the email size cap; sending it in its own part.")
+            current.append((path, compress_type))
+            used += cost
+        if current: parts.append(current)
+        return parts
+
     def scan_files_to_send(self):
+        # Reports are published by renaming them into place, which changes the folder's mtime:
+        # a folder whose mtime is unchanged is not listed again, only its known unsent files are re-checked.
         files_to_send = []
         for log_dir in self.dirs_to_scan:
             dir_path = self.base_path / log_dir
-            if not dir_path.exists(): continue
-            for f in dir_path.glob("*.xlsx"):
-                if f.name not in self.sent_files:
-                    files_to_send.append(f)
+            try: mtime = dir_path.stat().st_mtime_ns
+            except OSError: continue
+            known = self.dir_state.get(log_dir)
+            if known and known[0] == mtime:
+                unsent = [name for name in known[1] if not self.sent_index.is_sent(name)]
+            else:
+                with os.scandir(dir_path) as it:
+                    unsent = [f"{log_dir}/{e.name}" for e in it
+                              if e.name.endswith(".xlsx") and e.is_file() and not self.sent_index.is_sent(f"{log_dir}/{e.name}", e.stat())]
+            self.dir_state[log_dir] = (mtime, unsent)
+            files_to_send.extend(self.base_path / name for name in unsent)
         return files_to_send
 
-    def create_zip_archive(self, files, device_name, date_range_str):
+    def create_zip_archive(self, files, device_name, date_range_str, part_label=""):
+        """files: list of (path, compress_type). The zip is written to disk file by file."""
         # 使用英文半角括号
-        zip_name = f"Logs_{device_name}({date_range_str}).zip"
+        zip_name = f"Logs_{device_name}({date_range_str}){part_label}.zip"
         zip_path = self.base_path / "cache" / zip_name
         try:
             zip_path.parent.mkdir(parents=True, exist_ok=True)
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for file_path in files:
-                    zf.write(file_path, arcname=file_path.name)
+            with zipfile.ZipFile(zip_path, 'w') as zf:
+                for file_path, compress_type in files:
+                    zf.write(file_path, arcname=file_path.name, compress_type=compress_type)
             return zip_path
         except Exception as e:
             logging.error(f"Failed to create zip: {e}")
             return None
 
+    @instrumentation.METRICS.timed("email_send_batch")
     def send_batch(self):
         receiver = self.get_receiver()
         if not receiver: return True # 配置为不发送，视为任务完成
@@ -153,96 +504,126 @@ class EmailSender:
             logging.warning("No internet. Email skipped.")
             return False
 
-        files = self.scan_files_to_send()
+        # 新报告入队, then send everything queued that is still on disk and not sent yet.
+        new = []
+        for f in self.scan_files_to_send():
+            name = f.relative_to(self.base_path).as_posix()
+            try: st = f.stat()
+            except OSError: st = None
+            if not self.outbox.is_rejected(name, st): new.append(name)
+        self.outbox.add(new)
+        files, gone = [], []
+        for name in self.outbox.pending:
+            path = self.base_path / name
+            if not path.exists() or self.sent_index.is_sent(name): gone.append(name)
+            else: files.append(path)
+        if gone: self.outbox.remove(gone)
         if not files:
             logging.info("No new logs.")
             return True
 
-        # 日期范围
-        dates = set()
-        for f in files:
-            parts = f.name.split('_')
-            if len(parts) > 1: dates.add(parts[1])
-        sorted_dates = sorted(list(dates))
-        date_range = f"{sorted_dates[0]}"
-        if len(sorted_dates) > 1: date_range += f"~{sorted_dates[-1]}"
-
         device_name = self.get_device_name()
-
-        # 打包
-        logging.info(f"Compressing {len(files)} files...")
-        zip_path = self.create_zip_archive(files, device_name, date_range)
-        if not zip_path: return False
-
-        # 构建邮件
-        subject = f"Logs_{device_name}({date_range})"
-        body = f"{device_name}'s Logs"
-
-        success = False
-        last_error = ""
-
-        for host, port, user, password in SENDER_POOL:
-            if "REPLACE" in password or "your_" in user: continue
-            try:
-                msg = EmailMessage()
-                msg['Subject'] = subject
-                msg['From'] = user
-                msg['To'] = receiver
-                msg.set_content(body)
-
-                with open(zip_path, 'rb') as f:
-                    msg.add_attachment(f.read(), maintype='application', subtype='zip', filename=zip_path.name)
-
-                logging.info(f"Sending via {host}...")
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(host, port, context=context, timeout=60) as smtp:
-                    smtp.login(user, password)
-                    smtp.send_message(msg)
-                
-                logging.info(f"Sent to {receiver}")
-                success = True
-                break
-            except Exception as e:
-                last_error = str(e)
-                logging.error(f"Failed via {host}: {e}")
+        parts = self.plan_parts(files)
+        if len(parts) > 1: logging.info(f"{len(files)} files exceed the email size cap, sending them in {len(parts)} parts.")
+
+        # 每个分卷单独打包发送, and recorded as soon as it is sent: after a failure only the unsent parts go out next time.
+        session = SmtpSession(self.sender_pool, self.connect)
+        try: return self._send_parts(parts, receiver, device_name, session)
+        finally: session.close()
+
+    def _send_parts(self, parts, receiver, device_name, session):
+        all_sent, index = True, 0
+        while index < len(parts):
+            part = parts[index]
+            index += 1
+            part_files = [path for path, _ in part]
+            date_range = self._date_range(part_files)
+            part_label = f"_part{index}of{len(parts)}" if len(parts) > 1 else ""
+
+            # Fingerprinted before packing: a report rewritten while it is being sent no longer matches and goes out again.
+            names = [f.relative_to(self.base_path).as_posix() for f in part_files]
+            try: stamps = {name: self.sent_index.fingerprint(name) for name in names}
+            except OSError as e:
+                logging.warning(f"Log changed while preparing the email: {e}")
+                all_sent = False
                 continue
 
-        try:
-            if zip_path.exists(): os.remove(zip_path)
-        except: pass
-
-        if success:
-            with self.lock:
-                for f in files: self.sent_files.add(f.name)
-                self._save_history()
-            return True
-        else:
-            logging.error(f"All senders failed: {last_error}")
-            return False
-
-def _email_worker(base_path, stop_event):
-    sender = EmailSender(base_path)
-    logging.info(f"Email scheduler waiting {INITIAL_DELAY_SECONDS}s...")
-    if stop_event.wait(INITIAL_DELAY_SECONDS): return
-
-    retry_count = 0
-    while not stop_event.is_set():
-        try:
-            if sender.send_batch():
-                logging.info("Email task completed.")
-                break
+            logging.info(f"Compressing {len(part_files)} files...")
+            zip_path = self.create_zip_archive(part, device_name, date_range, part_label)
+            if not zip_path:
+                all_sent = False
+                continue
+            if zip_path.stat().st_size > self.part_budget():
+                # The sampled estimate was too low.
+                os.remove(zip_path)
+                outcome = "too large"
             else:
-                retry_count += 1
-                if retry_count >= MAX_RETRIES_PER_SESSION:
-                    logging.warning("Max retries reached.")
-                    break
-                logging.info(f"Retrying in {RETRY_INTERVAL_SECONDS}s...")
-                if stop_event.wait(RETRY_INTERVAL_SECONDS): break
-        except Exception as e:
-            logging.error(f"Email worker error: {e}")
-            break
+                # 构建邮件
+                subject = f"Logs_{device_name}({date_range})" + (f" [{index}/{len(parts)}]" if len(parts) > 1 else "")
+                body = f"{device_name}'s Logs"
+                outcome = session.send(receiver, subject, body, zip_path)
+
+                try:
+                    if zip_path.exists(): os.remove(zip_path)
+                except: pass
+
+            if outcome == "too large":
+                if len(part) > 1:
+                    # Split this part in two and build both halves again.
+                    index -= 1
+                    parts[index:index + 1] = [part[:len(part) // 2], part[len(part) // 2:]]
+                else:
+                    logging.error(f"{part_files[0].name} does not fit in one email; it will not be mailed unless it changes.")
+                    self.outbox.reject(stamps, "too large")
+            elif outcome == "sent":
+                self.sent_index.record(stamps)
+                self.outbox.remove(stamps)
+            elif outcome == "rejected":
+                # Refused for good: set aside so the parts after it still go out.
+                self.outbox.reject(stamps, "rejected by server")
+            else:
+                all_sent = False
+                break   # the senders are down; the remaining parts wait for the retry
+        return all_sent
+
+class EmailWorker(threading.Thread):
+    """Sends the outbox at startup (after INITIAL_DELAY_SECONDS), whenever wake() reports new files,
+    and otherwise when its retry or idle timer runs out."""
+    def __init__(self, base_path, stop_event, sender=None, initial_delay=INITIAL_DELAY_SECONDS):
+        super().__init__(daemon=True, name="EmailWorker")
+        self.sender = sender or EmailSender(base_path)
+        self.stop_event = stop_event
+        self.wake_event = threading.Event()
+        self.initial_delay = initial_delay
+        self.attempts = 0
+
+    def wake(self):
+        self.wake_event.set()
+
+    def run(self):
+        logging.info(f"Email scheduler waiting {self.initial_delay}s...")
+        if self.stop_event.wait(self.initial_delay): return
+        outbox = self.sender.outbox
+        due = True      # one attempt at startup even during a backoff carried over from the last run
+        while not self.stop_event.is_set():
+            if due:
+                self.wake_event.clear()
+                self.attempts += 1
+                try: success = self.sender.send_batch()
+                except Exception as e:
+                    logging.error(f"Email worker error: {e}", exc_info=True)
+                    success = False
+                delay = outbox.record_attempt(success)
+                if success: logging.info("Email task completed.")
+                else: logging.info(f"Retrying in {delay:.0f}s (attempt {outbox.failures} failed).")
+            woken = self.wake_event.wait(outbox.seconds_until_due())
+            due = (woken or outbox.seconds_until_due() == 0) and not self.stop_event.is_set()
+
+    def stats(self):
+        outbox = self.sender.outbox
+        return {"attempts": self.attempts, "pending": len(outbox.pending), "failures": outbox.failures}
 
 def start_email_service(base_path, stop_event):
-    t = threading.Thread(target=_email_worker, args=(base_path, stop_event), daemon=True)
+    t = EmailWorker(base_path, stop_event)
     t.start()
     return t
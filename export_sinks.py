@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import gzip
+import uuid
+import sqlite3
+import contextlib
+import logging
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# =========================================================
+# 📦 导出后端 (Columnar / SQLite exports next to the xlsx reports)
+# =========================================================
+#
+# Exports are written from the same day stream as the Excel report, using the
+# raw snapshot keys as column names (list columns become key_1..key_n), so they
+# can be scanned in bulk without decrypting workbooks. NOTE: exports are NOT
+# encrypted; only enable them where the log folder itself is protected.
+
+# 1. 列式文件: Parquet when pyarrow is installed, gzip CSV otherwise.
+#    <export dir>/<Type>/<YYYY-MM-DD>.parquet | .csv.gz
+PARQUET_ROW_GROUP_ROWS = 4096
+CSV_COMPRESS_LEVEL = 6
+
+# 2. SQLite: one database, one table per log type, indexed by timestamp.
+SQLITE_FILENAME = "wll.export.sqlite3"
+SQLITE_BUSY_TIMEOUT_SECONDS = 60
+SQLITE_BATCH_ROWS = 500
+
+PARTIAL_SUFFIX = ".part"
+
+# =========================================================
+
+def column_layout(column_keys, max_list_cols):
+    """[(column name, key, list index or None)] for one day's export."""
+    layout = []
+    for key in column_keys:
+        if key not in max_list_cols:
+            layout.append((key, key, None))
+            continue
+        width = max(max_list_cols[key], 1)
+        if width == 1: layout.append((key, key, 0))
+        else: layout.extend((f"{key}_{i+1}", key, i) for i in range(width))
+    return layout
+
+def _flatten(record, layout, numeric):
+    row = []
+    for name, key, index in layout:
+        value = record.get(key)
+        if index is not None:
+            value = value[index] if isinstance(value, list) and index < len(value) else None
+        if name in numeric:
+            value = float(value) if type(value) in (int, float) else None
+        elif value is not None and not isinstance(value, str):
+            value = str(value)
+        elif value == "N/A":
+            value = None
+        row.append(value)
+    return row
+
+class _AtomicFileSink:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.partial = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}")
+
+    def _publish(self):
+        os.replace(self.partial, self.path)
+
+    def abort(self):
+        try: self.partial.unlink(missing_ok=True)
+        except OSError: pass
+
+class CsvGzipSink(_AtomicFileSink):
+    suffix = ".csv.gz"
+
+    def __init__(self, path, layout, numeric):
+        super().__init__(path)
+        self.layout, self.numeric = layout, numeric
+        self.file = gzip.open(self.partial, 'wt', encoding='utf-8', newline='', compresslevel=CSV_COMPRESS_LEVEL)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, _, _ in layout])
+
+    def write(self, record):
+        self.writer.writerow(_flatten(record, self.layout, self.numeric))
+
+    def commit(self):
+        self.file.close()
+        self._publish()
+
+    def abort(self):
+        try: self.file.close()
+        except Exception: pass
+        super().abort()
+
+class ParquetSink(_AtomicFileSink):
+    suffix = ".parquet"
+
+    def __init__(self, path, layout, numeric):
+        super().__init__(path)
+        self.layout, self.numeric = layout, numeric
+        self.schema = pa.schema([(name, pa.float64() if name in numeric else pa.string()) for name, _, _ in layout])
+        self.writer = pq.ParquetWriter(str(self.partial), self.schema, compression="zstd")
+        self.rows = []
+
+    def _flush(self):
+        if not self.rows: return
+        columns = list(zip(*self.rows))
+        self.writer.write_table(pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, self.schema)], schema=self.schema))
+        self.rows = []
+
+    def write(self, record):
+        self.rows.append(_flatten(record, self.layout, self.numeric))
+        if len(self.rows) >= PARQUET_ROW_GROUP_ROWS: self._flush()
+
+    def commit(self):
+        self._flush()
+        self.writer.close()
+        self._publish()
+
+    def abort(self):
+        try: self.writer.close()
+        except Exception: pass
+        super().abort()
+
+class SqliteSink:
+    # A day's rows are staged in a TEMP table (private to this connection, no database lock) in batches,
+    # then moved into the shared table in one short BEGIN IMMEDIATE transaction that also deletes the
+    # day's old rows. Re-exporting a day replaces it, and an aborted export leaves nothing behind.
+    # The backlog pool exports several days at once, so the schema is also only changed under BEGIN IMMEDIATE.
+    def __init__(self, db_path, table, date_str, layout, numeric):
+        self.layout, self.numeric, self.date_str = layout, numeric, date_str
+        self.table = table
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        columns = [(name, "REAL" if name in numeric else "TEXT") for name, _, _ in layout]
+        column_defs = "".join(f', "{name}" {kind}' for name, kind in columns)
+        try:
+            with self._immediate():
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (day TEXT NOT NULL, ts TEXT NOT NULL)')
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_ts" ON "{table}" (ts)')
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_day" ON "{table}" (day)')
+                existing = {row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")')}
+                for name, kind in columns:
+                    if name not in existing: self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {kind}')
+            self.conn.execute(f'CREATE TEMP TABLE staged (day TEXT NOT NULL, ts TEXT NOT NULL{column_defs})')
+        except Exception:
+            self.conn.close()
+            raise
+        self.names = ", ".join(["day", "ts"] + [f'"{name}"' for name, _ in columns])
+        self.insert_sql = f'INSERT INTO temp.staged ({self.names}) VALUES ({", ".join("?" * (len(columns) + 2))})'
+        self.rows = []
+
+    @contextlib.contextmanager
+    def _immediate(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try: yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def write(self, record):
+        # Event records only carry the time of day; the index wants full timestamps.
+        ts = record.get("timestamp") or ""
+        if len(ts) <= 8: ts = f"{self.date_str} {ts}"
+        self.rows.append([self.date_str, ts] + _flatten(record, self.layout, self.numeric))
+        if len(self.rows) >= SQLITE_BATCH_ROWS: self._flush()
+
+    def _flush(self):
+        if self.rows: self.conn.executemany(self.insert_sql, self.rows)
+        self.rows = []
+
+    def commit(self):
+        try:
+            self._flush()
+            with self._immediate():
+                self.conn.execute(f'DELETE FROM main."{self.table}" WHERE day = ?', (self.date_str,))
+                self.conn.execute(f'INSERT INTO main."{self.table}" ({self.names}) SELECT {self.names} FROM temp.staged')
+        finally: self.conn.close()
+
+    def abort(self):
+        self.conn.close()
+
+class DayExport:
+    """Fans one day's records out to the configured sinks.
+
+    Exports are secondary to the encrypted report: a failing sink is logged
+    and dropped for that day instead of failing the report.
+    """
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def _run(self, action, *args):
+        for name, sink in list(self.sinks.items()):
+            try: getattr(sink, action)(*args)
+            except Exception as e:
+                logging.error(f"Export sink '{name}' failed during {action}: {e}")
+                del self.sinks[name]
+                if action != "abort":
+                    try: sink.abort()
+                    except Exception: pass
+
+    def write(self, record): self._run("write", record)
+    def commit(self): self._run("commit")
+    def abort(self): self._run("abort")
+
+def open_day_export(sink_names, export_root, date_str, data_type, column_keys, max_list_cols, numeric_keys=()):
+    """Open the sinks named in sink_names ("columnar", "sqlite") for one day of one log type."""
+    layout = column_layout(column_keys, max_list_cols)
+    numeric = {name for name, key, _ in layout if key in numeric_keys}
+    export_root = Path(export_root)
+    sinks = {}
+    for name in sink_names:
+        try:
+            if name == "columnar":
+                sink_cls = ParquetSink if pq else CsvGzipSink
+                sinks[name] = sink_cls(export_root / data_type.capitalize() / f"{date_str}{sink_cls.suffix}", layout, numeric)
+            elif name == "sqlite":
+                sinks[name] = SqliteSink(export_root / SQLITE_FILENAME, data_type, date_str, layout, numeric)
+            else: logging.warning(f"Unknown export sink '{name}' ignored.")
+        except Exception as e:
+            logging.error(f"Failed to open export sink '{name}' for {data_type} {date_str}: {e}")
+    return DayExport(sinks)
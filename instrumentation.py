@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import json
+import bisect
+import logging
+import datetime
+import threading
+import functools
+import contextlib
+import psutil
+
+# =========================================================
+# 📊 自我监测 (Self-instrumentation)
+# =========================================================
+#
+# Stage timings go into fixed-bucket histograms (monotonic clock), with
+# counters and gauges beside them. Everything is kept per calendar day: the
+# first observation of a new day moves the current figures to "previous".
+# A background thread refreshes the logger's own CPU/RSS gauges and writes
+# both days to METRICS_FILENAME every METRICS_FLUSH_SECONDS.
+
+# 1. 延迟分桶上限 (milliseconds); slower observations land in an open-ended last bucket
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# 2. 指标文件 (written next to the email config in the log folder)
+METRICS_FILENAME = "wll.metrics.json"
+METRICS_FLUSH_SECONDS = 300
+
+# 3. 日报中附加 "Logger Metrics" 工作表 (off by default)
+METRICS_REPORT_SHEET = False
+
+# =========================================================
+
+class Histogram:
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count, self.total_ms, self.max_ms = 0, 0.0, 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms: self.max_ms = ms
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th observation (the max for the open-ended bucket).
+        rank, seen = q / 100 * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank: return round(min(LATENCY_BUCKETS_MS[i], self.max_ms) if i < len(LATENCY_BUCKETS_MS) else self.max_ms, 3)
+        return round(self.max_ms, 3)
+
+    def as_dict(self):
+        labels = [f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+        return {"count": self.count, "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+                "p50_ms": self.percentile(50), "p95_ms": self.percentile(95), "p99_ms": self.percentile(99), "max_ms": round(self.max_ms, 3),
+                "buckets": {label: n for label, n in zip(labels, self.counts) if n}}
+
+class Metrics:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.RLock()   # sources may log, and logging a warning counts it
+        self.day = None
+        self.histograms, self.counters, self.gauges = {}, {}, {}
+        self.previous = None
+        self.sources = {}
+
+    def _roll(self):
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        if today == self.day: return
+        if self.day is not None: self.previous = self._export()     # without source gauges: those describe the present
+        self.day = today
+        self.histograms, self.counters = {}, {}
+
+    def _export(self):
+        # Called under the lock; the sources are read afterwards by _read_sources.
+        return {"day": self.day, "histograms": {name: h.as_dict() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())), "gauges": dict(sorted(self.gauges.items()))}
+
+    def _read_sources(self, export, sources):
+        # Outside the lock: sources take their own locks, and code holding those may log (and so count) a warning.
+        gauges = dict(export["gauges"])
+        for name, source in sources.items():
+            try:
+                for key, value in source().items(): gauges[f"{name}.{key}"] = value
+            except Exception: pass
+        return dict(export, gauges=dict(sorted(gauges.items())))
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self._roll()
+            histogram = self.histograms.get(name)
+            if histogram is None: histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds * 1000)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self._roll()
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self.lock: self.gauges[name] = value
+
+    def add_source(self, name, source):
+        """source() returns a dict of gauges, read whenever the metrics are exported."""
+        with self.lock: self.sources[name] = source
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        started = self.clock()
+        try: yield
+        finally: self.observe(name, self.clock() - started)
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name): return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def day_snapshot(self, day):
+        with self.lock:
+            self._roll()
+            if day != self.day: return self.previous if self.previous and self.previous["day"] == day else None
+            export, sources = self._export(), dict(self.sources)
+        return self._read_sources(export, sources)
+
+    def flush(self, path):
+        with self.lock:
+            self._roll()
+            today, previous, sources = self._export(), self.previous, dict(self.sources)
+        data = {"updated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "today": self._read_sources(today, sources), "previous": previous}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+METRICS = Metrics()
+
+class LogLevelCounter(logging.Handler):
+    # Counts warnings and errors logged anywhere in the process.
+    def __init__(self, metrics):
+        super().__init__(level=logging.WARNING)
+        self.metrics = metrics
+
+    def emit(self, record):
+        self.metrics.count(f"log.{record.levelname.lower()}")
+
+class MetricsFlusher(threading.Thread):
+    def __init__(self, path, stop_event, metrics=METRICS, interval=METRICS_FLUSH_SECONDS):
+        super().__init__(daemon=True, name="MetricsFlusher")
+        self.path, self.stop_event, self.metrics, self.interval = path, stop_event, metrics, interval
+        self.process = psutil.Process()
+        self.process.cpu_percent(None)
+
+    def _flush(self):
+        try:
+            # Same scale as the CPU column of the hardware log (all cores = 100 %).
+            self.metrics.gauge("logger.cpu_percent", round(self.process.cpu_percent(None) / (psutil.cpu_count() or 1), 2))
+            self.metrics.gauge("logger.rss_mb", round(self.process.memory_info().rss / (1024**2), 1))
+            self.metrics.flush(self.path)
+        except Exception as e: logging.warning(f"Could not write metrics file: {e}")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval): self._flush()
+        self._flush()
+
+def start_metrics_service(base_path, stop_event):
+    logging.getLogger().addHandler(LogLevelCounter(METRICS))
+    t = MetricsFlusher(os.path.join(base_path, METRICS_FILENAME), stop_event)
+    t.start()
+    return t
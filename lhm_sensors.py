@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import time
+import logging
+
+# =========================================================
+# 🌡️ LibreHardwareMonitor 传感器读取 (cached sensor topology)
+# =========================================================
+#
+# The sensor layout (which sensor is a CPU package temperature, which one a
+# GPU load, ...) only changes when hardware does, so it is classified once and
+# kept as Identifier -> (device type, category, order). Each sample is then one Sensor
+# query for (Identifier, Value) joined against that map. The topology is
+# rebuilt, with one Hardware and one full Sensor query, whenever the set of
+# sensor identifiers changes.
+#
+# connect() must return an object shaped like the wmi module's namespace
+# (Hardware(), Sensor(fields)); anything with that shape works, which is how
+# the reader is exercised off Windows.
+
+# Categories (order of the lists in the snapshot follows LHM device order)
+CPU_CORE_AVERAGE = "cpu_core_average"
+CPU_PACKAGE = "cpu_package"
+GPU_TEMP = "gpu_temp"
+GPU_LOAD = "gpu_load"
+DISK_TEMP = "disk_temp"
+FAN = "fan"
+
+SAMPLE_FIELDS = ["Identifier", "Value"]
+
+# =========================================================
+
+def classify(device_type, sensor_type, name):
+    name = (name or "").lower()
+    if device_type == 'Cpu' and sensor_type == 'Temperature':
+        if 'core average' in name: return CPU_CORE_AVERAGE
+        if 'package' in name or 'tctl/tdie' in name: return CPU_PACKAGE
+        return None
+    if 'Gpu' in device_type and sensor_type == 'Temperature': return GPU_TEMP
+    if 'Gpu' in device_type and sensor_type == 'Load' and 'core' in name: return GPU_LOAD
+    if 'Storage' in device_type and sensor_type == 'Temperature': return DISK_TEMP
+    if sensor_type == 'Fan': return FAN
+    return None
+
+class LhmSensorReader:
+    def __init__(self, connect, observe=None):
+        self.connect = connect
+        self.observe = observe      # observe("lhm_sample", seconds) receives every successful read's latency
+        self.conn = None
+        self.topology = {}      # Identifier -> (device type, category, order), classified sensors only
+        self.plan = []          # (Identifier, category) in snapshot order
+        self.known_ids = frozenset()
+        self.rebuilds = 0
+        self.last_latency = None    # seconds, query + join of the last successful read
+
+    def _rebuild(self):
+        try: devices = [(d.Identifier, d.HardwareType) for d in self.conn.Hardware()]
+        except Exception as e:
+            # Old LHM/OHM builds have no Hardware class: keep the sensors but without a device type.
+            logging.info(f"LHM Hardware class unavailable, classifying sensors without device types: {e}")
+            devices = []
+        device_order = {identifier: i for i, (identifier, _) in enumerate(devices)}
+        device_types = dict(devices)
+        sensors = list(self.conn.Sensor())
+        parents = [getattr(sensor, 'Parent', None) for sensor in sensors]
+        ordered = sorted(range(len(sensors)), key=lambda i: (device_order.get(parents[i], len(devices)), i))
+
+        topology = {}
+        for order, i in enumerate(ordered):
+            sensor = sensors[i]
+            device_type = device_types.get(parents[i], 'Unknown')
+            category = classify(device_type, sensor.SensorType, sensor.Name)
+            if category: topology[sensor.Identifier] = (device_type, category, order)
+        self.topology = topology
+        self.plan = [(identifier, category) for identifier, (_, category, _) in sorted(topology.items(), key=lambda item: item[1][2])]
+        self.known_ids = frozenset(s.Identifier for s in sensors)
+        self.rebuilds += 1
+        logging.info(f"LHM sensor topology rebuilt: {len(sensors)} sensors, {len(topology)} in use.")
+        return sensors
+
+    def _sample(self):
+        values = {s.Identifier: s.Value for s in self.conn.Sensor(SAMPLE_FIELDS)}
+        if values.keys() != self.known_ids:
+            values = {s.Identifier: s.Value for s in self._rebuild()}
+        return values
+
+    def read(self):
+        """Return {category: [values in device order]} for the classified sensors; {} when LHM is unavailable."""
+        started = time.perf_counter()
+        if self.conn is None:
+            try: self.conn = self.connect()
+            except Exception: return {}
+        try:
+            values = self._sample()
+        except Exception as e:
+            logging.warning(f"Connection to LHM lost ({e}). Will retry next cycle.")
+            self.conn, self.topology, self.plan, self.known_ids = None, {}, [], frozenset()
+            return {}
+
+        readings = {}
+        for identifier, category in self.plan:
+            value = values.get(identifier)
+            if value is not None: readings.setdefault(category, []).append(value)
+        self.last_latency = time.perf_counter() - started
+        if self.observe: self.observe("lhm_sample", self.last_latency)
+        return readings
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+import time
+import queue
+import ntpath
+import random
+import logging
+import threading
+from collections import namedtuple
+import psutil
+
+# =========================================================
+# 🔄 进程启动/退出事件源 (Process start/stop event sources)
+# =========================================================
+#
+# ProcessMonitor reads ProcessEvents from one source and turns them into
+# "start"/"close" rows. Sources:
+#   WmiTraceEventSource  pushed Win32_ProcessStartTrace/StopTrace events with
+#                        kernel timestamps, so short-lived processes are seen too
+#   PollingEventSource   diff of the PID set every PROCESS_POLL_SECONDS (fallback)
+#   SyntheticEventSource generated events for load tests, runs anywhere
+
+# 1. 事件源: "auto" (WMI traces, polling if they are unavailable or fail) or "poll"
+PROCESS_EVENT_SOURCE = "auto"
+
+# 2. 轮询间隔 (polling fallback)
+PROCESS_POLL_SECONDS = 5
+
+# 3. 推送事件的缓冲上限; events beyond it are dropped and counted
+PROCESS_EVENT_QUEUE_SIZE = 10000
+
+# 4. 系统目录下的进程在启动后多久内出现可见窗口仍记为应用 (pushed starts arrive before the window exists)
+GUI_DETECTION_GRACE_SECONDS = 15
+
+# 5. 事件合并 (off by default): starts/closes of the same (app_name, path) that follow each other
+#    within EVENT_COALESCE_WINDOW_SECONDS become one "grouped" row. A group is written after a
+#    quiet window, after EVENT_COALESCE_MAX_SECONDS at most, or on shutdown; a lone start or
+#    close is written unchanged, only up to one window later.
+EVENT_COALESCING_ENABLED = False
+EVENT_COALESCE_WINDOW_SECONDS = 30
+EVENT_COALESCE_MAX_SECONDS = 600
+EVENT_COALESCE_MAX_GROUPS = 256     # open groups beyond this flush the oldest one early
+
+# Events-sheet columns only grouped rows fill; the sheet has them only while coalescing is enabled
+COALESCED_COLUMNS = ("end_time", "instances", "peak_instances")
+
+# =========================================================
+
+# kind is "start" or "stop"; timestamp is epoch seconds of the start/exit, None for a start whose
+# time is the process creation time. name and exe are filled in when the source knows them;
+# otherwise the monitor looks the process up.
+ProcessEvent = namedtuple("ProcessEvent", "kind pid timestamp name exe", defaults=(None, None))
+
+# key is (pid, create_time); user_app is the path-based classification.
+ProcessIdentity = namedtuple("ProcessIdentity", "key name exe user_app")
+
+FILETIME_EPOCH_OFFSET = 11644473600   # seconds between 1601-01-01 and 1970-01-01
+
+def filetime_to_epoch(value):
+    return int(value) / 10**7 - FILETIME_EPOCH_OFFSET
+
+class ProcessEventSource:
+    """open() raises if the source is unavailable; read(timeout) returns the events
+    that arrived within at most timeout seconds, in the order they happened for each PID."""
+    def open(self):
+        pass
+
+    def read(self, timeout):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class ProcessIdentityCache:
+    # Name, path and classification of live processes, keyed by (pid, create_time) so a recycled
+    # PID never inherits its predecessor's identity. Entries are dropped when the process exits
+    # or its PID is taken by a new process. The psutil.Process of each lookup is kept, so checking
+    # that a live PID still belongs to the same process (polling reuse check, pending window
+    # check) is one identity read instead of a new lookup.
+    def __init__(self, classify):
+        self.classify = classify
+        self.entries = {}       # (pid, create_time) -> ProcessIdentity
+        self.by_pid = {}        # pid -> (pid, create_time)
+        self.procs = {}         # pid -> psutil.Process the identity was looked up from
+        self.hits = self.misses = 0
+
+    def identify(self, pid, name=None, exe=None, create_time=None):
+        """Identity of the process now running as pid; name/exe/create_time skip the lookup when the event carried them.
+
+        A process that already exited is identified from the event's name and create_time; its path is
+        unknown ("N/A") and it is not classified as a user app.
+        """
+        if exe is None:
+            try:
+                proc = psutil.Process(pid)
+                key = (pid, proc.create_time())
+                identity = self.entries.get(key)
+                if identity is not None:
+                    self.hits += 1
+                    return identity
+                # psutil's name() on Windows is this basename, read with a second image-name query.
+                exe = proc.exe()
+                name = ntpath.basename(exe) if exe else proc.name()
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                # Short-lived processes are often gone before their start trace is handled.
+                if not name: return None
+                key, exe, proc = (pid, create_time), None, None
+            except psutil.AccessDenied: return None
+        else:
+            key, proc = (pid, create_time), None
+            identity = self.entries.get(key)
+            if identity is not None:
+                self.hits += 1
+                return identity
+        self.misses += 1
+        self.forget(pid)
+        identity = self.entries[key] = ProcessIdentity(key, name, exe or "N/A", exe is not None and self.classify(exe))
+        self.by_pid[pid] = key
+        if proc is not None: self.procs[pid] = proc
+        return identity
+
+    def still_running(self, identity):
+        """Whether identity's process still runs under its PID, i.e. the PID has not exited or been recycled."""
+        pid, create_time = identity.key
+        proc = self.procs.get(pid) if self.by_pid.get(pid) == identity.key else None
+        try: running = proc.is_running() if proc is not None else psutil.Process(pid).create_time() == create_time
+        except psutil.Error: running = False
+        if running: self.hits += 1
+        return running
+
+    def forget(self, pid):
+        key = self.by_pid.pop(pid, None)
+        self.procs.pop(pid, None)
+        if key is not None: self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+class PollingEventSource(ProcessEventSource):
+    def __init__(self, interval=PROCESS_POLL_SECONDS, stop_event=None, watched=None, identities=None):
+        # watched() returns the ProcessIdentitys whose PID reuse must be detected (the ones with an
+        # open start row), checked through identities; other PIDs are only compared as a set.
+        self.interval = interval
+        self.stop_event = stop_event or threading.Event()
+        self.watched = watched
+        self.identities = identities if identities is not None else ProcessIdentityCache(lambda exe: False)
+        self.seen_pids = set()
+        self.next_poll = 0
+
+    def open(self):
+        self.seen_pids = set(psutil.pids())
+        self.next_poll = time.monotonic() + self.interval
+
+    def read(self, timeout):
+        delay = self.next_poll - time.monotonic()
+        if delay > timeout:
+            self.stop_event.wait(timeout)
+            return []
+        if delay > 0 and self.stop_event.wait(delay): return []
+        self.next_poll = time.monotonic() + self.interval
+        current_pids = set(psutil.pids())
+        events = []
+        for identity in (self.watched() if self.watched else ()):
+            pid = identity.key[0]
+            if pid not in current_pids or pid not in self.seen_pids or self.identities.still_running(identity): continue
+            try: current_create_time = psutil.Process(pid).create_time()
+            except psutil.Error: continue
+            # Recycled PID: the old process exited before the new one was created.
+            events.append(ProcessEvent("stop", pid, current_create_time))
+            events.append(ProcessEvent("start", pid, current_create_time))
+        # An exit is only known to lie within the last interval; starts take the creation time from the lookup.
+        now = time.time()
+        events.extend(ProcessEvent("stop", pid, now) for pid in self.seen_pids - current_pids)
+        events.extend(ProcessEvent("start", pid, None) for pid in current_pids - self.seen_pids)
+        self.seen_pids = current_pids
+        return events
+
+class QueuedEventSource(ProcessEventSource):
+    # Base for push sources: producer threads put() events, read() drains them in timestamp order.
+    def __init__(self, queue_size=PROCESS_EVENT_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.closed = threading.Event()
+        self.error = None
+        self.dropped = 0
+
+    def put(self, event):
+        try: self.queue.put_nowait(event)
+        except queue.Full: self.dropped += 1
+
+    def read(self, timeout):
+        if self.error: raise self.error
+        try: events = [self.queue.get(timeout=timeout)]
+        except queue.Empty: return []
+        while True:
+            try: events.append(self.queue.get_nowait())
+            except queue.Empty: break
+        # Start and stop arrive on separate threads; order them so a stop never precedes its start.
+        events.sort(key=lambda e: (e.timestamp, e.kind != "start"))
+        return events
+
+    def close(self):
+        self.closed.set()
+
+class WmiTraceEventSource(QueuedEventSource):
+    WMI_CLASSES = {"start": "Win32_ProcessStartTrace", "stop": "Win32_ProcessStopTrace"}
+
+    def __init__(self, connect, timeout_errors=(), poll_ms=500, queue_size=PROCESS_EVENT_QUEUE_SIZE):
+        # connect() must return a WMI namespace usable on the calling thread; each watcher thread calls it.
+        super().__init__(queue_size)
+        self.connect, self.timeout_errors, self.poll_ms = connect, timeout_errors, poll_ms
+        self.threads = []
+
+    def open(self):
+        ready = []
+        for kind, wmi_class in self.WMI_CLASSES.items():
+            started = threading.Event()
+            t = threading.Thread(target=self._watch, args=(kind, wmi_class, started), daemon=True, name=f"ProcessTrace-{kind}")
+            t.start()
+            ready.append(started)
+            self.threads.append(t)
+        for started in ready: started.wait(10)
+        if self.error: raise self.error
+        if not all(started.is_set() for started in ready): raise TimeoutError("WMI process trace subscription timed out")
+
+    def _watch(self, kind, wmi_class, started):
+        try:
+            watcher = getattr(self.connect(), wmi_class).watch_for()
+        except Exception as e:
+            self.error = e
+            started.set()
+            return
+        started.set()
+        while not self.closed.is_set():
+            try: trace = watcher(timeout_ms=self.poll_ms)
+            except self.timeout_errors: continue
+            except Exception as e:
+                if not self.closed.is_set(): self.error = e
+                return
+            try: self.put(ProcessEvent(kind, int(trace.ProcessID), filetime_to_epoch(trace.TIME_CREATED), trace.ProcessName))
+            except Exception as e: logging.warning(f"Malformed {wmi_class} event: {e}")
+
+class SyntheticEventSource(ProcessEventSource):
+    # Generates starts and stops at `rate` events per second over a fixed set of executables.
+    def __init__(self, rate, apps=(("app.exe", "C:\\Program Files\\App\\app.exe"),), max_live=500, seed=None):
+        self.rate, self.apps, self.max_live = rate, list(apps), max_live
+        self.random = random.Random(seed)
+        self.live = {}
+        self.next_pid = 100000
+        self.generated = 0
+        self.started_at = None
+
+    def read(self, timeout):
+        now = time.monotonic()
+        if self.started_at is None: self.started_at = now
+        due = int((now - self.started_at) * self.rate) - self.generated
+        if due <= 0:
+            time.sleep(min(timeout, 1 / self.rate))
+            return []
+        events, timestamp = [], time.time()
+        for _ in range(due):
+            if self.live and (len(self.live) >= self.max_live or self.random.random() < 0.5):
+                pid = next(iter(self.live))     # oldest live process
+                name, exe = self.live.pop(pid)
+                events.append(ProcessEvent("stop", pid, timestamp, name, exe))
+            else:
+                self.next_pid += 4
+                name, exe = self.live[self.next_pid] = self.random.choice(self.apps)
+                events.append(ProcessEvent("start", self.next_pid, timestamp, name, exe))
+        self.generated += due
+        return events
+
+class _EventGroup:
+    __slots__ = ("first_event", "day", "deadline", "first_start", "last_close", "starts", "closes", "peak", "held")
+
+    def __init__(self, timestamp, record):
+        self.first_event = timestamp
+        self.day = _local_day(timestamp)
+        self.first_start = self.last_close = None
+        self.starts = self.closes = self.peak = 0
+        self.held = record      # the group's only record until a second one arrives
+
+class EventCoalescer:
+    """Rows go to sink(record, timestamp), timestamp being the epoch time the row's day is taken from.
+
+    A group never spans local midnight, so every row belongs to the day of its timestamp.
+    The coalescer is shared by the monitor thread and the report builder (flush at day end), hence the lock.
+    """
+    def __init__(self, sink, window=EVENT_COALESCE_WINDOW_SECONDS, max_seconds=EVENT_COALESCE_MAX_SECONDS,
+                 max_groups=EVENT_COALESCE_MAX_GROUPS, clock=time.time):
+        self.sink = sink
+        self.window, self.max_seconds, self.max_groups = window, max_seconds, max_groups
+        self.clock = clock
+        self.groups = {}        # (app_name, path) -> _EventGroup, oldest first
+        self.live = {}          # (app_name, path) -> running instances, for the peak
+        self.grouped_rows = self.folded_events = 0
+        self.lock = threading.Lock()
+
+    def add(self, record, timestamp):
+        """record is an events row ("start"/"close"); timestamp is its time as epoch seconds."""
+        with self.lock: self._add(record, timestamp)
+
+    def _add(self, record, timestamp):
+        key = (record["app_name"], record["path"])
+        starting = record["event_type"] == "start"
+        live = self.live.get(key, 0) + (1 if starting else -1)
+        if live > 0: self.live[key] = live
+        else: self.live.pop(key, None)
+
+        group = self.groups.get(key)
+        if group is not None and group.day != _local_day(timestamp):
+            self._flush(key)
+            group = None
+        if group is None:
+            if len(self.groups) >= self.max_groups: self._flush(next(iter(self.groups)))
+            group = self.groups[key] = _EventGroup(timestamp, record)
+        else: group.held = None
+        if starting:
+            group.starts += 1
+            if group.first_start is None or timestamp < group.first_start: group.first_start = timestamp
+        else:
+            group.closes += 1
+            if group.last_close is None or timestamp > group.last_close: group.last_close = timestamp
+        group.peak = max(group.peak, live)
+        group.deadline = min(timestamp + self.window, group.first_event + self.max_seconds)
+
+    def _flush(self, key):
+        group = self.groups.pop(key)
+        if group.held is not None:
+            self.sink(group.held, group.first_event)
+            return
+        app_name, path = key
+        first = group.first_start if group.first_start is not None else group.first_event
+        self.sink({"timestamp": _clock_time(first), "event_type": "grouped", "app_name": app_name, "path": path,
+                   "end_time": _clock_time(group.last_close) if group.last_close is not None else None,
+                   "instances": max(group.starts, group.closes), "peak_instances": group.peak}, first)
+        self.grouped_rows += 1
+        self.folded_events += group.starts + group.closes
+
+    def tick(self, now=None):
+        """Write the groups whose window has passed."""
+        now = self.clock() if now is None else now
+        with self.lock:
+            for key in [key for key, group in self.groups.items() if group.deadline <= now]: self._flush(key)
+
+    def flush(self, before=None):
+        """Write all groups, or only those started before the epoch time before."""
+        with self.lock:
+            for key in [key for key, group in self.groups.items() if before is None or group.first_event < before]: self._flush(key)
+
+def _local_day(timestamp):
+    return time.localtime(timestamp)[:3]
+
+def _clock_time(timestamp):
+    return time.strftime("%H:%M:%S", time.localtime(timestamp))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import time
+import heapq
+import psutil
+
+# =========================================================
+# 🔝 进程资源排行 (Top-N processes by CPU, memory and disk I/O)
+# =========================================================
+#
+# psutil.Process objects are kept between samples, keyed by (pid, create_time),
+# so CPU and I/O rates are deltas against the previous read of the same
+# process and a process is only set up once. Each process is read in a single
+# oneshot(). Reads stop when a sample has used TOP_PROCESSES_BUDGET_SECONDS;
+# the processes not reached are read first in the next sample and keep their
+# previous figures until then.
+
+# 1. 每个排行记录的进程数
+TOP_PROCESSES_N = 5
+
+# 2. 每次采样的读取预算 (seconds)
+TOP_PROCESSES_BUDGET_SECONDS = 0.25
+
+# Rankings in the snapshot, each named after the figure it sorts by
+RANKINGS = ("cpu", "rss", "io")
+
+# =========================================================
+
+class _TrackedProcess:
+    __slots__ = ("key", "proc", "name", "cpu_time", "io_bytes", "read_at", "cpu", "rss", "io")
+
+    def __init__(self, key, proc, name):
+        self.key, self.proc, self.name = key, proc, name
+        self.cpu_time = self.io_bytes = self.read_at = None
+        self.cpu = self.rss = self.io = None
+
+class TopProcessSampler:
+    def __init__(self, top_n=TOP_PROCESSES_N, budget=TOP_PROCESSES_BUDGET_SECONDS, clock=time.monotonic):
+        self.top_n, self.budget, self.clock = top_n, budget, clock
+        self.processes = {}     # (pid, create_time) -> _TrackedProcess
+        self.by_pid = {}        # pid -> (pid, create_time)
+        self.queue = []         # pids still to be read in the current round
+        self.cpu_count = psutil.cpu_count() or 1
+        self.last_cost = None
+        self.partial_samples = 0
+
+    def _track(self, pid):
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot(): key, name = (pid, proc.create_time()), proc.name()
+        except psutil.Error: return None
+        self._forget(pid)
+        entry = self.processes[key] = _TrackedProcess(key, proc, name)
+        self.by_pid[pid] = key
+        return entry
+
+    def _forget(self, pid):
+        key = self.by_pid.pop(pid, None)
+        if key is not None: self.processes.pop(key, None)
+
+    def _read(self, entry):
+        if not entry.proc.is_running():
+            # is_running() compares create_time: the pid now belongs to another process (or to none).
+            entry = self._track(entry.key[0])
+            if entry is None: return
+        with entry.proc.oneshot():
+            times = entry.proc.cpu_times()
+            rss = entry.proc.memory_info().rss
+            try:
+                counters = entry.proc.io_counters()
+                io_bytes = counters.read_bytes + counters.write_bytes
+            except (psutil.AccessDenied, AttributeError): io_bytes = None
+        now = self.clock()
+        cpu_time = times.user + times.system
+        if entry.cpu_time is not None and cpu_time < entry.cpu_time:
+            # Counters that went backwards: reused between the identity check and the read.
+            entry = self._track(entry.key[0])
+            if entry is None: return
+            return self._read(entry)
+        if entry.read_at is not None and now > entry.read_at:
+            elapsed = now - entry.read_at
+            entry.cpu = round((cpu_time - entry.cpu_time) / elapsed / self.cpu_count * 100, 2)
+            if io_bytes is not None and entry.io_bytes is not None:
+                entry.io = round((io_bytes - entry.io_bytes) / (1024**2) / elapsed, 3)
+        entry.cpu_time, entry.io_bytes, entry.read_at = cpu_time, io_bytes, now
+        entry.rss = round(rss / (1024**2), 1)
+
+    def sample(self):
+        """Read as many processes as the budget allows and return {ranking: [[name, pid, cpu %, rss MB, io MB/s], ...]}."""
+        started = self.clock()
+        pids = set(psutil.pids())
+        pids.discard(0)     # System Idle Process
+        for pid in [pid for pid in self.by_pid if pid not in pids]: self._forget(pid)
+        if not self.queue: self.queue = list(pids)
+        while self.queue:
+            if self.clock() - started >= self.budget:
+                self.partial_samples += 1
+                break
+            pid = self.queue.pop()
+            if pid not in pids: continue
+            entry = self.processes.get(self.by_pid.get(pid)) or self._track(pid)
+            if entry is None: continue
+            try: self._read(entry)
+            except psutil.NoSuchProcess: self._forget(pid)
+            except psutil.Error: pass   # access denied: keep the previous figures
+        self.last_cost = self.clock() - started
+        return self.top()
+
+    def top(self):
+        rankings = {}
+        for ranking in RANKINGS:
+            ranked = heapq.nlargest(self.top_n, (e for e in self.processes.values() if getattr(e, ranking)), key=lambda e: getattr(e, ranking))
+            rankings[ranking] = [[e.name, e.key[0], e.cpu, e.rss, e.io] for e in ranked]
+        return rankings
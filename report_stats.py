@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import math
+from array import array
+
+import numpy as np
+
+# =========================================================
+# 📊 每日统计 (Daily statistics sheet)
+# =========================================================
+
+# 1. 统计的指标及阈值 (None = no "time above threshold" column)
+#    Keys are hardware snapshot columns; list columns (fans, GPUs, disks,
+#    adapters) are summarised per device index.
+STATS_METRICS = {
+    "cpu_util": 90, "cpu_temp": 85, "fan_speed": None,
+    "mem_util": 90, "mem_avail": None,
+    "gpu_util": 90, "gpu_temp": 85,
+    "disk_read": None, "disk_write": None, "disk_avail": None, "disk_temp": 55,
+    "net_upload": None, "net_download": None,
+}
+
+# 2. 百分位
+STATS_PERCENTILES = (50, 95, 99)
+
+# 3. 采样时长: each sample counts until the next one, capped at
+#    max(MAX_SAMPLE_GAP_SECONDS, 2 x nominal interval) so that gaps (sleep,
+#    shutdown) do not count as time above a threshold. Rows may be unevenly
+#    spaced (burst sampling), which this weighting accounts for.
+NOMINAL_SAMPLE_SECONDS = 60
+MAX_SAMPLE_GAP_SECONDS = 120
+
+# =========================================================
+
+def _number(value):
+    t = type(value)
+    return float(value) if t is float or t is int else math.nan
+
+def _seconds_of_day(timestamp):
+    try: return int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+    except (TypeError, ValueError): return math.nan
+
+class DailyStats:
+    """Columnar accumulator for one day of hardware snapshots.
+
+    add() only appends to typed arrays; all arithmetic happens once in
+    rows(), vectorised with NumPy.
+    """
+    def __init__(self, metrics=None, nominal_seconds=NOMINAL_SAMPLE_SECONDS):
+        self.metrics = STATS_METRICS if metrics is None else metrics
+        self.nominal_seconds = nominal_seconds
+        self.count = 0
+        self.seconds = array('d')
+        self.columns = {key: [] for key in self.metrics}   # key -> one array per device index
+
+    def add(self, record):
+        n = self.count
+        self.seconds.append(_seconds_of_day(record.get("timestamp")))
+        for key, per_index in self.columns.items():
+            value = record.get(key)
+            items = value if isinstance(value, list) else [value]
+            while len(per_index) < len(items):
+                per_index.append(array('d', [math.nan]) * n)
+            for i, column in enumerate(per_index):
+                column.append(_number(items[i]) if i < len(items) else math.nan)
+        self.count = n + 1
+
+    def _durations(self):
+        seconds = np.frombuffer(self.seconds, dtype=np.float64)
+        durations = np.full(self.count, float(self.nominal_seconds))
+        if self.count > 1:
+            gaps = np.diff(seconds)
+            max_gap = max(MAX_SAMPLE_GAP_SECONDS, 2 * self.nominal_seconds)
+            durations[:-1] = np.where(np.isnan(gaps), self.nominal_seconds, np.clip(gaps, 0, max_gap))
+        return durations
+
+    def rows(self, column_names):
+        """Rows of [metric, samples, min, max, mean, percentiles..., threshold, minutes above].
+
+        column_names maps snapshot keys to their localized header; devices are
+        numbered "#n" the same way as in the data sheet.
+        """
+        if not self.count: return []
+        durations = self._durations()
+        rows = []
+        for key, name in column_names.items():
+            if key not in self.columns: continue
+            threshold = self.metrics[key]
+            per_index = self.columns[key]
+            numbered = len(per_index) > 1
+            for i, column in enumerate(per_index):
+                label = f"{name} #{i+1}" if numbered else name
+                values = np.frombuffer(column, dtype=np.float64)
+                valid = ~np.isnan(values)
+                samples = int(np.count_nonzero(valid))
+                if not samples:
+                    rows.append([label, 0] + ["N/A"] * (3 + len(STATS_PERCENTILES)) + [threshold if threshold is not None else "N/A", "N/A"])
+                    continue
+                present = values[valid]
+                stats = [present.min(), present.max(), present.mean(), *np.percentile(present, STATS_PERCENTILES)]
+                row = [label, samples] + [round(float(v), 2) for v in stats]
+                if threshold is None: row += ["N/A", "N/A"]
+                else: row += [threshold, round(float(durations[valid & (values > threshold)].sum() / 60), 1)]
+                rows.append(row)
+        return rows
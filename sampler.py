@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import time
+import logging
+
+# =========================================================
+# ⏱️ 自适应采样 (Adaptive hardware sampler)
+# =========================================================
+#
+# Samples are scheduled on the monotonic clock (next = previous + interval),
+# so timing does not drift with the sample's own cost or with wall-clock
+# changes. Only the start of the base cadence is aligned to the wall clock,
+# so with a 60 s interval samples stay at :00. While CPU, disk or
+# temperature cross the burst thresholds the interval drops to
+# BURST_INTERVAL_SECONDS, and it returns to the base cadence once readings
+# have stayed below them for BURST_COOLDOWN_SECONDS.
+
+# 1. 基础采样间隔 (may be below one minute; divisors of 60 keep samples on round seconds)
+SAMPLE_INTERVAL_SECONDS = 60
+
+# 2. 突发采样 (burst mode), off by default because it multiplies report rows
+BURST_ENABLED = False
+BURST_INTERVAL_SECONDS = 1
+BURST_CPU_PERCENT = 90
+BURST_DISK_MBPS = 200          # read + write over all disks
+BURST_TEMP_CELSIUS = 90        # CPU or any GPU
+BURST_COOLDOWN_SECONDS = 30
+BURST_MAX_SECONDS = 300        # one burst never runs longer than this...
+BURST_DAILY_BUDGET_SECONDS = 3600   # ...and all bursts of a day together not longer than this
+
+# 3. 自身开销上限: the interval is stretched so that sampling takes at most
+#    this fraction of wall time (cost is an exponential moving average).
+#    Time spent waiting on collectors that miss their deadline is not counted.
+MAX_SAMPLER_DUTY = 0.05
+COST_SMOOTHING = 0.2
+
+# =========================================================
+
+def _numbers(value):
+    items = value if isinstance(value, list) else [value]
+    return [v for v in items if type(v) in (int, float)]
+
+class AdaptiveSampler:
+    def __init__(self, sample, interval=SAMPLE_INTERVAL_SECONDS, burst_enabled=BURST_ENABLED, burst_interval=BURST_INTERVAL_SECONDS,
+                 max_duty=MAX_SAMPLER_DUTY, clock=time.monotonic, wall_clock=time.time, sleep=time.sleep, idle_time=None):
+        self.sample = sample
+        self.idle_time = idle_time      # idle_time(): seconds of the last sample spent idle, left out of its cost
+        self.interval, self.burst_interval = interval, burst_interval
+        self.burst_enabled = burst_enabled
+        self.max_duty = max_duty
+        self.clock, self.wall_clock, self.sleep = clock, wall_clock, sleep
+        self.cost = None
+        self.in_burst, self.burst_started, self.calm_since = False, None, None
+        self.burst_day, self.burst_used = None, 0.0
+        self.samples_taken, self.burst_samples, self.skipped_ticks = 0, 0, 0
+
+    def is_hot(self, snapshot):
+        cpu = _numbers(snapshot.get("cpu_util"))
+        disk = sum(_numbers(snapshot.get("disk_read"))) + sum(_numbers(snapshot.get("disk_write")))
+        temps = _numbers(snapshot.get("cpu_temp")) + _numbers(snapshot.get("gpu_temp"))
+        return (any(v >= BURST_CPU_PERCENT for v in cpu) or disk >= BURST_DISK_MBPS
+                or any(v >= BURST_TEMP_CELSIUS for v in temps))
+
+    def _update_burst(self, snapshot, now, last_tick):
+        day = time.strftime("%Y-%m-%d", time.localtime(self.wall_clock()))
+        if day != self.burst_day: self.burst_day, self.burst_used = day, 0.0
+        hot = self.is_hot(snapshot)
+        if self.in_burst:
+            if last_tick is not None: self.burst_used += now - last_tick
+            if hot: self.calm_since = None
+            elif self.calm_since is None: self.calm_since = now
+            over_budget = now - self.burst_started >= BURST_MAX_SECONDS or self.burst_used >= BURST_DAILY_BUDGET_SECONDS
+            if over_budget or (self.calm_since is not None and now - self.calm_since >= BURST_COOLDOWN_SECONDS):
+                self.in_burst = False
+                # A burst capped while still hot must not re-trigger right away.
+                self.burst_started = now if over_budget and hot else None
+                logging.info(f"Leaving burst sampling ({'budget used up' if over_budget else 'readings back to normal'}).")
+                return True
+        elif hot and self.burst_used < BURST_DAILY_BUDGET_SECONDS and (self.burst_started is None or now - self.burst_started >= BURST_MAX_SECONDS):
+            self.in_burst, self.burst_started, self.calm_since = True, now, None
+            logging.info(f"Entering burst sampling every {self.burst_interval}s.")
+            return True
+        return False
+
+    def _effective(self, interval):
+        # Cap the sampler's own duty cycle: a 0.2 s sample at 5 % is never taken more than every 4 s.
+        if self.cost is None or self.max_duty <= 0: return interval
+        return max(interval, self.cost / self.max_duty)
+
+    def _aligned_delay(self, interval):
+        return interval - (self.wall_clock() % interval)
+
+    def samples(self):
+        """Yield snapshots forever, one per scheduled tick. The consumer's time counts toward the sampler cost."""
+        next_tick, realign, last_tick = self.clock(), True, None
+        while True:
+            now = self.clock()
+            if next_tick > now: self.sleep(next_tick - now)
+            started = self.clock()
+            snapshot = self.sample()
+            yield snapshot
+            finished = self.clock()
+            cost = finished - started
+            if self.idle_time: cost = max(0.0, cost - self.idle_time())
+            self.cost = cost if self.cost is None else self.cost + COST_SMOOTHING * (cost - self.cost)
+            self.samples_taken += 1
+            if self.in_burst: self.burst_samples += 1
+
+            if self.burst_enabled and self._update_burst(snapshot, started, last_tick):
+                # Bursts start right away; the base cadence resumes on the wall-clock grid.
+                if self.in_burst: next_tick = started
+                else: realign = True
+            last_tick = started
+            interval = self._effective(self.burst_interval if self.in_burst else self.interval)
+            if realign: next_tick, realign = finished + self._aligned_delay(interval), False
+            else: next_tick += interval
+            if next_tick <= finished:
+                # Overran one or more ticks: skip them rather than firing a catch-up burst.
+                missed = int((finished - next_tick) // interval) + 1
+                self.skipped_ticks += missed
+                next_tick += missed * interval
+
+    def stats(self):
+        return {"samples": self.samples_taken, "burst_samples": self.burst_samples, "skipped_ticks": self.skipped_ticks,
+                "in_burst": self.in_burst, "cost_seconds": self.cost, "burst_seconds_today": round(self.burst_used, 1)}
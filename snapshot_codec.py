@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import json
+import struct
+import datetime
+
+# =========================================================
+# 🧬 硬件快照紧凑编码 (Compact hardware snapshot records)
+# =========================================================
+#
+#   u8 MAGIC | u8 version | u8 flags | u32 timestamp | u16 wide-column mask
+#   u8 n_new_strings, then n x (u16 len | utf-8)      -> appended to the string table
+#   u8 count per list column (SCHEMA order)
+#   numeric values, SCHEMA order: i16 per item, or i32 if the column's bit is
+#   set in the wide mask; floats are stored as integers scaled by 100 / 1000
+#   u16 string refs (net_adapter items, net_ssid, net_type, net_band)
+#   u16 len | JSON        -> escaped values and unknown keys, usually empty:
+#                            {"t": text timestamp, "e": numbers, "s": strings, "x": extra keys}
+#
+# The string table lives for one journal segment: the first record an encoder
+# writes carries FLAG_RESET_STRINGS, and the decoder clears its table on it.
+# Payloads starting with '{' are plain JSON records and decode as such, so
+# segments written by older versions stay readable.
+
+SNAPSHOT_MAGIC = 0xB5
+SCHEMA_VERSION = 1
+
+FLAG_RESET_STRINGS = 0x01
+FLAG_TEXT_TIMESTAMP = 0x02
+
+# (key, column type, is_list). Types: 'f2'/'f3' = float scaled by 100/1000,
+# 'i' = int, 's' = interned string, 'ts' = timestamp.
+SCHEMA = [
+    ("timestamp", "ts", False),
+    ("cpu_util", "f2", False), ("cpu_temp", "f2", False), ("fan_speed", "i", True),
+    ("mem_util", "f2", False), ("mem_avail", "f2", False),
+    ("gpu_util", "f2", True), ("gpu_temp", "f2", True),
+    ("disk_read", "f3", True), ("disk_write", "f3", True), ("disk_avail", "f2", True), ("disk_temp", "f2", True),
+    ("net_adapter", "s", True), ("net_ssid", "s", False), ("net_type", "s", False), ("net_band", "s", False),
+    ("net_upload", "f3", True), ("net_download", "f3", True),
+]
+SCHEMA_KEYS = frozenset(key for key, _, _ in SCHEMA)
+LIST_KEYS = [key for key, _, is_list in SCHEMA if is_list]
+NUMERIC_COLUMNS = [key for key, col_type, _ in SCHEMA if col_type in ("f2", "f3", "i")]
+SCALES = {"f2": 100, "f3": 1000, "i": 1}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_EPOCH = datetime.datetime(2000, 1, 1)
+
+HEADER = struct.Struct("<BBBIH")
+U16 = struct.Struct("<H")
+COUNTS = struct.Struct(f"<{len(LIST_KEYS)}B")
+
+# Per width: (N/A, None, escape) sentinels and the valid value range.
+SENTINELS = {"h": (-2**15, -2**15 + 1, -2**15 + 2), "i": (-2**31, -2**31 + 1, -2**31 + 2)}
+RANGES = {"h": (-2**15 + 3, 2**15 - 1), "i": (-2**31 + 3, 2**31 - 1)}
+STR_NA, STR_NONE, STR_ESC = 0xFFFF, 0xFFFE, 0xFFFD
+MAX_STRINGS = 0xFFFD
+MAX_LIST_ITEMS = 255
+MAX_CACHED_LAYOUTS = 256
+
+# =========================================================
+
+_NA, _NONE, _ESC = 0, 1, 2   # indexes into SENTINELS
+_layouts = {}
+
+class _Marker:
+    __slots__ = ("index",)
+    def __init__(self, index): self.index = index
+
+_MARKERS = (_Marker(_NA), _Marker(_NONE), _Marker(_ESC))
+
+def _scaled(value, col_type, escapes):
+    if value == "N/A" and isinstance(value, str): return _MARKERS[_NA]
+    if value is None: return _MARKERS[_NONE]
+    if col_type == "i":
+        if type(value) is int and RANGES["i"][0] <= value <= RANGES["i"][1]: return value
+    elif type(value) is float:
+        scale = SCALES[col_type]
+        try:
+            k = round(value * scale)
+            if RANGES["i"][0] <= k <= RANGES["i"][1] and (k / scale).hex() == value.hex(): return k
+        except (OverflowError, ValueError): pass
+    escapes.append(value)
+    return _MARKERS[_ESC]
+
+def _layout(counts, wide_mask):
+    """Struct and decode plan for one (list counts, column widths) shape, cached."""
+    key = (counts, wide_mask)
+    layout = _layouts.get(key)
+    if layout: return layout
+    if len(_layouts) >= MAX_CACHED_LAYOUTS: _layouts.clear()
+
+    # Numbers come first in the body, string refs after them; the plan itself
+    # stays in SCHEMA order so records are rebuilt with the original key order.
+    fmt, plan = ["<"], []
+    pos, n_refs, ci, col = 0, 0, 0, 0
+    for name, col_type, is_list in SCHEMA:
+        if col_type == "ts": continue
+        n = counts[ci] if is_list else 1
+        if is_list: ci += 1
+        if col_type == "s":
+            plan.append([name, 0, n, 0, is_list, None, None])
+            n_refs += n
+            continue
+        width = "i" if wide_mask & (1 << col) else "h"
+        col += 1
+        fmt.append(f"{n}{width}")
+        plan.append([name, pos, n, SCALES[col_type], is_list, RANGES[width][0], SENTINELS[width]])
+        pos += n
+    fmt.append(f"{n_refs}H")
+    for entry in plan:
+        if entry[3] == 0:
+            entry[1] = pos
+            pos += entry[2]
+    plan = tuple((name, start, start + n, scale, is_list, valid_min, sentinels) for name, start, n, scale, is_list, valid_min, sentinels in plan)
+    layout = _layouts[key] = (struct.Struct("".join(fmt)), plan)
+    return layout
+
+class SnapshotEncoder:
+    def __init__(self):
+        self.strings = {}
+        self.reset = True
+
+    def _string_ref(self, value, new_strings, str_escapes):
+        if isinstance(value, str):
+            if value == "N/A": return STR_NA
+            idx = self.strings.get(value)
+            if idx is None: idx = new_strings.get(value)
+            if idx is None:
+                if len(self.strings) + len(new_strings) >= MAX_STRINGS or len(new_strings) >= 255:
+                    str_escapes.append(value)
+                    return STR_ESC
+                idx = new_strings[value] = len(self.strings) + len(new_strings)
+            return idx
+        if value is None: return STR_NONE
+        str_escapes.append(value)
+        return STR_ESC
+
+    def encode(self, snapshot):
+        if not self._fits_schema(snapshot):
+            return json.dumps(snapshot, ensure_ascii=False).encode('utf-8')
+        if len(self.strings) >= MAX_STRINGS - 255:
+            self.strings, self.reset = {}, True
+
+        flags = FLAG_RESET_STRINGS if self.reset else 0
+        escapes, str_escapes, new_strings, columns, refs, counts = [], [], {}, [], [], []
+        ts_value, ts_text = 0, None
+        for key, col_type, is_list in SCHEMA:
+            value = snapshot[key]
+            if col_type == "ts":
+                try:
+                    ts = datetime.datetime.strptime(value, TIMESTAMP_FORMAT)
+                    if ts.strftime(TIMESTAMP_FORMAT) != value or ts < TIMESTAMP_EPOCH: raise ValueError
+                    ts_value = int((ts - TIMESTAMP_EPOCH).total_seconds())
+                    if ts_value > 0xFFFFFFFF: raise ValueError
+                except (TypeError, ValueError):
+                    flags |= FLAG_TEXT_TIMESTAMP
+                    ts_value, ts_text = 0, value
+                continue
+            items = value if is_list else [value]
+            if is_list: counts.append(len(items))
+            if col_type == "s": refs.extend(self._string_ref(item, new_strings, str_escapes) for item in items)
+            else: columns.append([_scaled(item, col_type, escapes) for item in items])
+
+        wide_mask, numbers = 0, []
+        low, high = RANGES["h"]
+        for col, codes in enumerate(columns):
+            width = "h"
+            if any(not isinstance(c, _Marker) and not low <= c <= high for c in codes):
+                wide_mask |= 1 << col
+                width = "i"
+            sentinels = SENTINELS[width]
+            numbers.extend(sentinels[c.index] if isinstance(c, _Marker) else c for c in codes)
+
+        extra = {k: v for k, v in snapshot.items() if k not in SCHEMA_KEYS}
+        tail = b""
+        if escapes or str_escapes or extra or flags & FLAG_TEXT_TIMESTAMP:
+            tail = json.dumps({"t": ts_text, "e": escapes, "s": str_escapes, "x": extra}, ensure_ascii=False).encode('utf-8')
+            if len(tail) > 0xFFFF: return json.dumps(snapshot, ensure_ascii=False).encode('utf-8')
+
+        body, _ = _layout(tuple(counts), wide_mask)
+        parts = [HEADER.pack(SNAPSHOT_MAGIC, SCHEMA_VERSION, flags, ts_value, wide_mask), bytes([len(new_strings)])]
+        for s in new_strings:
+            raw = s.encode('utf-8')
+            parts.append(U16.pack(len(raw)) + raw)
+        parts.append(COUNTS.pack(*counts))
+        parts.append(body.pack(*numbers, *refs))
+        parts.append(U16.pack(len(tail)) + tail)
+
+        # Commit table changes only once the record is fully built.
+        if self.reset: self.strings, self.reset = {}, False
+        self.strings.update(new_strings)
+        return b"".join(parts)
+
+    def _fits_schema(self, snapshot):
+        if not isinstance(snapshot, dict): return False
+        for key, _, is_list in SCHEMA:
+            if key not in snapshot: return False
+            value = snapshot[key]
+            if is_list and (not isinstance(value, list) or len(value) > MAX_LIST_ITEMS): return False
+            if not is_list and isinstance(value, (list, dict)): return False
+        return True
+
+class SnapshotDecoder:
+    def __init__(self):
+        self.strings = []
+        self._last_ts = (None, None)
+
+    def _timestamp(self, ts_value):
+        # Consecutive samples share the date: only re-format the clock part.
+        last_value, last_text = self._last_ts
+        if last_value is not None and ts_value // 86400 == last_value // 86400:
+            secs = ts_value % 86400
+            text = f"{last_text[:11]}{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+        else:
+            text = (TIMESTAMP_EPOCH + datetime.timedelta(seconds=ts_value)).strftime(TIMESTAMP_FORMAT)
+        self._last_ts = (ts_value, text)
+        return text
+
+    def decode(self, payload):
+        if payload[:1] == b"{": return json.loads(payload)
+        magic, version, flags, ts_value, wide_mask = HEADER.unpack_from(payload, 0)
+        if magic != SNAPSHOT_MAGIC: raise ValueError(f"Unknown record magic 0x{magic:02X}")
+        if version != SCHEMA_VERSION: raise ValueError(f"Unsupported snapshot schema version {version}")
+        if flags & FLAG_RESET_STRINGS: self.strings = []
+
+        pos = HEADER.size
+        n_new = payload[pos]; pos += 1
+        for _ in range(n_new):
+            (length,) = U16.unpack_from(payload, pos); pos += 2
+            self.strings.append(payload[pos:pos + length].decode('utf-8')); pos += length
+        counts = COUNTS.unpack_from(payload, pos); pos += COUNTS.size
+        body, plan = _layout(counts, wide_mask)
+        values = body.unpack_from(payload, pos); pos += body.size
+        (tail_len,) = U16.unpack_from(payload, pos); pos += 2
+        tail = json.loads(payload[pos:pos + tail_len]) if tail_len else {}
+        escapes, str_escapes, extra = tail.get("e", []), tail.get("s", []), tail.get("x", {})
+        escapes.reverse(); str_escapes.reverse()
+
+        record = {"timestamp": tail.get("t") if flags & FLAG_TEXT_TIMESTAMP else self._timestamp(ts_value)}
+        strings = self.strings
+        for name, start, end, scale, is_list, valid_min, sentinels in plan:
+            if scale == 0:
+                items = [strings[r] if r < STR_ESC else "N/A" if r == STR_NA else None if r == STR_NONE else str_escapes.pop()
+                         for r in values[start:end]]
+            else:
+                raw = values[start:end]
+                if raw and min(raw) < valid_min:
+                    na, none, _ = sentinels
+                    items = ["N/A" if v == na else None if v == none else escapes.pop() if v < valid_min
+                             else (v if scale == 1 else v / scale) for v in raw]
+                elif scale == 1: items = list(raw)
+                else: items = [v / scale for v in raw]
+            record[name] = items if is_list else items[0]
+        if extra: record.update(extra)
+        return record
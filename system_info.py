@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+# =========================================================
+# 🖥️ 静态系统信息缓存 (Static system-info cache)
+# =========================================================
+
+# 1. 缓存文件 (与日志放在同一目录)
+STATIC_INFO_FILENAME = "wll.sysinfo.json"
+
+# 2. 有效期: a snapshot is re-collected after this long even if the
+#    fingerprint still matches (IP, NTP offset and time settings drift).
+STATIC_INFO_TTL_SECONDS = 24 * 3600
+
+# =========================================================
+
+class SystemInfoProvider:
+    """Source of static computer information.
+
+    fingerprint() must be cheap and change whenever the hardware/OS
+    identity changes; collect() returns the full snapshot embedded in
+    the reports (an empty dict means "unavailable").
+    """
+    def fingerprint(self):
+        raise NotImplementedError
+
+    def collect(self):
+        raise NotImplementedError
+
+class StaticInfoCache:
+    def __init__(self, provider, cache_file, ttl=STATIC_INFO_TTL_SECONDS):
+        self.provider = provider
+        self.cache_file = Path(cache_file)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._entry = None   # {"fingerprint", "collected_at", "info"}
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if isinstance(entry.get("info"), dict) and "fingerprint" in entry and "collected_at" in entry:
+                return entry
+        except FileNotFoundError: pass
+        except Exception as e: logging.warning(f"Ignoring unreadable static info cache: {e}")
+        return None
+
+    def _save(self, entry):
+        tmp_path = self.cache_file.with_suffix(".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e: logging.error(f"Failed to save static info cache: {e}")
+
+    def _fingerprint(self):
+        try: return self.provider.fingerprint()
+        except Exception as e:
+            logging.warning(f"Static info fingerprint failed: {e}")
+            return None
+
+    def get(self):
+        with self.lock:
+            if self._entry is None: self._entry = self._load()
+            entry = self._entry
+            fingerprint = self._fingerprint()
+            if entry and 0 <= time.time() - entry["collected_at"] < self.ttl:
+                # An unreadable fingerprint is not evidence of change.
+                if fingerprint is None or entry["fingerprint"] == fingerprint: return entry["info"]
+                logging.info("System fingerprint changed, refreshing static computer info.")
+
+            info = self.provider.collect()
+            if not info:
+                # Provider unavailable: fall back to the last known snapshot rather than an empty sheet.
+                return entry["info"] if entry else {}
+            self._entry = {"fingerprint": fingerprint, "collected_at": time.time(), "info": info}
+            self._save(self._entry)
+            return info
+
+    def invalidate(self):
+        with self.lock:
+            self._entry = None
+            try: self.cache_file.unlink(missing_ok=True)
+            except OSError as e: logging.error(f"Failed to remove static info cache: {e}")
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Process events: load test of ProcessMonitor fed by SyntheticEventSource.
+
+    python tools/bench_event_source.py [--rate 5000] [--seconds 10] [--coalesce]
+
+The monitor runs on its own thread exactly as in the logger, with the synthetic
+source generating starts and stops of a few apps at --rate events per second
+(one of them under SystemRoot, so the window check runs too). The time spent
+in handle() gives the monitor's utilization and the rate it could sustain.
+Every event must produce one row (unless --coalesce), and every live synthetic
+process must have an open start row at the end.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import fake_windows
+
+w = fake_windows.import_logger()
+import process_tracking
+
+APPS = (("app.exe", "C:\\Program Files\\App\\app.exe"), ("helper.exe", "C:\\Program Files\\App\\helper.exe"),
+        ("note.exe", "C:\\Users\\me\\AppData\\Local\\Note\\note.exe"), ("svc.exe", "C:\\Windows\\System32\\svc.exe"))
+
+class NoWindows:
+    def visible_window_pids(self): return set()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=5000, help="events per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--coalesce", action="store_true", help="enable EVENT_COALESCING_ENABLED")
+    args = parser.parse_args()
+    os.environ["SystemRoot"] = "C:\\Windows"
+    process_tracking.EVENT_COALESCING_ENABLED = args.coalesce
+
+    rows = {"start": 0, "close": 0, "grouped": 0}
+    def sink(record, timestamp): rows[record["event_type"]] += 1
+    source = process_tracking.SyntheticEventSource(args.rate, apps=APPS, seed=1)
+    stop_event = threading.Event()
+    monitor = w.ProcessMonitor(stop_event, NoWindows(), source, sink)
+    busy, handled = [0.0], [0]
+    handle = monitor.handle
+    def timed_handle(events):
+        started = time.perf_counter()
+        handle(events)
+        busy[0] += time.perf_counter() - started
+        handled[0] += len(events)
+    monitor.handle = timed_handle
+
+    cpu, started = time.process_time(), time.perf_counter()
+    monitor.start()
+    time.sleep(args.seconds)
+    stop_event.set()
+    monitor.join()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu
+
+    utilization = busy[0] / elapsed
+    print(f"{args.rate} events/s for {elapsed:.1f} s{' with coalescing' if args.coalesce else ''}")
+    print(f"  handled {handled[0]} events ({handled[0] / elapsed:.0f}/s), rows {rows}")
+    print(f"  monitor busy {utilization:.1%} of the time, process CPU {cpu / elapsed:.1%}, sustainable ~{handled[0] / busy[0]:.0f} events/s" if busy[0] else "  no events handled")
+    live_user_apps = {pid for pid, (name, exe) in source.live.items() if not exe.lower().startswith("c:\\windows")}
+    ok = set(monitor.logged_apps) == live_user_apps
+    if not args.coalesce:
+        system_events = handled[0] - sum(rows.values())
+        ok = ok and system_events >= 0 and rows["start"] - rows["close"] == len(live_user_apps)
+    print(f"  {'ok' if ok else 'FAIL':<4} open start rows match the live synthetic apps ({len(live_user_apps)})")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""LHM sensors: the old N+1 WMI queries against lhm_sensors.LhmSensorReader.
+
+    python tools/bench_lhm_sensors.py [--samples 50] [--call-ms 3]
+
+FakeLhm stands in for the root\\LibreHardwareMonitor namespace and charges a
+fixed latency per WMI call plus a little per returned row. Besides the timing
+the script checks that both paths produce the same readings, that a hot-plugged
+sensor triggers one topology rebuild, that a provider without the Hardware class
+still works, that a failing provider yields {}, and that every successful read
+reports its latency to the metrics.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import lhm_sensors
+
+class FakeLhm:
+    DEVICES = [("/intelcpu/0", "Cpu"), ("/gpu-nvidia/0", "GpuNvidia"), ("/nvme/0", "Storage"), ("/nvme/1", "Storage"), ("/lpc/nct6798d", "Motherboard")]
+    NAMES = ["Core Average", "CPU Package", "GPU Core", "Core #1", "Fan #1", "Tctl/Tdie", "Composite"]
+    TYPES = ["Temperature", "Load", "Fan", "Clock", "Power"]
+
+    def __init__(self, sensors_per_device=25, call_ms=3.0, row_us=20.0, seed=1):
+        rng = random.Random(seed)
+        self.call_s, self.row_s = call_ms / 1000, row_us / 1e6
+        self.hardware = [SimpleNamespace(Identifier=i, HardwareType=t) for i, t in self.DEVICES]
+        self.sensors = []
+        for device in self.hardware:
+            for n in range(sensors_per_device):
+                sensor_type = rng.choice(self.TYPES)
+                self.sensors.append(SimpleNamespace(Identifier=f"{device.Identifier}/{sensor_type.lower()}/{n}", Parent=device.Identifier,
+                                                    SensorType=sensor_type, Name=rng.choice(self.NAMES), Value=rng.random() * 80))
+        self.calls = 0
+
+    def _call(self, rows):
+        self.calls += 1
+        time.sleep(self.call_s + rows * self.row_s)
+        return rows
+
+    def Hardware(self):
+        self._call(len(self.hardware))
+        return list(self.hardware)
+
+    def Sensor(self, fields=None):
+        self._call(len(self.sensors))
+        return list(self.sensors)
+
+    def query(self, wql):
+        parent = wql.split("'")[1]
+        rows = [s for s in self.sensors if s.Parent == parent]
+        self._call(len(rows))
+        return rows
+
+class LegacyLhm(FakeLhm):
+    def Hardware(self): raise AttributeError("Hardware")
+
+class BrokenLhm:
+    def Hardware(self): raise RuntimeError("provider gone")
+    def Sensor(self, fields=None): raise RuntimeError("provider gone")
+
+def old_sample(conn):
+    # _get_lhm_sensors_universal() and the classification of get_hardware_snapshot() before the change.
+    all_sensors = []
+    try:
+        for device in conn.Hardware():
+            for sensor in conn.query(f"SELECT * FROM Sensor WHERE Parent = '{device.Identifier}'"):
+                all_sensors.append({'device_type': device.HardwareType, 'sensor': sensor})
+    except Exception:
+        all_sensors = [{'device_type': 'Unknown', 'sensor': sensor} for sensor in conn.Sensor()]
+    cpu_temp, fan_speeds, gpu_temps, gpu_loads, disk_temps, cpu_package_temps = "N/A", [], [], [], [], []
+    for item in all_sensors:
+        device_type, sensor = item['device_type'], item['sensor']
+        s_name_lower = sensor.Name.lower()
+        if device_type == 'Cpu' and sensor.SensorType == 'Temperature':
+            if 'core average' in s_name_lower: cpu_temp = round(sensor.Value, 2)
+            elif 'package' in s_name_lower or 'tctl/tdie' in s_name_lower: cpu_package_temps.append(sensor.Value)
+        elif 'Gpu' in device_type and sensor.SensorType == 'Temperature': gpu_temps.append(round(sensor.Value, 2))
+        elif 'Gpu' in device_type and sensor.SensorType == 'Load' and 'core' in s_name_lower: gpu_loads.append(round(sensor.Value, 2))
+        elif 'Storage' in device_type and sensor.SensorType == 'Temperature': disk_temps.append(round(sensor.Value, 2))
+        elif sensor.SensorType == 'Fan': fan_speeds.append(int(sensor.Value))
+    if cpu_temp == "N/A" and cpu_package_temps: cpu_temp = round(max(cpu_package_temps), 2)
+    return cpu_temp, fan_speeds, gpu_temps, gpu_loads, disk_temps
+
+def new_sample(reader):
+    # The same fields as get_hardware_snapshot() builds them from LhmSensorReader.read().
+    lhm = reader.read()
+    cpu_temp = "N/A"
+    if lhm.get(lhm_sensors.CPU_CORE_AVERAGE): cpu_temp = round(lhm[lhm_sensors.CPU_CORE_AVERAGE][-1], 2)
+    elif lhm.get(lhm_sensors.CPU_PACKAGE): cpu_temp = round(max(lhm[lhm_sensors.CPU_PACKAGE]), 2)
+    return (cpu_temp, [int(v) for v in lhm.get(lhm_sensors.FAN, [])], [round(v, 2) for v in lhm.get(lhm_sensors.GPU_TEMP, [])],
+            [round(v, 2) for v in lhm.get(lhm_sensors.GPU_LOAD, [])], [round(v, 2) for v in lhm.get(lhm_sensors.DISK_TEMP, [])])
+
+def timed(fake, sample, samples):
+    fake.calls = 0
+    started = time.perf_counter()
+    for _ in range(samples): sample()
+    return (time.perf_counter() - started) / samples, fake.calls / samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--sensors", type=int, default=25, help="sensors per device")
+    parser.add_argument("--call-ms", type=float, default=3.0, help="fake latency of one WMI call")
+    args = parser.parse_args()
+    failures = []
+    def check(name, ok):
+        print(f"  {'ok' if ok else 'FAIL':<4} {name}")
+        if not ok: failures.append(name)
+
+    fake = FakeLhm(args.sensors, args.call_ms)
+    reader = lhm_sensors.LhmSensorReader(lambda: fake)
+    check("same readings", old_sample(fake) == new_sample(reader))
+    old_s, old_calls = timed(fake, lambda: old_sample(fake), args.samples)
+    new_s, new_calls = timed(fake, lambda: new_sample(reader), args.samples)
+    print(f"{len(fake.hardware)} devices, {len(fake.sensors)} sensors, {args.call_ms:g} ms per WMI call, {args.samples} samples")
+    print(f"  old  {old_s * 1000:7.1f} ms  {old_calls:5.1f} WMI calls per sample")
+    print(f"  new  {new_s * 1000:7.1f} ms  {new_calls:5.1f} WMI calls per sample  (last_latency {reader.last_latency * 1000:.1f} ms)")
+
+    rebuilds = reader.rebuilds
+    fake.sensors.append(SimpleNamespace(Identifier="/gpu-nvidia/0/temperature/hotspot", Parent="/gpu-nvidia/0", SensorType="Temperature", Name="GPU Hot Spot", Value=71.5))
+    check("hot-plugged sensor is read", old_sample(fake) == new_sample(reader))
+    new_sample(reader)
+    check("one rebuild per hardware change", reader.rebuilds == rebuilds + 1)
+    legacy = LegacyLhm(args.sensors, 0, 0)
+    check("provider without Hardware class", old_sample(legacy) == new_sample(lhm_sensors.LhmSensorReader(lambda: legacy)))
+    observed = []
+    broken = lhm_sensors.LhmSensorReader(lambda: BrokenLhm(), observe=lambda name, seconds: observed.append((name, seconds)))
+    check("failing provider reads as {}", broken.read() == {} and broken.conn is None)
+    timed_reader = lhm_sensors.LhmSensorReader(lambda: legacy, observe=lambda name, seconds: observed.append((name, seconds)))
+    for _ in range(3): timed_reader.read()
+    check("one latency observation per successful read", [name for name, _ in observed] == ["lhm_sample"] * 3 and observed[-1][1] == timed_reader.last_latency)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
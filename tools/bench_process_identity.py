@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Process tracking: the old process_iter cycle against ProcessIdentityCache + PollingEventSource.
+
+    python tools/bench_process_identity.py [--processes 1000] [--churn 200] [--cycles 10]
+
+First a fake process table checks PID reuse: a PID recycled between two polls
+must close the old app and start the new one, never log a phantom close under
+the wrong name. Then real sleeper processes are started until the system has
+--processes of them, and --churn of them are replaced before every cycle. The
+copy of the sleeper outside SystemRoot counts as a user app, the others as
+system processes, as on Windows.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+import statistics
+import contextlib
+import subprocess
+import psutil
+import fake_windows
+
+w = fake_windows.import_logger()
+import process_tracking
+
+class NoWindows:
+    def visible_window_pids(self): return set()
+
+class FakeProcess:
+    table = {}      # pid -> (create_time, name, exe)
+    def __init__(self, pid):
+        if pid not in self.table: raise psutil.NoSuchProcess(pid)
+        self.pid, self._create_time = pid, self.table[pid][0]
+    def is_running(self): return self.table.get(self.pid, (None,))[0] == self._create_time
+    def create_time(self): return self._create_time
+    def name(self): return self.table[self.pid][1]
+    def exe(self): return self.table[self.pid][2]
+    def oneshot(self): return contextlib.nullcontext()
+
+@contextlib.contextmanager
+def fake_process_table(processes):
+    FakeProcess.table = dict(processes)
+    real = psutil.pids, psutil.Process
+    psutil.pids, psutil.Process = lambda: list(FakeProcess.table), FakeProcess
+    os.environ["SystemRoot"] = "C:\\Windows"
+    try: yield FakeProcess.table
+    finally: psutil.pids, psutil.Process = real
+
+def fake_monitor(rows):
+    monitor = w.ProcessMonitor(threading.Event(), NoWindows(), sink=lambda record, timestamp: rows.append((record["event_type"], record["app_name"], record["path"])))
+    monitor.coalescer = None
+    return monitor
+
+def check_exited_start():
+    # Start traces handled after the process exited: the path is unknown, so only a path the trace carried can make it a user app.
+    with fake_process_table({}):
+        rows, now = [], time.time()
+        monitor = fake_monitor(rows)
+        monitor.handle([process_tracking.ProcessEvent("start", 999999, now, "conhost.exe"), process_tracking.ProcessEvent("stop", 999999, now + 0.1)])
+        monitor.handle([process_tracking.ProcessEvent("start", 999998, now, "app.exe", "C:\\Apps\\app.exe"), process_tracking.ProcessEvent("stop", 999998, now + 0.1)])
+        ok = rows == [("start", "app.exe", "C:\\Apps\\app.exe"), ("close", "app.exe", "C:\\Apps\\app.exe")] and not monitor.pending_gui
+        return ok, rows
+
+def check_pid_reuse():
+    with fake_process_table({10: (100.0, "a.exe", "C:\\Apps\\a.exe"), 11: (100.0, "svc.exe", "C:\\Windows\\svc.exe")}) as table:
+        rows = []
+        monitor = fake_monitor(rows)
+        source = monitor._polling_source()
+        source.interval, source.seen_pids = 0, set()
+        steps = []
+        monitor.handle(source.read(0))
+        steps.append([row[:2] for row in rows] == [("start", "a.exe")])
+        table[10] = (200.0, "b.exe", "C:\\Apps\\b.exe")     # PID 10 recycled between two polls
+        monitor.handle(source.read(0))
+        steps.append([row[:2] for row in rows[1:]] == [("close", "a.exe"), ("start", "b.exe")])
+        del table[10]
+        monitor.handle(source.read(0))
+        steps.append([row[:2] for row in rows[3:]] == [("close", "b.exe")] and 10 not in monitor.logged_apps and (10, 200.0) not in monitor.identities.entries)
+        return all(steps), [row[:2] for row in rows]
+
+class Sleepers:
+    def __init__(self, system_exe, user_exe):
+        self.kinds = [system_exe] * 3 + [user_exe]
+        self.started = 0
+        self.procs = []
+    def spawn(self, n):
+        for _ in range(n):
+            self.procs.append(subprocess.Popen([self.kinds[self.started % len(self.kinds)], "1000"], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            self.started += 1
+    def churn(self, n):
+        for proc in self.procs[:n]:
+            proc.kill()
+            proc.wait()
+        del self.procs[:n]
+        self.spawn(n)
+    def stop(self):
+        for proc in self.procs:
+            proc.kill()
+            proc.wait()
+
+def old_cycle(monitor, seen_pids, logged_apps):
+    # The body of ProcessMonitor.run() before the change; rows are discarded.
+    current_pids = {p.pid for p in psutil.process_iter(['pid'])}
+    for pid in current_pids - seen_pids:
+        try:
+            p = psutil.Process(pid)
+            exe_path = p.exe()
+            if monitor._is_user_app_by_path(exe_path) or monitor._is_gui_app(pid): logged_apps[pid] = (p.name(), exe_path)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess): continue
+    for pid in seen_pids - current_pids: logged_apps.pop(pid, None)
+    return current_pids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=1000)
+    parser.add_argument("--churn", type=int, default=200, help="processes replaced before every cycle")
+    parser.add_argument("--cycles", type=int, default=10)
+    args = parser.parse_args()
+
+    failures = 0
+    for name, check in (("start of an exited process", check_exited_start), ("PID reuse on a fake process table", check_pid_reuse)):
+        ok, rows = check()
+        print(f"  {'ok' if ok else 'FAIL':<4} {name}: {rows}")
+        failures += not ok
+
+    system_exe = shutil.which("sleep") or shutil.which("timeout")
+    if system_exe is None:
+        print("no sleep/timeout executable to start test processes with")
+        sys.exit(1)
+    user_exe = os.path.join(tempfile.mkdtemp(prefix="wll-apps-"), "app" + os.path.basename(system_exe))
+    shutil.copy(system_exe, user_exe)
+    os.environ["SystemRoot"] = os.path.dirname(system_exe)
+    sleepers = Sleepers(system_exe, user_exe)
+    try:
+        sleepers.spawn(max(0, args.processes - len(psutil.pids())))
+        old_monitor = w.ProcessMonitor(threading.Event(), NoWindows(), sink=lambda record, timestamp: None)
+        seen_pids, logged_apps, old_times = old_cycle(old_monitor, set(), {}), {}, []
+        for _ in range(args.cycles):
+            sleepers.churn(args.churn)
+            time.sleep(0.3)
+            started = time.perf_counter()
+            seen_pids = old_cycle(old_monitor, seen_pids, logged_apps)
+            old_times.append(time.perf_counter() - started)
+
+        monitor = w.ProcessMonitor(threading.Event(), NoWindows(), sink=lambda record, timestamp: None)
+        source = monitor._polling_source()
+        source.interval = 0
+        source.open()
+        new_times = []
+        for _ in range(args.cycles):
+            sleepers.churn(args.churn)
+            time.sleep(0.3)
+            started = time.perf_counter()
+            monitor.handle(source.read(0))
+            new_times.append(time.perf_counter() - started)
+        processes = len(psutil.pids())
+    finally:
+        sleepers.stop()
+        shutil.rmtree(os.path.dirname(user_exe), ignore_errors=True)
+    print(f"{processes} processes, {args.churn} replaced per cycle, median of {args.cycles} cycles")
+    print(f"  old  {statistics.median(old_times) * 1000:7.1f} ms per cycle")
+    print(f"  new  {statistics.median(new_times) * 1000:7.1f} ms per cycle  (identity cache {len(monitor.identities)}, hits {monitor.identities.hits}, misses {monitor.identities.misses})")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
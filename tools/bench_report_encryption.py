@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Report encryption: the old temp-file path against _save_encrypted_workbook.
+
+    python tools/bench_report_encryption.py [--rows 1440] [--trials 5]
+
+Each trial builds the same write-only workbook (not timed), then saves and
+encrypts it. Bytes written are the process write counters from psutil
+(write_chars on Linux, write_bytes elsewhere), so they include the plaintext
+temp file of the old path. Both outputs must decrypt to the same sheet.
+"""
+import io
+import os
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+import psutil
+import msoffcrypto
+import openpyxl
+from openpyxl import Workbook
+import fake_windows
+
+w = fake_windows.import_logger()
+
+def build_workbook(rows, seed=1):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("hardware")
+    ws.append(["timestamp", "cpu_util", "cpu_temp", "fan_speed", "mem_util", "mem_avail", "gpu_util", "disk_read", "disk_write", "net_upload", "net_download"])
+    for i in range(rows):
+        ws.append([f"2025-01-01 {i // 60 % 24:02d}:{i % 60:02d}:00"] + [round(rng.random() * 100, 2) for _ in range(10)])
+    return wb
+
+def save_temp_file(wb, final_filename):
+    # The path before the change: plaintext workbook in cache/temp, re-read and encrypted, then deleted.
+    temp_dir = w.CACHE_PATH / "temp"
+    temp_dir.mkdir(exist_ok=True)
+    unencrypted_filename = temp_dir / f"tmp_{uuid.uuid4()}.xlsx"
+    wb.save(unencrypted_filename)
+    with open(unencrypted_filename, "rb") as f_in, open(final_filename, "wb") as f_out:
+        msoffcrypto.OfficeFile(f_in).encrypt(w.EXCEL_PASSWORD, f_out)
+    os.remove(unencrypted_filename)
+    os.chmod(final_filename, 0o444)
+
+def written_bytes():
+    counters = psutil.Process().io_counters()
+    return getattr(counters, "write_chars", counters.write_bytes)
+
+def read_back(path):
+    office_file = msoffcrypto.OfficeFile(open(path, "rb"))
+    office_file.load_key(password=w.EXCEL_PASSWORD)
+    plain = io.BytesIO()
+    office_file.decrypt(plain)
+    return [list(r) for r in openpyxl.load_workbook(plain).active.iter_rows(values_only=True)]
+
+def run(save, final_filename, rows, trials):
+    times, written = [], []
+    for _ in range(trials):
+        if final_filename.exists():
+            os.chmod(final_filename, 0o666)
+            final_filename.unlink()
+        wb = build_workbook(rows)
+        before, t = written_bytes(), time.perf_counter()
+        save(wb, final_filename)
+        times.append(time.perf_counter() - t)
+        written.append(written_bytes() - before)
+    return statistics.median(times), statistics.median(written)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1440)
+    parser.add_argument("--trials", type=int, default=5)
+    args = parser.parse_args()
+    work = Path(tempfile.mkdtemp(prefix="wll-bench-"))
+    w.CACHE_PATH = work / "cache"
+    w.CACHE_PATH.mkdir()
+    old_file, new_file = work / "old.xlsx", work / "new.xlsx"
+    results = {"temp file": run(save_temp_file, old_file, args.rows, args.trials),
+               "in memory": run(w._save_encrypted_workbook, new_file, args.rows, args.trials)}
+    same = read_back(old_file) == read_back(new_file)
+    print(f"{args.rows} rows, median of {args.trials}, report {new_file.stat().st_size / 1024:.0f} KB, same content: {same}")
+    for name, (seconds, written) in results.items():
+        print(f"  {name:<10} {seconds * 1000:8.1f} ms  {written / 1024:8.0f} KB written")
+    leftovers = list((w.CACHE_PATH / "temp").iterdir())
+    print(f"  files left in cache/temp: {len(leftovers)}")
+
+if __name__ == "__main__":
+    main()
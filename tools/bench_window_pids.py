@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""GUI detection: one EnumWindows per new PID against one window map per poll.
+
+    python tools/bench_window_pids.py [--windows 3000] [--new-pids 300] [--polls 5]
+
+FakeDesktop stands in for win32gui/win32process with thousands of top-level
+windows owned by random PIDs. Every poll delivers hundreds of start events for
+system-path processes, which are the ones that need the window check. The old
+per-PID enumeration is timed against ProcessMonitor.handle() using the real
+Win32WindowProvider on the fake desktop, and both must pick the same PIDs.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import fake_windows
+
+w = fake_windows.import_logger()
+import process_tracking
+
+class FakeDesktop:
+    def __init__(self, windows, max_pid, seed=1):
+        rng = random.Random(seed)
+        self.windows = [(rng.random() < 0.3, rng.choice(["", "Untitled - Notepad", "Settings"]), rng.randint(1, max_pid)) for _ in range(windows)]
+        self.enumerations = 0
+    def EnumWindows(self, callback, extra):
+        self.enumerations += 1
+        for hwnd in range(len(self.windows)):
+            if not callback(hwnd, extra): break
+    def IsWindowVisible(self, hwnd): return self.windows[hwnd][0]
+    def GetWindowText(self, hwnd): return self.windows[hwnd][1]
+    def GetWindowThreadProcessId(self, hwnd): return (0, self.windows[hwnd][2])
+
+def old_is_gui_app(desktop, pid):
+    # ProcessMonitor._is_gui_app() before the change, against the same fake desktop.
+    hwnd_list = []
+    def callback(hwnd, lst):
+        if desktop.IsWindowVisible(hwnd) and desktop.GetWindowText(hwnd):
+            _, found_pid = desktop.GetWindowThreadProcessId(hwnd)
+            if found_pid == pid: lst.append(hwnd)
+        return True
+    desktop.EnumWindows(callback, hwnd_list)
+    return len(hwnd_list) > 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=int, default=3000)
+    parser.add_argument("--new-pids", type=int, default=300, help="new system-path processes per poll")
+    parser.add_argument("--polls", type=int, default=5)
+    args = parser.parse_args()
+    max_pid = 4 * args.new_pids * args.polls
+    desktop = FakeDesktop(args.windows, max_pid)
+    w.win32gui = w.win32process = desktop
+    os.environ["SystemRoot"] = "C:\\Windows"
+    monitor = w.ProcessMonitor(threading.Event(), sink=lambda record, timestamp: None)
+
+    pids = random.Random(2).sample(range(1, max_pid), args.new_pids * args.polls)
+    polls = [pids[i:i + args.new_pids] for i in range(0, len(pids), args.new_pids)]
+    old_gui, old_s, old_enum = set(), 0.0, desktop.enumerations
+    for batch in polls:
+        started = time.perf_counter()
+        old_gui.update(pid for pid in batch if old_is_gui_app(desktop, pid))
+        old_s += time.perf_counter() - started
+    old_enum = desktop.enumerations - old_enum
+
+    new_s, new_enum, now = 0.0, desktop.enumerations, time.time()
+    for batch in polls:
+        events = [process_tracking.ProcessEvent("start", pid, now, "helper.exe", "C:\\Windows\\System32\\helper.exe") for pid in batch]
+        started = time.perf_counter()
+        monitor.handle(events)
+        new_s += time.perf_counter() - started
+    new_enum = desktop.enumerations - new_enum
+
+    same = old_gui == set(monitor.logged_apps)
+    print(f"{args.windows} windows, {args.new_pids} new PIDs x {args.polls} polls, {len(old_gui)} with a window, same PIDs: {same}")
+    print(f"  old  {old_s / args.polls * 1000:8.1f} ms per poll  {old_enum // args.polls:4d} EnumWindows per poll")
+    print(f"  new  {new_s / args.polls * 1000:8.2f} ms per poll  {new_enum // args.polls:4d} EnumWindows per poll")
+    sys.exit(0 if same else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Report temp files: where openpyxl's plaintext sheet files go and that none are left behind.
+
+    python tools/check_report_tempfiles.py
+
+Runs the real report code against a throwaway log folder. While a day's report
+is open its sheet files must be under cache/temp, never in the system temp
+directory; a finished, restarted or discarded report must leave none of its
+own; and cleanup_stale_report_files() must remove the ones a crash leaves behind.
+"""
+import sys
+import random
+import tempfile
+from pathlib import Path
+import fake_windows
+
+w = fake_windows.import_logger()
+
+DAY = "2025-01-01"
+
+def snapshot(i, disks=2):
+    rng = random.Random(i)
+    return {"timestamp": f"{DAY} {i // 60 % 24:02d}:{i % 60:02d}:00", "cpu_util": round(rng.random() * 100, 2), "cpu_temp": "N/A",
+            "fan_speed": [1200], "mem_util": 40.0, "mem_avail": 8.0, "gpu_util": [3.0], "gpu_temp": ["N/A"],
+            "disk_read": [1.5] * disks, "disk_write": [2.5] * disks, "disk_avail": [100.0] * disks, "disk_temp": ["N/A"] * disks,
+            "net_adapter": ["Ethernet"], "net_ssid": "N/A", "net_type": "N/A", "net_band": "N/A", "net_upload": [0.1], "net_download": [0.2]}
+
+def openpyxl_files(directory):
+    return sorted(p.name for p in Path(directory).glob("openpyxl.*"))
+
+def open_sheet_files(report):
+    return sorted(Path(ws._writer.out).name for ws in (report.wb.worksheets if report.wb else []) if getattr(ws, "_writer", None))
+
+def main():
+    system_temp = tempfile.gettempdir()
+    leftovers_before = set(openpyxl_files(system_temp))
+    base = Path(tempfile.mkdtemp(prefix="wll-check-")) / "SystemLog"
+    w.LANG = w.load_language_data("en")
+    w.BASE_DIR_PREF = w.BASE_DIR_FALLBACK = str(base)
+    if not w.setup_directories(): sys.exit("could not set up the log folder")
+    w.COMPUTER_UUID = "check"
+    w.get_static_computer_info = lambda: {"device_name": "check"}
+    cache_temp = w.CACHE_PATH / "temp"
+    sheet_files = lambda: openpyxl_files(cache_temp) + sorted(set(openpyxl_files(system_temp)) - leftovers_before)
+    failures = []
+    def check(name, ok, detail=""):
+        print(f"  {'ok' if ok else 'FAIL':<4} {name} {detail}")
+        if not ok: failures.append(name)
+
+    report = w.IncrementalReport(DAY, "hardware")
+    for i in range(120): w.CACHE_JOURNAL.append("hardware", snapshot(i), DAY)
+    report.update()
+    new_in_system_temp = set(openpyxl_files(system_temp)) - leftovers_before
+    check("open report keeps its sheet files under cache/temp", openpyxl_files(cache_temp) and not new_in_system_temp, openpyxl_files(cache_temp))
+    check("finished report leaves no sheet files", report.finalize() and not openpyxl_files(cache_temp), openpyxl_files(cache_temp))
+
+    report = w.IncrementalReport(DAY, "hardware")
+    w.CACHE_JOURNAL.append("hardware", snapshot(120, disks=3), DAY)     # a hot-plugged disk widens the sheet
+    report.update()
+    check("restart at a new width leaves only the new sheet's files", sheet_files() == open_sheet_files(report), sheet_files())
+    w.CACHE_JOURNAL.append("hardware", snapshot(5, disks=3), DAY)       # out of order: the report falls back to a full build
+    report.update()
+    check("rebuild fallback leaves no sheet files", report.needs_full_build and not sheet_files(), sheet_files())
+    report = w.IncrementalReport(DAY, "events")
+    w.CACHE_JOURNAL.append("events", {"timestamp": "00:00:01", "event_type": "start", "app_name": "a.exe", "path": "C:\\a.exe"}, DAY)
+    report.update()
+    report.discard()
+    check("discarded report leaves no sheet files", not sheet_files(), sheet_files())
+
+    stale = cache_temp / "openpyxl.crashed"
+    stale.write_text("<worksheet/>")
+    w.cleanup_stale_report_files()
+    check("startup cleanup removes leftover sheet files", not stale.exists())
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
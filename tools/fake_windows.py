@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import types
+import importlib
+import subprocess
+
+# =========================================================
+# 🧪 Windows 模块替身 (fake Windows modules for the benchmarks)
+# =========================================================
+# windows_logger_lite imports pywin32, wmi, winreg and ntplib at module level.
+# The benchmarks only drive code paths that take their providers as arguments,
+# so off Windows these modules are replaced by inert fakes -- only the ones
+# that cannot be imported, a real installation is always used first.
+
+def _wmi():
+    m = types.ModuleType("wmi")
+    class x_wmi(Exception): pass
+    class x_wmi_timed_out(x_wmi): pass
+    class x_wmi_invalid_class(x_wmi): pass
+    def WMI(*args, **kwargs): raise x_wmi("WMI is not available on this platform")
+    m.x_wmi, m.x_wmi_timed_out, m.x_wmi_invalid_class, m.WMI = x_wmi, x_wmi_timed_out, x_wmi_invalid_class, WMI
+    return m
+
+def _winreg():
+    m = types.ModuleType("winreg")
+    m.HKEY_CURRENT_USER = m.HKEY_LOCAL_MACHINE = m.HKEY_CLASSES_ROOT = 0
+    m.KEY_READ, m.REG_SZ = 0, 1
+    # An empty registry: mimetypes enumerates HKEY_CLASSES_ROOT as soon as a winreg module exists.
+    class _Key:
+        def __enter__(self): return self
+        def __exit__(self, *exc): return False
+        def Close(self): pass
+    def OpenKey(root, path, *args, **kwargs):
+        if path == "": return _Key()
+        raise FileNotFoundError(path)
+    def EnumKey(key, index): raise OSError("no more keys")
+    def QueryValueEx(key, name): raise FileNotFoundError(name)
+    m.OpenKey, m.EnumKey, m.QueryValueEx = OpenKey, EnumKey, QueryValueEx
+    return m
+
+def _win32gui():
+    m = types.ModuleType("win32gui")
+    m.EnumWindows = lambda callback, extra: None
+    m.IsWindowVisible = lambda hwnd: False
+    m.GetWindowText = lambda hwnd: ""
+    return m
+
+def _win32process():
+    m = types.ModuleType("win32process")
+    m.GetWindowThreadProcessId = lambda hwnd: (0, 0)
+    return m
+
+def _pythoncom():
+    m = types.ModuleType("pythoncom")
+    m.CoInitialize = m.CoUninitialize = lambda: None
+    return m
+
+def _ntplib():
+    m = types.ModuleType("ntplib")
+    class NTPClient:
+        def request(self, *args, **kwargs): raise OSError("ntplib is not installed")
+    m.NTPClient = NTPClient
+    return m
+
+FAKES = {"wmi": _wmi, "winreg": _winreg, "win32gui": _win32gui, "win32process": _win32process, "pythoncom": _pythoncom, "ntplib": _ntplib}
+
+def install():
+    """Registers a fake for every Windows-only module that cannot be imported; returns their names."""
+    faked = []
+    for name, build in FAKES.items():
+        try: importlib.import_module(name)
+        except ImportError:
+            sys.modules[name] = build()
+            faked.append(name)
+    if not hasattr(subprocess, "CREATE_NO_WINDOW"): subprocess.CREATE_NO_WINDOW = 0
+    return faked
+
+def import_logger():
+    """Imports windows_logger_lite from the repository root, with fakes where needed."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path: sys.path.insert(0, root)
+    faked = install()
+    if faked: print(f"(using fake {', '.join(faked)})")
+    import windows_logger_lite
+    return windows_logger_lite
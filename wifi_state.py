@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import time
+import ctypes
+import logging
+import threading
+
+# =========================================================
+# 📶 Wi-Fi 状态缓存 (Cached Wi-Fi state)
+# =========================================================
+#
+# SSID, radio type and band are read from the WLAN API through one long-lived
+# client handle and cached. The cache is refreshed when the WLAN service
+# reports a connection change, and otherwise at most every WIFI_STATE_TTL_SECONDS.
+# Without change notifications it falls back to WIFI_STATE_POLL_SECONDS.
+
+# 1. 刷新周期
+WIFI_STATE_TTL_SECONDS = 600
+WIFI_STATE_POLL_SECONDS = 60
+
+# 2. WLAN API 常量
+WLAN_CLIENT_VERSION = 2
+WLAN_INTF_OPCODE_CURRENT_CONNECTION = 7
+WLAN_INTF_OPCODE_CHANNEL_NUMBER = 10
+WLAN_INTERFACE_STATE_CONNECTED = 1
+WLAN_NOTIFICATION_SOURCE_ACM = 0x08
+WLAN_NOTIFICATION_SOURCE_MSM = 0x10
+# MSM codes that can change SSID/band: associated, connected, roaming end, disconnected
+MSM_CHANGE_CODES = {2, 6, 8, 10}
+
+# DOT11_PHY_TYPE -> the radio type netsh reports
+PHY_TYPES = {4: "802.11a", 5: "802.11b", 6: "802.11g", 7: "802.11n", 8: "802.11ac", 9: "802.11ad", 10: "802.11ax", 11: "802.11be"}
+
+# =========================================================
+
+def channel_to_band(channel):
+    if not channel: return "N/A"
+    if 1 <= channel <= 14: return '2.4 GHz'
+    if 36 <= channel <= 196: return '5 GHz'
+    if channel > 196: return '6 GHz'
+    return "N/A"
+
+class WifiBackend:
+    """Source of the current Wi-Fi connection.
+
+    open(on_change) prepares the backend and returns True if it will call
+    on_change() whenever the connection changes. query() returns
+    (ssid, phy type, channel) of the connected interface, or None when no
+    interface is connected.
+    """
+    def open(self, on_change):
+        raise NotImplementedError
+
+    def query(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class GUID(ctypes.Structure):
+    _fields_ = [('Data1', ctypes.c_ulong), ('Data2', ctypes.c_ushort), ('Data3', ctypes.c_ushort), ('Data4', ctypes.c_ubyte * 8)]
+
+class WLAN_INTERFACE_INFO(ctypes.Structure):
+    _fields_ = [('InterfaceGuid', GUID), ('strInterfaceDescription', ctypes.c_wchar * 256), ('isState', ctypes.c_uint)]
+
+class WLAN_INTERFACE_INFO_LIST(ctypes.Structure):
+    _fields_ = [('dwNumberOfItems', ctypes.c_ulong), ('dwIndex', ctypes.c_ulong), ('InterfaceInfo', WLAN_INTERFACE_INFO * 1)]
+
+class DOT11_SSID(ctypes.Structure):
+    _fields_ = [('uSSIDLength', ctypes.c_ulong), ('ucSSID', ctypes.c_ubyte * 32)]
+
+class WLAN_ASSOCIATION_ATTRIBUTES(ctypes.Structure):
+    _fields_ = [('dot11Ssid', DOT11_SSID), ('dot11BssType', ctypes.c_uint), ('dot11Bssid', ctypes.c_ubyte * 6),
+                ('dot11PhyType', ctypes.c_uint), ('uDot11PhyIndex', ctypes.c_ulong), ('wlanSignalQuality', ctypes.c_ulong),
+                ('ulRxRate', ctypes.c_ulong), ('ulTxRate', ctypes.c_ulong)]
+
+class WLAN_SECURITY_ATTRIBUTES(ctypes.Structure):
+    _fields_ = [('bSecurityEnabled', ctypes.c_int), ('bOneXEnabled', ctypes.c_int), ('dot11AuthAlgorithm', ctypes.c_uint), ('dot11CipherAlgorithm', ctypes.c_uint)]
+
+class WLAN_CONNECTION_ATTRIBUTES(ctypes.Structure):
+    _fields_ = [('isState', ctypes.c_uint), ('wlanConnectionMode', ctypes.c_uint), ('strProfileName', ctypes.c_wchar * 256),
+                ('wlanAssociationAttributes', WLAN_ASSOCIATION_ATTRIBUTES), ('wlanSecurityAttributes', WLAN_SECURITY_ATTRIBUTES)]
+
+class WLAN_NOTIFICATION_DATA(ctypes.Structure):
+    _fields_ = [('NotificationSource', ctypes.c_ulong), ('NotificationCode', ctypes.c_ulong), ('InterfaceGuid', GUID),
+                ('dwDataSize', ctypes.c_ulong), ('pData', ctypes.c_void_p)]
+
+class WlanApiBackend(WifiBackend):
+    def __init__(self):
+        self.wlanapi = None
+        self.handle = ctypes.c_void_p()
+        self._callback = None   # must stay referenced while registered
+
+    def open(self, on_change):
+        self.wlanapi = ctypes.windll.LoadLibrary('wlanapi.dll')
+        negotiated = ctypes.c_ulong()
+        if self.wlanapi.WlanOpenHandle(WLAN_CLIENT_VERSION, None, ctypes.byref(negotiated), ctypes.byref(self.handle)) != 0:
+            raise OSError("WlanOpenHandle failed (is the WLAN AutoConfig service running?)")
+
+        def notification(data, _context):
+            try:
+                if data:
+                    d = ctypes.cast(data, ctypes.POINTER(WLAN_NOTIFICATION_DATA)).contents
+                    if d.NotificationSource == WLAN_NOTIFICATION_SOURCE_MSM and d.NotificationCode not in MSM_CHANGE_CODES: return
+                on_change()
+            except Exception: pass
+        self._callback = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p)(notification)
+        result = self.wlanapi.WlanRegisterNotification(self.handle, WLAN_NOTIFICATION_SOURCE_ACM | WLAN_NOTIFICATION_SOURCE_MSM,
+                                                       True, self._callback, None, None, None)
+        if result != 0:
+            self._callback = None
+            return False
+        return True
+
+    def _query_interface(self, guid, opcode, ctype):
+        size, data = ctypes.c_ulong(), ctypes.c_void_p()
+        if self.wlanapi.WlanQueryInterface(self.handle, ctypes.byref(guid), opcode, None, ctypes.byref(size), ctypes.byref(data), None) != 0:
+            return None
+        try: return ctype.from_buffer_copy(ctypes.cast(data, ctypes.POINTER(ctype)).contents) if data else None
+        finally:
+            if data: self.wlanapi.WlanFreeMemory(data)
+
+    def query(self):
+        interfaces = ctypes.POINTER(WLAN_INTERFACE_INFO_LIST)()
+        if self.wlanapi.WlanEnumInterfaces(self.handle, None, ctypes.byref(interfaces)) != 0:
+            raise OSError("WlanEnumInterfaces failed")
+        try:
+            count = interfaces.contents.dwNumberOfItems
+            infos = ctypes.cast(ctypes.addressof(interfaces.contents.InterfaceInfo), ctypes.POINTER(WLAN_INTERFACE_INFO))
+            guids = [GUID.from_buffer_copy(infos[i].InterfaceGuid) for i in range(count) if infos[i].isState == WLAN_INTERFACE_STATE_CONNECTED]
+        finally: self.wlanapi.WlanFreeMemory(interfaces)
+        for guid in guids:
+            connection = self._query_interface(guid, WLAN_INTF_OPCODE_CURRENT_CONNECTION, WLAN_CONNECTION_ATTRIBUTES)
+            if connection is None: continue
+            assoc = connection.wlanAssociationAttributes
+            ssid = bytes(assoc.dot11Ssid.ucSSID[:assoc.dot11Ssid.uSSIDLength]).decode('utf-8', errors='replace')
+            channel = self._query_interface(guid, WLAN_INTF_OPCODE_CHANNEL_NUMBER, ctypes.c_ulong)
+            return ssid, assoc.dot11PhyType, channel.value if channel is not None else None
+        return None
+
+    def close(self):
+        if self.wlanapi and self.handle:
+            try: self.wlanapi.WlanCloseHandle(self.handle, None)
+            except Exception: pass
+        self.handle, self._callback = ctypes.c_void_p(), None
+
+class WifiStateProvider:
+    def __init__(self, backend, ttl=WIFI_STATE_TTL_SECONDS, poll_ttl=WIFI_STATE_POLL_SECONDS):
+        self.backend = backend
+        self.ttl, self.poll_ttl = ttl, poll_ttl
+        self.lock = threading.Lock()
+        self.opened, self.notifications = False, False
+        self.dirty = True
+        self.expires = 0
+        self.state = ("N/A", "N/A", "N/A")
+        self.refreshes = 0
+
+    def mark_dirty(self):
+        # Called from the backend's notification thread; the refresh itself happens on the next get().
+        self.dirty = True
+
+    def _reset(self):
+        try: self.backend.close()
+        except Exception: pass
+        self.opened, self.notifications = False, False
+
+    def get(self):
+        """(ssid, radio type, band), refreshed only when changed or stale."""
+        with self.lock:
+            now = time.monotonic()
+            if not self.dirty and now < self.expires: return self.state
+            if not self.opened:
+                try:
+                    self.notifications = bool(self.backend.open(self.mark_dirty))
+                    self.opened = True
+                except Exception as e:
+                    logging.warning(f"Could not open WiFi state backend: {e}")
+                    self._reset()
+                    self.dirty, self.expires = False, now + self.poll_ttl
+                    self.state = ("N/A", "N/A", "N/A")
+                    return self.state
+            self.dirty = False
+            try:
+                connection = self.backend.query()
+                if connection is None: self.state = ("N/A", "N/A", "N/A")
+                else:
+                    ssid, phy_type, channel = connection
+                    self.state = (ssid or "N/A", PHY_TYPES.get(phy_type, "N/A"), channel_to_band(channel))
+                self.refreshes += 1
+            except Exception as e:
+                logging.warning(f"Could not read WiFi state: {e}")
+                self._reset()
+                self.state = ("N/A", "N/A", "N/A")
+            self.expires = now + (self.ttl if self.notifications else self.poll_ttl)
+            return self.state
+
+    def close(self):
+        with self.lock: self._reset()
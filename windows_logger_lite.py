@@ -27,13 +27,32 @@ import ntplib
 from datetime import timezone
 import win32gui
 import win32process
+import pythoncom
 from openpyxl import Workbook
 import ctypes
 from tkinter import Tk
 import re
+import functools
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 # ✅ 引入邮件服务模块
 import email_service 
+import cache_journal
+import snapshot_codec
+import system_info
+import report_stats
+import export_sinks
+import lhm_sensors
+import wifi_state
+import device_topology
+import sampler
+import collectors
+import process_usage
+import instrumentation
+import process_tracking
 
 # ===================================================================================
 # --- CONFIGURATION & CONSTANTS ---
@@ -46,19 +65,39 @@ BASE_DIR_FALLBACK = "C:\\SystemLog"
 CACHE_SUBDIR = "cache"
 HARDWARE_LOG_DIR = "Hardware"
 EVENTS_LOG_DIR = "Events"
+LOG_TYPES = ['hardware', 'events']
 EXCEL_PASSWORD = "WindowsLogger"
+REPORT_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+PARTIAL_REPORT_SUFFIX = ".part"
+# Backlog mode: when at least BACKLOG_MIN_DAYS days are pending, build their reports in a pool of
+# BACKLOG_WORKERS low-priority processes (1 disables the pool).
+BACKLOG_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+BACKLOG_MIN_DAYS = 2
+# Today's reports are built incrementally every REPORT_CHECKPOINT_INTERVAL_SECONDS so rollover only has to
+# finalize them. Creating PREVIEW_TRIGGER_FILENAME in the log folder writes a snapshot of today's reports to PREVIEW_DIR.
+REPORT_CHECKPOINT_INTERVAL_SECONDS = 10 * 60
+PREVIEW_DIR = "Preview"
+PREVIEW_TRIGGER_FILENAME = "preview.request"
+PREVIEW_POLL_SECONDS = 5
+# Extra per-day exports for bulk analysis, written to EXPORT_DIR next to the reports: "columnar" (Parquet, or
+# gzip CSV without pyarrow) and/or "sqlite". Exports are NOT encrypted, so they are off by default.
+EXPORT_SINKS = []
+EXPORT_DIR = "Export"
 LHM_DOWNLOAD_URL = "https://github.com/LibreHardwareMonitor/LibreHardwareMonitor/releases/"
 
 # ===================================================================================
 # --- GLOBAL INITIALIZATIONS ---
 # ===================================================================================
-BASE_PATH, CACHE_PATH, COMPUTER_UUID, wmi_con, wmi_lhm, LANG = [None] * 6
+BASE_PATH, CACHE_PATH, COMPUTER_UUID, wmi_con, LANG, CACHE_JOURNAL, CACHE_WRITER, STATIC_INFO = [None] * 8
+WIFI_STATE = wifi_state.WifiStateProvider(wifi_state.WlanApiBackend())
+LHM_SENSORS = lhm_sensors.LhmSensorReader(lambda: wmi.WMI(namespace="root\\LibreHardwareMonitor"), observe=instrumentation.METRICS.observe)
 
 try:
     wmi_con = wmi.WMI()
 except Exception as e:
     wmi_con = None
     print(f"Critical error during main WMI initialization: {e}")
+_wmi_thread_local = threading.local()
 
 # ===================================================================================
 # ⚙️ HELPER, SETUP & DEPLOYMENT FUNCTIONS
@@ -193,8 +232,12 @@ def perform_first_run_setup():
 def get_computer_uuid():
     return str(uuid.getnode())
 
+def create_cache_journal(cache_path):
+    return cache_journal.SegmentJournal(cache_path, LOG_TYPES,
+        encoders={'hardware': snapshot_codec.SnapshotEncoder}, decoders={'hardware': snapshot_codec.SnapshotDecoder})
+
 def setup_directories():
-    global BASE_PATH, CACHE_PATH
+    global BASE_PATH, CACHE_PATH, CACHE_JOURNAL
     
     def is_drive_removable(drive_letter):
         try:
@@ -236,6 +279,8 @@ def setup_directories():
         for dir_name in [HARDWARE_LOG_DIR, EVENTS_LOG_DIR]:
             (BASE_PATH / dir_name).mkdir(parents=True, exist_ok=True)
             (CACHE_PATH / dir_name).mkdir(parents=True, exist_ok=True)
+        CACHE_JOURNAL = create_cache_journal(CACHE_PATH)
+        _use_report_temp_dir(CACHE_PATH)
         return True
     except (IOError, OSError) as e:
         logging.error(f"Failed to create subdirectories: {e}")
@@ -286,66 +331,27 @@ def get_timezone_str():
     sign = "+" if offset_seconds >= 0 else "-"
     return f"UTC{sign}{int(hours):02d}:{int(minutes):02d}"
 
-def _get_wifi_band_from_api():
-    net_band = 'N/A'
-    hClient = ctypes.c_void_p()
-    pInterfaceList = ctypes.c_void_p()
-    try:
-        wlanapi = ctypes.windll.LoadLibrary('wlanapi.dll')
-        if wlanapi.WlanOpenHandle(2, None, ctypes.byref(ctypes.c_ulong()), ctypes.byref(hClient)) != 0: return net_band
-        class GUID(ctypes.Structure): _fields_ = [('Data1', ctypes.c_ulong), ('Data2', ctypes.c_ushort), ('Data3', ctypes.c_ushort), ('Data4', ctypes.c_ubyte * 8)]
-        class WLAN_INTERFACE_INFO(ctypes.Structure): _fields_ = [('InterfaceGuid', GUID), ('strInterfaceDescription', ctypes.c_wchar * 256), ('isState', ctypes.c_uint)]
-        class WLAN_INTERFACE_INFO_LIST(ctypes.Structure): _fields_ = [('dwNumberOfItems', ctypes.c_ulong), ('dwIndex', ctypes.c_ulong), ('InterfaceInfo', WLAN_INTERFACE_INFO * 1)]
-        pInterfaceList = ctypes.POINTER(WLAN_INTERFACE_INFO_LIST)()
-        if wlanapi.WlanEnumInterfaces(hClient, None, ctypes.byref(pInterfaceList)) != 0: return net_band
-        if pInterfaceList.contents.dwNumberOfItems > 0:
-            interface_info = pInterfaceList.contents.InterfaceInfo[0]
-            dwChannelSize = ctypes.c_ulong(ctypes.sizeof(ctypes.c_ulong))
-            pChannel = ctypes.c_ulong()
-            if wlanapi.WlanQueryInterface(hClient, ctypes.byref(interface_info.InterfaceGuid), 10, None, ctypes.byref(dwChannelSize), ctypes.byref(pChannel), None) == 0:
-                channel = pChannel.value
-                if 1 <= channel <= 14: net_band = '2.4 GHz'
-                elif 36 <= channel <= 196: net_band = '5 GHz'
-                elif channel > 196: net_band = '6 GHz'
-    except Exception as e: logging.warning(f"Could not get WiFi band from API: {e}")
-    finally:
-        if pInterfaceList and 'wlanapi' in locals(): wlanapi.WlanFreeMemory(pInterfaceList)
-        if hClient and 'wlanapi' in locals(): wlanapi.WlanCloseHandle(hClient, None)
-    return net_band
-
 def get_wifi_details():
-    ssid, net_type, net_band = "N/A", "N/A", "N/A"
-    try:
-        sys_encoding = locale.getpreferredencoding()
-        result_process = subprocess.run(['netsh', 'wlan', 'show', 'interfaces'], encoding=sys_encoding, errors='ignore', capture_output=True, check=False, creationflags=subprocess.CREATE_NO_WINDOW)
-        
-        if "拒绝访问" in result_process.stdout or "access is denied" in result_process.stdout.lower():
-            logging.warning("Failed to get WiFi details: Access Denied.")
-        elif result_process.returncode == 0:
-            result = result_process.stdout
-            ssid_match = re.search(r"SSID\s+:\s(.*)", result, re.IGNORECASE)
-            if ssid_match: ssid = ssid_match.group(1).strip()
-            type_match = re.search(r"(802\.11[a-zA-Z]{1,2})", result)
-            if type_match: net_type = type_match.group(1)
-        
-        net_band = _get_wifi_band_from_api()
-    except Exception as e: logging.warning(f"Unexpected error getting WiFi details: {e}")
-    return ssid, net_type, net_band
+    return WIFI_STATE.get()
 
-def get_mac_address_from_wmi():
-    if not wmi_con: return "N/A"
-    try:
-        for adapter in wmi_con.Win32_NetworkAdapterConfiguration(IPEnabled=True):
-            if adapter.MACAddress: return adapter.MACAddress
-    except Exception: pass
-    return "N/A"
+def get_wmi_connection():
+    # WMI (COM) objects only work on the thread that created them, so background threads get their own connection.
+    if threading.current_thread() is threading.main_thread(): return wmi_con
+    conn = getattr(_wmi_thread_local, 'conn', None)
+    if conn is None:
+        try:
+            pythoncom.CoInitialize()
+            conn = _wmi_thread_local.conn = wmi.WMI()
+        except Exception as e:
+            logging.error(f"WMI initialization failed on thread {threading.current_thread().name}: {e}")
+    return conn
 
-def get_static_computer_info():
+def collect_static_computer_info():
+    wmi_con = get_wmi_connection()
     if not wmi_con: return {}
     os_info, cs_info = wmi_con.Win32_OperatingSystem()[0], wmi_con.Win32_ComputerSystem()[0]
     auto_time, auto_tz = get_windows_time_settings()
     ntp_status, time_offset = get_ntp_time_offset()
-    mac_address = get_mac_address_from_wmi()
     install_date_str = "N/A"
     if hasattr(os_info, 'InstallDate') and os_info.InstallDate:
         try:
@@ -353,281 +359,668 @@ def get_static_computer_info():
             install_date_str = install_date_obj.strftime('%Y-%m-%d %H:%M:%S')
         except Exception: pass
     
-    primary_ip = "N/A"
+    # Each WMI class is queried once and shared between the fields that need it.
+    mac_address, primary_ip = "N/A", "N/A"
     try:
-        primary_adapter = wmi_con.Win32_NetworkAdapterConfiguration(IPEnabled=True)
-        if primary_adapter and primary_adapter[0].IPAddress:
-            primary_ip = primary_adapter[0].IPAddress[0]
+        ip_adapters = wmi_con.Win32_NetworkAdapterConfiguration(IPEnabled=True)
+        mac_address = next((a.MACAddress for a in ip_adapters if a.MACAddress), "N/A")
+        if ip_adapters and ip_adapters[0].IPAddress:
+            primary_ip = ip_adapters[0].IPAddress[0]
     except Exception: pass
+    memory_modules, disk_drives = wmi_con.Win32_PhysicalMemory(), wmi_con.Win32_DiskDrive()
 
-    return {"device_name": cs_info.Name, "processor": [p.Name for p in wmi_con.Win32_Processor()], "gpu": [gpu.Name for gpu in wmi_con.Win32_VideoController()], "ram_manufacturer": [mem.Manufacturer for mem in wmi_con.Win32_PhysicalMemory()], "ram_part_number": [mem.PartNumber.strip() for mem in wmi_con.Win32_PhysicalMemory() if mem.PartNumber] or ["N/A"], "ram_total": round(int(cs_info.TotalPhysicalMemory) / (1024**3), 2), "disk_model": [d.Model for d in wmi_con.Win32_DiskDrive()], "disk_capacity": [round(int(d.Size) / (1024**3), 2) for d in wmi_con.Win32_DiskDrive()], "net_adapter_model": [n.Description for n in wmi_con.Win32_NetworkAdapter() if getattr(n, 'NetConnectionID', None) is not None], "mac_address": mac_address, "ip_address": primary_ip, "timezone": get_timezone_str(), "region": get_region_info(), "auto_time_status": auto_time, "auto_timezone_status": auto_tz, "ntp_status": ntp_status, "time_offset": time_offset, "device_id": wmi_con.Win32_ComputerSystemProduct()[0].UUID, "product_id": os_info.SerialNumber, "windows_version": os_info.Caption, "windows_version_num": getattr(os_info, 'Version', 'N/A'), "install_date": install_date_str, "os_build": f"Build {os_info.BuildNumber}"}
+    return {"device_name": cs_info.Name, "processor": [p.Name for p in wmi_con.Win32_Processor()], "gpu": [gpu.Name for gpu in wmi_con.Win32_VideoController()], "ram_manufacturer": [mem.Manufacturer for mem in memory_modules], "ram_part_number": [mem.PartNumber.strip() for mem in memory_modules if mem.PartNumber] or ["N/A"], "ram_total": round(int(cs_info.TotalPhysicalMemory) / (1024**3), 2), "disk_model": [d.Model for d in disk_drives], "disk_capacity": [round(int(d.Size) / (1024**3), 2) for d in disk_drives], "net_adapter_model": [n.Description for n in wmi_con.Win32_NetworkAdapter() if getattr(n, 'NetConnectionID', None) is not None], "mac_address": mac_address, "ip_address": primary_ip, "timezone": get_timezone_str(), "region": get_region_info(), "auto_time_status": auto_time, "auto_timezone_status": auto_tz, "ntp_status": ntp_status, "time_offset": time_offset, "device_id": wmi_con.Win32_ComputerSystemProduct()[0].UUID, "product_id": os_info.SerialNumber, "windows_version": os_info.Caption, "windows_version_num": getattr(os_info, 'Version', 'N/A'), "install_date": install_date_str, "os_build": f"Build {os_info.BuildNumber}"}
 
-def _get_lhm_sensors_universal():
-    global wmi_lhm
-    sensors_data = []
-    
-    if not wmi_lhm:
-        try:
-            wmi_lhm = wmi.WMI(namespace="root\\LibreHardwareMonitor")
-        except wmi.x_wmi: wmi_lhm = None; return []
-        except Exception: wmi_lhm = None; return []
+class WmiSystemInfoProvider(system_info.SystemInfoProvider):
+    def fingerprint(self):
+        wmi_con = get_wmi_connection()
+        if not wmi_con: return None
+        os_info = wmi_con.Win32_OperatingSystem(["BuildNumber", "Version"])[0]
+        cs_info = wmi_con.Win32_ComputerSystem(["Name", "TotalPhysicalMemory"])[0]
+        return {"os_build": os_info.BuildNumber, "os_version": os_info.Version, "device_name": cs_info.Name,
+                "ram_total": str(cs_info.TotalPhysicalMemory), "disk_count": len(wmi_con.Win32_DiskDrive(["Index"]))}
 
-    try:
-        hardware_devices = wmi_lhm.Hardware()
-        if hardware_devices:
-            for device in hardware_devices:
-                query = f"SELECT * FROM Sensor WHERE Parent = '{device.Identifier}'"
-                sensors = wmi_lhm.query(query)
-                for sensor in sensors:
-                    sensors_data.append({'device_type': device.HardwareType, 'sensor': sensor})
-            if sensors_data: return sensors_data
-    except wmi.x_wmi_invalid_class: pass
-    except Exception as e: logging.warning(f"Error during modern LHM query, will try legacy. Error: {e}")
+    def collect(self):
+        return collect_static_computer_info()
 
-    try:
-        sensors = wmi_lhm.Sensor()
-        if sensors:
-            for sensor in sensors:
-                sensors_data.append({'device_type': 'Unknown', 'sensor': sensor})
-    except Exception as e: logging.warning(f"Error during legacy LHM query: {e}")
-        
-    return sensors_data
+def get_static_computer_info():
+    if STATIC_INFO: return STATIC_INFO.get()
+    return collect_static_computer_info()
 
 last_disk_io, last_net_io, last_io_time = psutil.disk_io_counters(perdisk=True), psutil.net_io_counters(pernic=True), time.time()
+DEVICE_TOPOLOGY = device_topology.DeviceTopology(lambda: len(get_wmi_connection().Win32_VideoController(["Name"])))
 
-def get_hardware_snapshot():
-    global last_disk_io, last_net_io, last_io_time, wmi_lhm
+# Each collector runs on its own worker thread (see collectors.py); only that thread touches its state.
+def collect_lhm_metrics():
+    readings = LHM_SENSORS.read()
+    cpu_temp = "N/A"
+    if readings.get(lhm_sensors.CPU_CORE_AVERAGE):
+        cpu_temp = round(readings[lhm_sensors.CPU_CORE_AVERAGE][-1], 2)
+    elif readings.get(lhm_sensors.CPU_PACKAGE):
+        cpu_temp = round(max(readings[lhm_sensors.CPU_PACKAGE]), 2)
+    return {"cpu_temp": cpu_temp, "fan_speed": [int(v) for v in readings.get(lhm_sensors.FAN, [])],
+            "gpu_util": [round(v, 2) for v in readings.get(lhm_sensors.GPU_LOAD, [])], "gpu_temp": [round(v, 2) for v in readings.get(lhm_sensors.GPU_TEMP, [])],
+            "disk_temp": [round(v, 2) for v in readings.get(lhm_sensors.DISK_TEMP, [])]}
+
+def collect_system_metrics():
+    mem = psutil.virtual_memory()
+    return {"cpu_util": round(psutil.cpu_percent(interval=None), 2), "mem_util": round(mem.percent, 2), "mem_avail": round(mem.available / (1024**3), 2)}
+
+def collect_io_metrics():
+    global last_disk_io, last_net_io, last_io_time
 
     current_time = time.time()
     time_delta = current_time - last_io_time
     last_io_time = current_time
     if time_delta <= 0: time_delta = 1
-    
-    cpu_temp, fan_speeds, gpu_temps, gpu_loads, disk_temps = "N/A", [], [], [], []
-    
-    try:
-        all_sensors = _get_lhm_sensors_universal()
-        
-        cpu_package_temps = []
-        for item in all_sensors:
-            device_type = item['device_type']
-            sensor = item['sensor']
-            s_name_lower = sensor.Name.lower()
-            
-            if device_type == 'Cpu' and sensor.SensorType == 'Temperature':
-                if 'core average' in s_name_lower:
-                    cpu_temp = round(sensor.Value, 2)
-                elif 'package' in s_name_lower or 'tctl/tdie' in s_name_lower:
-                    cpu_package_temps.append(sensor.Value)
-            
-            elif 'Gpu' in device_type and sensor.SensorType == 'Temperature':
-                gpu_temps.append(round(sensor.Value, 2))
-            elif 'Gpu' in device_type and sensor.SensorType == 'Load' and 'core' in s_name_lower:
-                gpu_loads.append(round(sensor.Value, 2))
-            elif 'Storage' in device_type and sensor.SensorType == 'Temperature':
-                disk_temps.append(round(sensor.Value, 2))
-            elif sensor.SensorType == 'Fan':
-                fan_speeds.append(int(sensor.Value))
-
-        if cpu_temp == "N/A" and cpu_package_temps:
-            cpu_temp = round(max(cpu_package_temps), 2)
-
-    except wmi.x_wmi as e:
-        logging.warning(f"Connection to LHM lost ({e}). Will retry next cycle.")
-        wmi_lhm = None
-    except Exception as e:
-        logging.error(f"Critical error processing LHM sensors: {e}", exc_info=True)
 
-    mem = psutil.virtual_memory()
     current_disk_io = psutil.disk_io_counters(perdisk=True)
-    disk_read_speeds, disk_write_speeds, disk_avail_spaces = [], [], []
-    for disk_name, start_io in last_disk_io.items():
-        end_io = current_disk_io.get(disk_name)
-        if end_io:
+    current_net_io = psutil.net_io_counters(pernic=True)
+    topology = DEVICE_TOPOLOGY.get(current_disk_io.keys(), current_net_io.keys())
+    disk_read_speeds, disk_write_speeds = [], []
+    for disk_name in topology.disks:
+        start_io, end_io = last_disk_io.get(disk_name), current_disk_io.get(disk_name)
+        if start_io and end_io:
             disk_read_speeds.append(round((end_io.read_bytes - start_io.read_bytes) / (1024**2) / time_delta, 3))
             disk_write_speeds.append(round((end_io.write_bytes - start_io.write_bytes) / (1024**2) / time_delta, 3))
-    for part in psutil.disk_partitions(all=False):
-        try:
-            if 'fixed' in part.opts.lower() or 'nvme' in part.fstype.lower(): disk_avail_spaces.append(round(psutil.disk_usage(part.mountpoint).free / (1024**3), 2))
-        except Exception: continue
-    
-    ssid, net_type, net_band = get_wifi_details()
-    
-    current_net_io = psutil.net_io_counters(pernic=True)
+
     net_adapters, net_upload_speeds, net_download_speeds = [], [], []
-    for adapter_name, io_counters in current_net_io.items():
-        last_io = last_net_io.get(adapter_name)
-        if last_io and (io_counters.bytes_sent > last_io.bytes_sent or io_counters.bytes_recv > last_io.bytes_recv):
+    for adapter_name in topology.nics:
+        io_counters, last_io = current_net_io.get(adapter_name), last_net_io.get(adapter_name)
+        if io_counters and last_io and (io_counters.bytes_sent > last_io.bytes_sent or io_counters.bytes_recv > last_io.bytes_recv):
             net_adapters.append(adapter_name)
             net_upload_speeds.append(round(((io_counters.bytes_sent - last_io.bytes_sent) * 8 / (1024**2)) / time_delta, 3))
             net_download_speeds.append(round(((io_counters.bytes_recv - last_io.bytes_recv) * 8 / (1024**2)) / time_delta, 3))
-    
+
     last_disk_io, last_net_io = current_disk_io, current_net_io
-    gpu_count = len(wmi_con.Win32_VideoController()) if wmi_con else 1
-    disk_count = len(disk_read_speeds) if disk_read_speeds else 1
+    return {"disk_read": disk_read_speeds, "disk_write": disk_write_speeds, "net_adapter": net_adapters, "net_upload": net_upload_speeds, "net_download": net_download_speeds}
+
+def collect_disk_space():
+    disk_avail_spaces = []
+    for mountpoint in DEVICE_TOPOLOGY.mountpoints:
+        try: disk_avail_spaces.append(round(psutil.disk_usage(mountpoint).free / (1024**3), 2))
+        except Exception: continue
+    return {"disk_avail": disk_avail_spaces}
+
+TOP_PROCESSES = process_usage.TopProcessSampler()
+
+def collect_top_processes():
+    return {"top_processes": TOP_PROCESSES.sample()}
+
+def collect_wifi_metrics():
+    ssid, net_type, net_band = get_wifi_details()
+    return {"net_ssid": ssid, "net_type": net_type, "net_band": net_band}
+
+HARDWARE_COLLECTORS = collectors.CollectorPipeline([
+    collectors.Collector("system", collect_system_metrics, {"cpu_util": "N/A", "mem_util": "N/A", "mem_avail": "N/A"}),
+    collectors.Collector("lhm", collect_lhm_metrics, {"cpu_temp": "N/A", "fan_speed": [], "gpu_util": [], "gpu_temp": [], "disk_temp": []}),
+    collectors.Collector("io", collect_io_metrics, {"disk_read": [], "disk_write": [], "net_adapter": [], "net_upload": [], "net_download": []}),
+    collectors.Collector("disk_space", collect_disk_space, {"disk_avail": []}),
+    collectors.Collector("wifi", collect_wifi_metrics, {"net_ssid": "N/A", "net_type": "N/A", "net_band": "N/A"}),
+    collectors.Collector("top_processes", collect_top_processes, {"top_processes": None}),
+], thread_initializer=pythoncom.CoInitialize, observe=instrumentation.METRICS.observe)
+
+@instrumentation.METRICS.timed("hardware_snapshot")
+def get_hardware_snapshot():
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    m, stale = HARDWARE_COLLECTORS.collect()
+    gpu_count = DEVICE_TOPOLOGY.gpu_count
+    disk_count = len(m["disk_read"]) if m["disk_read"] else 1
     
-    return {"timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "cpu_util": round(psutil.cpu_percent(interval=None), 2), "cpu_temp": cpu_temp, "fan_speed": fan_speeds or ["N/A"], "mem_util": round(mem.percent, 2), "mem_avail": round(mem.available / (1024**3), 2), "gpu_util": gpu_loads or ["N/A"] * gpu_count, "gpu_temp": gpu_temps or ["N/A"] * gpu_count, "disk_read": disk_read_speeds or [0.0] * disk_count, "disk_write": disk_write_speeds or [0.0] * disk_count, "disk_avail": disk_avail_spaces or ["N/A"] * disk_count, "disk_temp": disk_temps or ["N/A"] * disk_count, "net_adapter": net_adapters or ["N/A"], "net_ssid": ssid, "net_type": net_type, "net_band": net_band, "net_upload": net_upload_speeds or [0.0], "net_download": net_download_speeds or [0.0],}
+    snapshot = {"timestamp": timestamp, "cpu_util": m["cpu_util"], "cpu_temp": m["cpu_temp"], "fan_speed": m["fan_speed"] or ["N/A"], "mem_util": m["mem_util"], "mem_avail": m["mem_avail"], "gpu_util": m["gpu_util"] or ["N/A"] * gpu_count, "gpu_temp": m["gpu_temp"] or ["N/A"] * gpu_count, "disk_read": m["disk_read"] or [0.0] * disk_count, "disk_write": m["disk_write"] or [0.0] * disk_count, "disk_avail": m["disk_avail"] or ["N/A"] * disk_count, "disk_temp": m["disk_temp"] or ["N/A"] * disk_count, "net_adapter": m["net_adapter"] or ["N/A"], "net_ssid": m["net_ssid"], "net_type": m["net_type"], "net_band": m["net_band"], "net_upload": m["net_upload"] or [0.0], "net_download": m["net_download"] or [0.0],}
+    # Optional keys, only present when set; reports ignore keys they have no column for.
+    if m["top_processes"]: snapshot["top_processes"] = m["top_processes"]
+    if stale: snapshot["stale"] = stale
+    return snapshot
 #</editor-fold>
 
 #<editor-fold desc="FILE HANDLING & REPORTING">
-def cache_data(data, log_type):
+@instrumentation.METRICS.timed("cache_data")
+def cache_data(data, log_type, day=None):
+    # day: journal day of the record, for records written after the fact (held process events); defaults to today.
     try:
-        ts = datetime.datetime.now().strftime("%Y%m%d%H%M%S_%f")
-        cache_dir = CACHE_PATH / (log_type.capitalize())
-        with open(cache_dir / f"{ts}.json", 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False)
+        day = day or datetime.date.today().strftime("%Y-%m-%d")
+        if CACHE_WRITER: CACHE_WRITER.enqueue(log_type, data, day)
+        else: CACHE_JOURNAL.append(log_type, data, day)
     except Exception as e: logging.error(f"Failed to cache data for {log_type}: {e}")
 
-def _create_single_report(date_str, data_type, data_list):
-    if not data_list:
-        logging.info(f"No '{data_type}' data cached for {date_str}, skipping Excel report.")
-        return True
+def migrate_legacy_cache():
+    # Pre-journal versions wrote one {timestamp}.json per record; fold them into day segments.
+    for log_type in LOG_TYPES:
+        cache_dir = CACHE_PATH / (log_type.capitalize())
+        legacy_by_day = {}
+        for f in sorted(cache_dir.glob("*.json")):
+            try:
+                file_date = datetime.datetime.strptime(f.name.split('_')[0][:8], "%Y%m%d").date()
+                legacy_by_day.setdefault(file_date.strftime("%Y-%m-%d"), []).append(f)
+            except Exception as e: logging.warning(f"Skipping corrupted cache file {f}: {e}")
+        for date_str, files in legacy_by_day.items():
+            migrated = []
+            for f in files:
+                try:
+                    with open(f, 'r', encoding='utf-8') as jf:
+                        CACHE_JOURNAL.append(log_type, json.load(jf), date_str)
+                    migrated.append(f)
+                except Exception as e: logging.warning(f"Skipping corrupted cache file {f}: {e}")
+            CACHE_JOURNAL.sync()
+            for f in migrated:
+                try: f.unlink()
+                except OSError as e: logging.error(f"Failed to delete cache file {f}: {e}")
+            logging.info(f"Migrated {len(migrated)} legacy '{log_type}' cache files for {date_str} into the journal.")
+
+def _scan_day_layout(records, columns=None):
+    # Cheap first pass: row count, list column widths and whether rows are already in timestamp order.
+    row_count, list_keys, max_list_cols, in_order, last_ts = 0, None, {}, True, ''
+    for row in records:
+        if list_keys is None:
+            list_keys = [k for k, v in row.items() if isinstance(v, list) and (columns is None or k in columns)]
+            max_list_cols = {key: 0 for key in list_keys}
+        for key in list_keys:
+            max_list_cols[key] = max(max_list_cols[key], len(row.get(key, [])))
+        ts = row.get('timestamp', '')
+        if ts < last_ts: in_order = False
+        last_ts = ts
+        row_count += 1
+    return row_count, max_list_cols, in_order
+
+def _use_report_temp_dir(cache_path):
+    # openpyxl writes sheets as plaintext XML to "openpyxl.*" files in tempfile's default directory (write-only
+    # sheets for as long as the workbook is open); keep them under cache/temp, where a crash's leftovers are
+    # removed at the next start.
+    temp_dir = cache_path / "temp"
+    temp_dir.mkdir(exist_ok=True)
+    tempfile.tempdir = str(temp_dir)
+
+def _discard_workbook(wb):
+    # A write-only sheet's temp file is only removed by save(); an abandoned workbook must delete its own.
+    if wb is None: return
+    for ws in wb.worksheets:
+        writer = getattr(ws, "_writer", None)
+        if writer is None: continue
+        try: ws.close()
+        except Exception: pass
+        try: writer.cleanup()
+        except (OSError, ValueError): pass
+
+def _save_encrypted_workbook(wb, final_filename):
+    # Plaintext only exists under cache/temp: openpyxl's sheet files (see _use_report_temp_dir) and the saved
+    # workbook in a spooled buffer (RAM up to REPORT_SPOOL_MAX_BYTES, beyond that a delete-on-close temp file).
+    # The encrypted result is published with an atomic rename.
+    temp_dir = CACHE_PATH / "temp"
+    temp_dir.mkdir(exist_ok=True)
+    partial_filename = final_filename.with_name(f"{final_filename.name}.{uuid.uuid4().hex[:8]}{PARTIAL_REPORT_SUFFIX}")
     try:
-        info_data = get_static_computer_info()
-        wb = Workbook()
-        wb.remove(wb.active)
+        with tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_MAX_BYTES, dir=temp_dir) as plain:
+            wb.save(plain)
+            plain.seek(0)
+            with open(partial_filename, "wb") as f_out:
+                msoffcrypto.OfficeFile(plain).encrypt(EXCEL_PASSWORD, f_out)
+                f_out.flush()
+                os.fsync(f_out.fileno())
+        if final_filename.exists(): os.chmod(final_filename, 0o666)
+        os.replace(partial_filename, final_filename)
+    except Exception:
+        try: partial_filename.unlink(missing_ok=True)
+        except OSError: pass
+        raise
+    os.chmod(final_filename, 0o444)
+
+def cleanup_stale_report_files():
+    # Plaintext temp workbooks from older versions, openpyxl sheet files and half-written reports from an interrupted run.
+    stale = list((CACHE_PATH / "temp").glob("tmp_*.xlsx")) + list((CACHE_PATH / "temp").glob("openpyxl.*"))
+    for dir_name in [HARDWARE_LOG_DIR, EVENTS_LOG_DIR, PREVIEW_DIR]:
+        stale.extend((BASE_PATH / dir_name).glob(f"*{PARTIAL_REPORT_SUFFIX}"))
+    stale.extend((BASE_PATH / EXPORT_DIR).glob(f"*/*{export_sinks.PARTIAL_SUFFIX}"))
+    for f in stale:
+        try: f.unlink()
+        except OSError as e: logging.error(f"Failed to delete stale report file {f}: {e}")
+
+def _report_columns(data_type):
+    columns = LANG['logs']['columns'][data_type]
+    if data_type == 'events' and not process_tracking.EVENT_COALESCING_ENABLED:
+        # Columns of grouped rows only; they would stay empty.
+        return {key: val for key, val in columns.items() if key not in process_tracking.COALESCED_COLUMNS}
+    return columns
+
+def _report_header(data_type, max_list_cols):
+    header_row_display = []
+    for key, val in _report_columns(data_type).items():
+        num_items = max_list_cols.get(key, 1)
+        if num_items > 1:
+            for i in range(num_items): header_row_display.append(f"{val} #{i+1}")
+        else: header_row_display.append(val)
+    return header_row_display
+
+def _report_row(data_type, row_data, max_list_cols):
+    row_to_write = []
+    for key in _report_columns(data_type).keys():
+        val = row_data.get(key)
+        if data_type == 'events' and key == 'event_type':
+            val = LANG['logs']['event_types'].get(val, val)
+        if key in max_list_cols:
+            padded_val = (val or []) + ["N/A"] * (max_list_cols.get(key, 0) - len(val or []))
+            row_to_write.extend(padded_val)
+        else: row_to_write.append(val)
+    return row_to_write
+
+def _append_info_sheet(wb, info_data):
+    ws_info = wb.create_sheet(title=LANG['logs']['sheets']['info'])
+    for key, header in LANG['logs']['columns']['info'].items():
+        value = info_data.get(key, "N/A")
+        if isinstance(value, list):
+            if value:
+                for i, item in enumerate(value): ws_info.append([f"{header} #{i+1}", item])
+            else: ws_info.append([header, "N/A"])
+        else: ws_info.append([header, value])
+
+def _append_stats_sheet(wb, stats):
+    ws_stats = wb.create_sheet(title=LANG['logs']['sheets']['stats'])
+    ws_stats.append(list(LANG['logs']['stats_columns'].values()))
+    for row in stats.rows(LANG['logs']['columns']['hardware']): ws_stats.append(row)
+
+def _append_top_processes(wb, ws_top, row_data):
+    # Streams one snapshot's process rankings into the Top Processes sheet, created on first use; returns the sheet.
+    top = row_data.get('top_processes')
+    if not top or 'top_processes' in (row_data.get('stale') or []): return ws_top
+    if ws_top is None:
+        ws_top = wb.create_sheet(title=LANG['logs']['sheets']['top_processes'])
+        ws_top.append(list(LANG['logs']['top_process_columns'].values()))
+    for ranking, label in LANG['logs']['top_process_rankings'].items():
+        for rank, (name, pid, cpu, rss, io) in enumerate(top.get(ranking, []), 1):
+            ws_top.append([row_data.get('timestamp'), label, rank, name, pid] + ["N/A" if v is None else v for v in (cpu, rss, io)])
+    return ws_top
+
+def _append_metrics_sheet(wb, date_str):
+    metrics = instrumentation.METRICS.day_snapshot(date_str) if instrumentation.METRICS_REPORT_SHEET else None
+    if not metrics: return
+    ws_metrics = wb.create_sheet(title=LANG['logs']['sheets']['metrics'])
+    ws_metrics.append(list(LANG['logs']['metrics_columns'].values()))
+    for name, h in metrics['histograms'].items():
+        ws_metrics.append([name, h['count'], h['mean_ms'], h['p50_ms'], h['p95_ms'], h['p99_ms'], h['max_ms'], None])
+    for name, value in list(metrics['counters'].items()) + list(metrics['gauges'].items()):
+        ws_metrics.append([name] + [None] * 6 + [value if isinstance(value, (int, float, str)) or value is None else str(value)])
+
+def _open_day_export(date_str, data_type, max_list_cols):
+    if not EXPORT_SINKS: return None
+    numeric_keys = snapshot_codec.NUMERIC_COLUMNS if data_type == 'hardware' else ()
+    return export_sinks.open_day_export(EXPORT_SINKS, BASE_PATH / EXPORT_DIR, date_str, data_type,
+                                        _report_columns(data_type).keys(), max_list_cols, numeric_keys)
+
+def _report_filename(date_str, data_type, output_dir=None):
+    full_tz = get_timezone_str()
+    tz_match = re.search(r"UTC([+-])(\d{2}):\d{2}", full_tz)
+    tz_string = f"UTC{tz_match.group(1)}{int(tz_match.group(2))}" if tz_match else "UTC"
+    
+    file_suffix = LANG['logs']['file_suffixes'][data_type]
+    if output_dir is None: output_dir = BASE_PATH / (HARDWARE_LOG_DIR if data_type == 'hardware' else EVENTS_LOG_DIR)
+    return output_dir / f"{COMPUTER_UUID}_{date_str}_{tz_string}_{file_suffix}.xlsx"
+
+@instrumentation.METRICS.timed("create_report")
+def _create_single_report(date_str, data_type, iter_records, info_data=None, output_dir=None, export=True):
+    # iter_records() returns a fresh iterator over the day's cached rows; rows are streamed twice
+    # (layout pass, write pass) so memory stays flat regardless of the day's size.
+    wb = day_export = None
+    try:
+        row_count, max_list_cols, in_order = _scan_day_layout(iter_records(), _report_columns(data_type))
+        if not row_count:
+            logging.info(f"No '{data_type}' data cached for {date_str}, skipping Excel report.")
+            return True
+        if not in_order:
+            # Clock changes can leave rows out of order; only then fall back to an in-memory sort.
+            sorted_rows = sorted(iter_records(), key=lambda x: x.get('timestamp', ''))
+            iter_records = lambda: iter(sorted_rows)
+
+        if info_data is None: info_data = get_static_computer_info()
+        wb = Workbook(write_only=True)
         
         ws = wb.create_sheet(title=LANG['logs']['sheets'][data_type])
+        ws.append(_report_header(data_type, max_list_cols))
+        stats = report_stats.DailyStats(nominal_seconds=sampler.SAMPLE_INTERVAL_SECONDS) if data_type == 'hardware' else None
+        ws_top = None
+        if export: day_export = _open_day_export(date_str, data_type, max_list_cols)
+        for row_data in iter_records():
+            ws.append(_report_row(data_type, row_data, max_list_cols))
+            if stats:
+                stats.add(row_data)
+                ws_top = _append_top_processes(wb, ws_top, row_data)
+            if day_export: day_export.write(row_data)
         
-        list_keys = [k for k, v in data_list[0].items() if isinstance(v, list)]
-        max_list_cols = {key: max((len(row.get(key, [])) for row in data_list), default=0) for key in list_keys}
-        
-        header_row_keys = LANG['logs']['columns'][data_type].keys()
-        header_row_display = []
-        for key in header_row_keys:
-            val = LANG['logs']['columns'][data_type][key]
-            num_items = max_list_cols.get(key, 1)
-            if num_items > 1:
-                for i in range(num_items): header_row_display.append(f"{val} #{i+1}")
-            else: header_row_display.append(val)
-        ws.append(header_row_display)
-
-        for row_data in data_list:
-            row_to_write = []
-            for key in header_row_keys:
-                val = row_data.get(key)
-                if data_type == 'events' and key == 'event_type':
-                    val = LANG['logs']['event_types'].get(val, val)
-                if key in max_list_cols:
-                    padded_val = (val or []) + ["N/A"] * (max_list_cols.get(key, 0) - len(val or []))
-                    row_to_write.extend(padded_val)
-                else: row_to_write.append(val)
-            ws.append(row_to_write)
-        
-        ws_info = wb.create_sheet(title=LANG['logs']['sheets']['info'])
-        for key, header in LANG['logs']['columns']['info'].items():
-            value = info_data.get(key, "N/A")
-            if isinstance(value, list):
-                if value:
-                    for i, item in enumerate(value): ws_info.append([f"{header} #{i+1}", item])
-                else: ws_info.append([header, "N/A"])
-            else: ws_info.append([header, value])
-
-        full_tz = get_timezone_str()
-        tz_match = re.search(r"UTC([+-])(\d{2}):\d{2}", full_tz)
-        tz_string = f"UTC{tz_match.group(1)}{int(tz_match.group(2))}" if tz_match else "UTC"
-        
-        file_suffix = LANG['logs']['file_suffixes'][data_type]
-        output_dir = BASE_PATH / (HARDWARE_LOG_DIR if data_type == 'hardware' else EVENTS_LOG_DIR)
-        
-        temp_dir = CACHE_PATH / "temp"
-        temp_dir.mkdir(exist_ok=True)
-        unencrypted_filename = temp_dir / f"tmp_{uuid.uuid4()}.xlsx"
-        final_filename = output_dir / f"{COMPUTER_UUID}_{date_str}_{tz_string}_{file_suffix}.xlsx"
-        
-        wb.save(unencrypted_filename)
-        with open(unencrypted_filename, "rb") as f_in, open(final_filename, "wb") as f_out:
-            office_file = msoffcrypto.OfficeFile(f_in)
-            office_file.encrypt(EXCEL_PASSWORD, f_out)
-        os.remove(unencrypted_filename)
-        os.chmod(final_filename, 0o444)
+        if stats:
+            _append_stats_sheet(wb, stats)
+            _append_metrics_sheet(wb, date_str)
+        _append_info_sheet(wb, info_data)
+        final_filename = _report_filename(date_str, data_type, output_dir)
+        _save_encrypted_workbook(wb, final_filename)
         logging.info(f"Successfully created encrypted report: {final_filename}")
+        if day_export: day_export.commit()
 
     except Exception as e:
+        _discard_workbook(wb)
+        if day_export: day_export.abort()
         logging.error(f"Failed to create '{data_type}' report for {date_str}: {e}", exc_info=True)
         return False
     return True
 
-def process_cached_data():
-    today_str = datetime.date.today().strftime("%Y-%m-%d")
-    files_by_day = {}
-    all_files_to_delete = {}
-    for log_type in ['hardware', 'events']:
-        cache_dir = CACHE_PATH / (log_type.capitalize())
-        for f in sorted(cache_dir.glob("*.json")):
+class IncrementalReport:
+    # One day's report for one log type, built while the day's journal segment grows. Rows go straight into a
+    # write-only sheet (openpyxl streams them to its temp file), so finalize() only has to read the last few
+    # records, add the info sheet and encrypt.
+    def __init__(self, date_str, data_type):
+        self.date_str, self.data_type = date_str, data_type
+        self.wb = self.ws = self.ws_top = self.export = None
+        self.max_list_cols = None
+        self.needs_full_build = False
+        self._restart()
+
+    def discard(self):
+        _discard_workbook(self.wb)
+        if self.export: self.export.abort()
+        self.wb = self.ws = self.ws_top = self.export = None
+
+    def _restart(self):
+        self.discard()
+        self.follower = CACHE_JOURNAL.follow(self.data_type, self.date_str)
+        self.stats = report_stats.DailyStats(nominal_seconds=sampler.SAMPLE_INTERVAL_SECONDS) if self.data_type == 'hardware' else None
+        self.row_count, self.last_ts = 0, ''
+
+    def _append_new_rows(self):
+        for row_data in self.follower.read():
+            if self.max_list_cols is None:
+                columns = _report_columns(self.data_type)
+                self.max_list_cols = {k: len(v) for k, v in row_data.items() if isinstance(v, list) and k in columns}
+            widths = {key: len(row_data.get(key, [])) for key in self.max_list_cols}
+            if any(widths[key] > self.max_list_cols[key] for key in widths):
+                # A wider row (e.g. a hot-plugged disk) changes the header: start the sheet over at the new width.
+                self.max_list_cols = {key: max(self.max_list_cols[key], widths[key]) for key in widths}
+                return False
+            ts = row_data.get('timestamp', '')
+            if ts < self.last_ts:
+                # Out-of-order rows need the sorting path of _create_single_report at rollover.
+                self.needs_full_build = True
+                self.discard()
+                return True
+            self.last_ts = ts
+            if self.ws is None:
+                self.wb = Workbook(write_only=True)
+                self.ws = self.wb.create_sheet(title=LANG['logs']['sheets'][self.data_type])
+                self.ws.append(_report_header(self.data_type, self.max_list_cols))
+                self.export = _open_day_export(self.date_str, self.data_type, self.max_list_cols)
+            self.ws.append(_report_row(self.data_type, row_data, self.max_list_cols))
+            if self.stats:
+                self.stats.add(row_data)
+                self.ws_top = _append_top_processes(self.wb, self.ws_top, row_data)
+            if self.export: self.export.write(row_data)
+            self.row_count += 1
+        return True
+
+    def update(self):
+        while not self.needs_full_build and not self._append_new_rows(): self._restart()
+
+    @instrumentation.METRICS.timed("finalize_report")
+    def finalize(self, info_data=None):
+        self.update()
+        if self.needs_full_build or not self.row_count:
+            return _create_single_report(self.date_str, self.data_type, functools.partial(CACHE_JOURNAL.iter_records, self.data_type, self.date_str), info_data)
+        try:
+            if info_data is None: info_data = get_static_computer_info()
+            if self.stats:
+                _append_stats_sheet(self.wb, self.stats)
+                _append_metrics_sheet(self.wb, self.date_str)
+            _append_info_sheet(self.wb, info_data)
+            final_filename = _report_filename(self.date_str, self.data_type)
+            _save_encrypted_workbook(self.wb, final_filename)
+            logging.info(f"Successfully created encrypted report: {final_filename}")
+            if self.export: self.export.commit()
+        except Exception as e:
+            _discard_workbook(self.wb)
+            if self.export: self.export.abort()
+            logging.error(f"Failed to create '{self.data_type}' report for {self.date_str}: {e}", exc_info=True)
+            return False
+        finally:
+            self.wb = self.ws = self.ws_top = self.export = None
+        return True
+
+def _init_report_worker(lang, base_path, cache_path, computer_uuid):
+    global LANG, BASE_PATH, CACHE_PATH, COMPUTER_UUID, CACHE_JOURNAL
+    LANG, BASE_PATH, CACHE_PATH, COMPUTER_UUID = lang, base_path, cache_path, computer_uuid
+    # Read-only use: workers only stream finished days, the parent owns appends and deletion.
+    CACHE_JOURNAL = create_cache_journal(cache_path)
+    _use_report_temp_dir(cache_path)
+    setup_logger(base_path / "error.log")
+    try: psutil.Process().nice(getattr(psutil, 'BELOW_NORMAL_PRIORITY_CLASS', 10))
+    except Exception as e: logging.warning(f"Could not lower report worker priority: {e}")
+
+def _report_worker_job(date_str, data_type, info_data):
+    return _create_single_report(date_str, data_type, functools.partial(CACHE_JOURNAL.iter_records, data_type, date_str), info_data)
+
+def _drop_cached_day(date_str):
+    for log_type in LOG_TYPES:
+        try: CACHE_JOURNAL.drop_day(log_type, date_str)
+        except OSError as e: logging.error(f"Failed to delete '{log_type}' cache segment for {date_str}: {e}")
+
+def _process_backlog_in_pool(pending_days):
+    # Static info is collected once here so every report of the backlog embeds the same snapshot.
+    info_data = get_static_computer_info()
+    results = {date_str: {} for date_str in pending_days}
+    workers = min(BACKLOG_WORKERS, len(pending_days) * len(LOG_TYPES))
+    logging.info(f"Building reports for {len(pending_days)} pending days with {workers} worker processes.")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_report_worker,
+                             initargs=(LANG, BASE_PATH, CACHE_PATH, COMPUTER_UUID)) as pool:
+        futures = {pool.submit(_report_worker_job, date_str, log_type, info_data): (date_str, log_type)
+                   for date_str in pending_days for log_type in LOG_TYPES}
+        for future in as_completed(futures):
+            date_str, log_type = futures[future]
+            try: results[date_str][log_type] = future.result()
+            except BrokenProcessPool: raise
+            except Exception as e:
+                logging.error(f"Report worker failed for '{log_type}' {date_str}: {e}")
+                results[date_str][log_type] = False
+            if len(results[date_str]) == len(LOG_TYPES) and all(results[date_str].values()):
+                _drop_cached_day(date_str)
+
+class ReportBuilder(threading.Thread):
+    def __init__(self, stop_event, interval=REPORT_CHECKPOINT_INTERVAL_SECONDS, on_reports=None, before_finalize=None):
+        super().__init__(daemon=True)
+        self.stop_event = stop_event
+        self.interval = interval
+        self.on_reports = on_reports    # called after finished days were written out
+        self.before_finalize = before_finalize  # before_finalize(day_start): flush records still held back for the finished day
+        self.wake_event = threading.Event()
+        self.day, self.live = None, {}
+
+    def wake(self):
+        self.wake_event.set()
+
+    def _checkpoint(self):
+        if CACHE_WRITER: CACHE_WRITER.flush()
+        today_str = datetime.date.today().strftime("%Y-%m-%d")
+        if self.day != today_str:
+            if self.live: self._finalize_day()
+            self.day = today_str
+            self.live = {log_type: IncrementalReport(today_str, log_type) for log_type in LOG_TYPES}
+        for report in self.live.values(): report.update()
+
+    def _finalize_day(self):
+        day_start = datetime.datetime.combine(datetime.date.today(), datetime.time()).timestamp()
+        if self.before_finalize:
+            # Process starts wait up to GUI_DETECTION_GRACE_SECONDS to be classified; let those of the last day land first.
+            wait = day_start + process_tracking.GUI_DETECTION_GRACE_SECONDS + 1 - time.time()
+            if wait > 0: self.stop_event.wait(wait)
+            self.before_finalize(day_start)
+            if CACHE_WRITER: CACHE_WRITER.flush()
+        info_data = get_static_computer_info()
+        results = [report.finalize(info_data) for report in self.live.values()]
+        self.live = {}
+        if all(results): _drop_cached_day(self.day)
+        # Anything else still pending, including this day if finalizing failed.
+        process_cached_data()
+        if self.on_reports: self.on_reports()
+
+    def _build_preview(self):
+        try: (BASE_PATH / PREVIEW_TRIGGER_FILENAME).unlink()
+        except OSError as e: logging.error(f"Failed to remove preview trigger: {e}")
+        if CACHE_WRITER: CACHE_WRITER.flush()
+        preview_dir = BASE_PATH / PREVIEW_DIR
+        preview_dir.mkdir(exist_ok=True)
+        today_str = datetime.date.today().strftime("%Y-%m-%d")
+        for log_type in LOG_TYPES:
+            _create_single_report(today_str, log_type, functools.partial(CACHE_JOURNAL.iter_records, log_type, today_str), output_dir=preview_dir, export=False)
+
+    def run(self):
+        next_checkpoint = 0
+        while not self.stop_event.is_set():
             try:
-                file_date_str = f.name.split('_')[0][:8]
-                file_date = datetime.datetime.strptime(file_date_str, "%Y%m%d").date()
-                date_str = file_date.strftime("%Y-%m-%d")
-                if date_str != today_str:
-                    if date_str not in files_by_day:
-                        files_by_day[date_str] = {'hardware': [], 'events': []}
-                        all_files_to_delete[date_str] = []
-                    with open(f, 'r', encoding='utf-8') as jf:
-                        files_by_day[date_str][log_type].append(json.load(jf))
-                    all_files_to_delete[date_str].append(f)
-            except Exception as e: logging.warning(f"Skipping corrupted cache file {f}: {e}")
-    for date_str, daily_data in files_by_day.items():
-        daily_data['hardware'].sort(key=lambda x: x.get('timestamp', ''))
-        daily_data['events'].sort(key=lambda x: x.get('timestamp', ''))
-        hardware_success = _create_single_report(date_str, 'hardware', daily_data['hardware'])
-        events_success = _create_single_report(date_str, 'events', daily_data['events'])
-        if hardware_success and events_success:
-             for f in all_files_to_delete.get(date_str, []):
-                try: f.unlink()
-                except OSError as e: logging.error(f"Failed to delete cache file {f}: {e}")
+                if self.wake_event.is_set() or time.monotonic() >= next_checkpoint:
+                    self.wake_event.clear()
+                    next_checkpoint = time.monotonic() + self.interval
+                    self._checkpoint()
+                if (BASE_PATH / PREVIEW_TRIGGER_FILENAME).exists(): self._build_preview()
+            except Exception as e:
+                logging.error(f"Error in ReportBuilder loop: {e}", exc_info=True)
+            self.wake_event.wait(PREVIEW_POLL_SECONDS)
+        for report in self.live.values(): report.discard()
+
+def _pending_days():
+    today_str = datetime.date.today().strftime("%Y-%m-%d")
+    return sorted({d for log_type in LOG_TYPES for d in CACHE_JOURNAL.days(log_type) if d != today_str})
+
+@instrumentation.METRICS.timed("process_cached_data")
+def process_cached_data():
+    if CACHE_WRITER: CACHE_WRITER.flush()
+    pending_days = _pending_days()
+    if BACKLOG_WORKERS > 1 and len(pending_days) >= BACKLOG_MIN_DAYS:
+        try:
+            _process_backlog_in_pool(pending_days)
+            return
+        except Exception as e:
+            # Days finished before the failure are already dropped; redo the rest in-process.
+            logging.error(f"Backlog pool unavailable, building reports serially: {e}", exc_info=True)
+            pending_days = _pending_days()
+    for date_str in pending_days:
+        hardware_success = _create_single_report(date_str, 'hardware', functools.partial(CACHE_JOURNAL.iter_records, 'hardware', date_str))
+        events_success = _create_single_report(date_str, 'events', functools.partial(CACHE_JOURNAL.iter_records, 'events', date_str))
+        if hardware_success and events_success: _drop_cached_day(date_str)
 #</editor-fold>
 
 # ===================================================================================
 # ⚙️ BACKGROUND MONITORING THREAD & MAIN EXECUTION
 # ===================================================================================
 #<editor-fold desc="ProcessMonitor Thread & Main Execution">
+class Win32WindowProvider:
+    def visible_window_pids(self):
+        """PIDs owning at least one visible, titled top-level window."""
+        pids = set()
+        def callback(hwnd, _):
+            if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
+                pids.add(win32process.GetWindowThreadProcessId(hwnd)[1])
+            return True
+        win32gui.EnumWindows(callback, None)
+        return pids
+
 class ProcessMonitor(threading.Thread):
-    def __init__(self, stop_event):
+    def __init__(self, stop_event, window_provider=None, source=None, sink=None):
         super().__init__(daemon=True)
         self.stop_event = stop_event
         self.system_root = os.environ.get("SystemRoot", "C:\\Windows").lower()
-        self.seen_pids = {p.pid for p in psutil.process_iter(['pid'])}
-        self.logged_apps = {}
+        self.identities = process_tracking.ProcessIdentityCache(self._is_user_app_by_path)
+        self.logged_apps = {}       # pid -> ProcessIdentity with an open "start" row
+        self.pending_gui = {}       # pid -> (start time, ProcessIdentity) of system-path processes that may still open a window
+        self.window_provider = window_provider or Win32WindowProvider()
+        self._window_pids = None
+        self.source = source
+        self.sink = sink or (lambda record, timestamp: cache_data(record, "events", datetime.date.fromtimestamp(timestamp).strftime("%Y-%m-%d")))
+        self.coalescer = process_tracking.EventCoalescer(self.sink) if process_tracking.EVENT_COALESCING_ENABLED else None
     def _is_gui_app(self, pid):
-        try:
-            hwnd_list = []
-            def callback(hwnd, lst):
-                if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
-                    _, found_pid = win32process.GetWindowThreadProcessId(hwnd)
-                    if found_pid == pid:
-                        lst.append(hwnd)
-                return True
-            win32gui.EnumWindows(callback, hwnd_list)
-            return len(hwnd_list) > 0
-        except Exception: return False
+        # The windows are enumerated at most once per poll, and only if some new process needs it.
+        if self._window_pids is None:
+            try: self._window_pids = self.window_provider.visible_window_pids()
+            except Exception: self._window_pids = set()
+        return pid in self._window_pids
     def _is_user_app_by_path(self, exe_path):
         if not exe_path: return False
         return not exe_path.lower().startswith(self.system_root)
-    def run(self):
-        while not self.stop_event.is_set():
+    def _open_source(self):
+        if self.source is None and process_tracking.PROCESS_EVENT_SOURCE == "auto":
+            source = process_tracking.WmiTraceEventSource(get_wmi_connection, timeout_errors=(wmi.x_wmi_timed_out,))
             try:
-                current_pids = {p.pid for p in psutil.process_iter(['pid'])}
-                new_pids, dead_pids = current_pids - self.seen_pids, self.seen_pids - current_pids
-                for pid in new_pids:
-                    try:
-                        p = psutil.Process(pid)
-                        exe_path = p.exe()
-                        if self._is_user_app_by_path(exe_path) or self._is_gui_app(pid):
-                            app_name = p.name()
-                            self.logged_apps[pid] = (app_name, exe_path)
-                            cache_data({"timestamp": datetime.datetime.now().strftime("%H:%M:%S"), "event_type": "start", "app_name": app_name, "path": exe_path}, "events")
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess): continue
-                for pid in dead_pids:
-                    if pid in self.logged_apps:
-                        app_name, exe_path = self.logged_apps.pop(pid)
-                        cache_data({"timestamp": datetime.datetime.now().strftime("%H:%M:%S"), "event_type": "close", "app_name": app_name, "path": exe_path}, "events")
-                self.seen_pids = current_pids
-            except Exception as e: 
-                logging.error(f"Error in ProcessMonitor loop: {e}", exc_info=True)
-            self.stop_event.wait(5)
+                source.open()
+                logging.info("Tracking process starts and exits through WMI traces.")
+                return source
+            except Exception as e:
+                source.close()
+                logging.warning(f"WMI process traces unavailable ({e}), polling every {process_tracking.PROCESS_POLL_SECONDS}s instead.")
+        source = self.source or self._polling_source()
+        source.open()
+        return source
+    def _polling_source(self):
+        return process_tracking.PollingEventSource(stop_event=self.stop_event, watched=self._watched_processes, identities=self.identities)
+    def _watched_processes(self):
+        # Pending processes are checked when they get a window instead (see _check_pending_gui).
+        return list(self.logged_apps.values())
+    def _emit(self, event_type, timestamp, identity):
+        record = {"timestamp": datetime.datetime.fromtimestamp(timestamp).strftime("%H:%M:%S"), "event_type": event_type, "app_name": identity.name, "path": identity.exe}
+        if self.coalescer: self.coalescer.add(record, timestamp)
+        else: self.sink(record, timestamp)
+    def _on_start(self, event):
+        identity = self.identities.identify(event.pid, event.name, event.exe, event.timestamp)
+        if identity is None: return
+        started = identity.key[1] if event.timestamp is None else event.timestamp
+        previous = self.logged_apps.get(event.pid)
+        if previous is not None:
+            if previous.key == identity.key: return
+            # The PID was recycled without its exit being seen: close the old app when the new process started.
+            self._emit("close", started, self.logged_apps.pop(event.pid))
+        self.pending_gui.pop(event.pid, None)
+        if identity.user_app or self._is_gui_app(event.pid):
+            self.logged_apps[event.pid] = identity
+            self._emit("start", started, identity)
+        else: self.pending_gui[event.pid] = (started, identity)
+    def _on_stop(self, event):
+        self.identities.forget(event.pid)
+        self.pending_gui.pop(event.pid, None)
+        if event.pid in self.logged_apps: self._emit("close", event.timestamp, self.logged_apps.pop(event.pid))
+    def _check_pending_gui(self):
+        now = time.time()
+        for pid, (started, identity) in list(self.pending_gui.items()):
+            if self._is_gui_app(pid):
+                del self.pending_gui[pid]
+                if not self.identities.still_running(identity): continue    # exited, and the PID may have gone to another process
+                self.logged_apps[pid] = identity
+                self._emit("start", started, identity)
+            elif now - started > process_tracking.GUI_DETECTION_GRACE_SECONDS: del self.pending_gui[pid]
+    def flush_day(self, day_start):
+        """Write the coalesced groups started before day_start (epoch seconds), so they reach their day's report."""
+        if self.coalescer: self.coalescer.flush(before=day_start)
+    def handle(self, events):
+        self._window_pids = None
+        for event in events:
+            if event.kind == "start": self._on_start(event)
+            else: self._on_stop(event)
+        if self.pending_gui: self._check_pending_gui()
+        if self.coalescer: self.coalescer.tick()
+    def run(self):
+        try: source = self._open_source()
+        except Exception as e:
+            logging.error(f"ProcessMonitor could not start: {e}", exc_info=True)
+            return
+        try:
+            while not self.stop_event.is_set():
+                try: self.handle(source.read(timeout=1))
+                except Exception as e:
+                    if isinstance(source, process_tracking.QueuedEventSource) and source.error:
+                        logging.warning(f"Process event source failed ({e}), polling every {process_tracking.PROCESS_POLL_SECONDS}s instead.")
+                        source.close()
+                        source = self._polling_source()
+                        source.open()
+                    else:
+                        logging.error(f"Error in ProcessMonitor loop: {e}", exc_info=True)
+                        self.stop_event.wait(5)
+        finally:
+            source.close()
+            if self.coalescer: self.coalescer.flush()
 
 def main():
-    global LANG, COMPUTER_UUID
+    global LANG, COMPUTER_UUID, CACHE_WRITER, STATIC_INFO
     
     require_admin()
     
@@ -640,30 +1033,48 @@ def main():
     setup_logger(BASE_PATH / "error.log")
     
     COMPUTER_UUID = get_computer_uuid()
+    STATIC_INFO = system_info.StaticInfoCache(WmiSystemInfoProvider(), BASE_PATH / system_info.STATIC_INFO_FILENAME)
     lhm_notifier_thread = threading.Thread(target=lhm_checker_and_notifier, daemon=True)
     lhm_notifier_thread.start()
+    try:
+        CACHE_JOURNAL.recover()
+        migrate_legacy_cache()
+        cleanup_stale_report_files()
+    except Exception as e:
+        logging.error(f"Failed to recover cache journal: {e}", exc_info=True)
     try: 
         process_cached_data()
     except Exception as e: 
         logging.error(f"Unhandled error during initial cached data processing: {e}", exc_info=True)
     stop_event = threading.Event()
+    CACHE_WRITER = cache_journal.CacheWriter(CACHE_JOURNAL, stop_event)
+    CACHE_WRITER.start()
     process_monitor_thread = ProcessMonitor(stop_event)
     process_monitor_thread.start()
     
-    # ✅ 启动邮件服务
+    # ✅ 启动邮件服务 (woken by the report builder when a day's reports are written)
     email_thread = email_service.start_email_service(BASE_PATH, stop_event)
+    report_builder_thread = ReportBuilder(stop_event, on_reports=email_thread.wake, before_finalize=process_monitor_thread.flush_day)
+    report_builder_thread.start()
 
     last_day_checked = datetime.date.today()
+    # Built here once so the disk_space collector has the mountpoints for the first sample (the io collector refreshes it later).
+    DEVICE_TOPOLOGY.get(last_disk_io.keys(), last_net_io.keys())
+    hardware_sampler = sampler.AdaptiveSampler(get_hardware_snapshot, idle_time=lambda: HARDWARE_COLLECTORS.last_deadline_wait)
+    for name, source in [("sampler", hardware_sampler.stats), ("cache_writer", CACHE_WRITER.stats), ("collectors", HARDWARE_COLLECTORS.stats),
+                         ("lhm", lambda: {"topology_rebuilds": LHM_SENSORS.rebuilds, "last_latency_ms": None if LHM_SENSORS.last_latency is None else round(LHM_SENSORS.last_latency * 1000, 3)}),
+                         ("wifi", lambda: {"refreshes": WIFI_STATE.refreshes}), ("device_topology", lambda: {"rebuilds": DEVICE_TOPOLOGY.rebuilds}), ("email", email_thread.stats),
+                         ("top_processes", lambda: {"last_cost": TOP_PROCESSES.last_cost, "partial_samples": TOP_PROCESSES.partial_samples})]:
+        instrumentation.METRICS.add_source(name, source)
+    metrics_thread = instrumentation.start_metrics_service(BASE_PATH, stop_event)
     try:
-        while True:
-            cache_data(get_hardware_snapshot(), 'hardware')
+        for snapshot in hardware_sampler.samples():
+            cache_data(snapshot, 'hardware')
             current_day = datetime.date.today()
             if current_day != last_day_checked:
-                process_cached_data()
+                # The report builder finalizes the finished day in the background.
+                report_builder_thread.wake()
                 last_day_checked = current_day
-            now = datetime.datetime.now()
-            sleep_duration = 60 - now.second - (now.microsecond / 1_000_000.0)
-            time.sleep(max(0, sleep_duration))
     except KeyboardInterrupt:
         print("Shutdown signal received.")
     except Exception as e:
@@ -672,10 +1083,22 @@ def main():
         stop_event.set()
         if process_monitor_thread.is_alive(): 
             process_monitor_thread.join()
+        email_thread.wake()
         if email_thread.is_alive():
             email_thread.join(timeout=5)
+        report_builder_thread.wake()
+        if report_builder_thread.is_alive():
+            report_builder_thread.join(timeout=10)
+        if metrics_thread.is_alive():
+            metrics_thread.join(timeout=5)
+        CACHE_WRITER.close()
+        CACHE_JOURNAL.close()
+        HARDWARE_COLLECTORS.shutdown()
+        WIFI_STATE.close()
         print("Logger stopped.")
 
 if __name__ == "__main__":
+    # Needed by the frozen (PyInstaller) build for the backlog report workers.
+    multiprocessing.freeze_support()
     main()
 #</editor-fold>